@@ -0,0 +1,79 @@
+"""
+Compare two benchmark result files
+
+Usage:
+    python -m benchmarks.compare BASELINE.json CANDIDATE.json [--threshold PERCENT]
+
+Prints every latency and throughput metric with its relative change and
+exits with status 1 when any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+# Lower is better for latencies, higher is better for throughput
+LOWER_IS_BETTER = ("mean_ms", "p50_ms", "p99_ms", "seconds")
+HIGHER_IS_BETTER = ("throughput_per_second",)
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif key in LOWER_IS_BETTER + HIGHER_IS_BETTER and isinstance(value, (int, float)):
+            yield path, float(value)
+
+def compare(
+    baseline: Dict[str, Any],
+    candidate: Dict[str, Any],
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    Relative change of every metric present in both reports
+
+    :param baseline: Report of the reference commit
+    :param candidate: Report of the commit under test
+    :param threshold: Allowed regression in percent
+    :return: One row per metric with change and regression flag
+    """
+    before = dict(flatten(baseline["results"]))
+    rows = []
+    for path, value in flatten(candidate["results"]):
+        if path not in before or not before[path]:
+            continue
+        change = (value - before[path]) / before[path] * 100
+        worse = change if path.rsplit(".", 1)[-1] in LOWER_IS_BETTER else -change
+        rows.append({
+            "metric": path,
+            "baseline": before[path],
+            "candidate": value,
+            "change_percent": change,
+            "regression": worse > threshold
+        })
+    return rows
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    config = parser.parse_args(argv)
+
+    with open(config.baseline) as baseline_file, open(config.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    if baseline.get("config") != candidate.get("config"):
+        print("Warning: the runs used different configurations", file=sys.stderr)
+
+    rows = compare(baseline, candidate, config.threshold)
+    print(f"{baseline.get('commit')} -> {candidate.get('commit')}")
+    for row in rows:
+        marker = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['metric']:<60} {row['baseline']:>12.3f} {row['candidate']:>12.3f} "
+            f"{row['change_percent']:>+8.1f}%{marker}"
+        )
+    return 1 if any(row["regression"] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
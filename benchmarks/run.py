@@ -0,0 +1,373 @@
+"""
+Reproducible backend benchmarks against local stub services
+
+Usage:
+    python -m benchmarks.run [--quick] [--only NAME ...] [--latency MS] [--jitter MS]
+                             [--seed N] [--output PATH]
+
+Results are written as JSON (benchmarks/results/<commit>.json by default)
+so runs of different commits can be compared with benchmarks.compare.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+from benchmarks import stubs
+from benchmarks.stub_server import StubServer
+
+WALLET = "0x1234567890123456789012345678901234567890"
+PRIVATE_KEY = "0x" + "11" * 32
+CONTRACT = "0x00000000000000000000000000000000000000AA"
+TOKEN_QUBE_ABI = [{
+    "type": "function",
+    "name": "createToken",
+    "stateMutability": "nonpayable",
+    "inputs": [{"name": "owner", "type": "address"}, {"name": "metadata", "type": "string"}],
+    "outputs": [{"name": "", "type": "uint256"}]
+}]
+
+SAMPLE_TEXTS = [
+    "How do I fix this software algorithm in production",
+    "Write a poem and some music for a storytelling night",
+    "What is our marketing strategy for the startup next quarter",
+    "Design an experiment to test the hypothesis in physics",
+    "Hello there, how are you today",
+]
+
+def summarize(latencies: Sequence[float], items: int = 0, elapsed: float = 0.0) -> Dict[str, Any]:
+    """
+    Latency percentiles in milliseconds and throughput
+
+    :param latencies: Seconds per operation
+    :param items: Items processed (defaults to the number of operations)
+    :param elapsed: Wall time in seconds (defaults to the sum of latencies)
+    :return: count, mean/p50/p99 in ms and items per second
+    """
+    ordered = sorted(latencies)
+    items = items or len(ordered)
+    elapsed = elapsed or sum(ordered)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "throughput_per_second": items / elapsed if elapsed else None
+    }
+
+def timed(fn: Callable[[], Any], repeats: int) -> List[float]:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+@contextlib.contextmanager
+def environment(**values: str) -> Iterator[None]:
+    """
+    Set environment variables for the duration of a block, then restore them
+    """
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def bench_domain_detection(config: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Domain detection one text at a time versus in batches
+    """
+    from src.backend.context_transformer import AgentContextTransformer
+
+    transformer = AgentContextTransformer()
+    transformer.warmup()
+    count = 200 if config.quick else 2000
+    batch_size = 50
+    # Distinct texts so no caching layer can help
+    texts = [f"{SAMPLE_TEXTS[index % len(SAMPLE_TEXTS)]} {index}" for index in range(count)]
+
+    single = []
+    for text in texts:
+        started = time.perf_counter()
+        transformer.detect_domain(text)
+        single.append(time.perf_counter() - started)
+
+    batches = []
+    for start in range(0, count, batch_size):
+        chunk = texts[start:start + batch_size]
+        started = time.perf_counter()
+        transformer.detect_domains(chunk)
+        batches.append(time.perf_counter() - started)
+
+    return {
+        "texts": count,
+        "single": summarize(single),
+        "batch": {"batch_size": batch_size, **summarize(batches, items=count)}
+    }
+
+def bench_wallet_analysis(config: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Wallet analysis over growing token counts, sync and async monitors
+    """
+    from src.backend.async_blockchain_monitor import AsyncMetisBlockchainMonitor
+    from src.backend.blockchain_monitor import MetisBlockchainMonitor
+
+    node = StubServer(stubs.json_rpc_node(), config.latency, config.jitter, config.seed)
+    metis = StubServer(stubs.metis_api(), config.latency, config.jitter, config.seed)
+    repeats = 3 if config.quick else 10
+    results = {}
+    try:
+        for token_count in (1, 10, 50):
+            tokens = [f"0x{index:040x}" for index in range(1, token_count + 1)]
+
+            def analyze_sync():
+                # A fresh monitor per run, so no block-cached reads are reused
+                MetisBlockchainMonitor(
+                    metis_api_key="bench",
+                    wallet_address=WALLET,
+                    rpc_url=node.url,
+                    metis_base_url=metis.url
+                ).analyze_wallet_activity(tokens)
+
+            async def analyze_async():
+                async with AsyncMetisBlockchainMonitor(
+                    metis_api_key="bench",
+                    wallet_address=WALLET,
+                    rpc_url=node.url,
+                    metis_base_url=metis.url
+                ) as monitor:
+                    await monitor.analyze_wallet_activity(tokens)
+
+            results[str(token_count)] = {
+                "sync": summarize(timed(analyze_sync, repeats)),
+                "async": summarize(timed(lambda: asyncio.run(analyze_async()), repeats))
+            }
+    finally:
+        node.close()
+        metis.close()
+    return {"token_counts": results}
+
+def bench_token_minting(config: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Pipelined batch minting versus one transaction at a time
+    """
+    from src.backend.blockchain import BlockchainInteraction
+
+    node = StubServer(stubs.json_rpc_node(CONTRACT), config.latency, config.jitter, config.seed)
+    batch_size = 10 if config.quick else 50
+    owners = [f"0x{index:040x}" for index in range(1, batch_size + 1)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        abi_path = os.path.join(directory, "TokenQube.json")
+        with open(abi_path, "w") as abi_file:
+            json.dump(TOKEN_QUBE_ABI, abi_file)
+        try:
+            with environment(
+                CONTRACT_ABI_PATH=abi_path,
+                TOKEN_QUBE_CONTRACT_ADDRESS=CONTRACT,
+                OWNER_PRIVATE_KEY=PRIVATE_KEY
+            ):
+                interaction = BlockchainInteraction(network_url=node.url)
+                signer = interaction.w3.eth.account.from_key(PRIVATE_KEY).address
+                single = timed(
+                    lambda: interaction.create_iqube_token(signer, {"bench": True}),
+                    batch_size
+                )
+
+                started = time.perf_counter()
+                results = interaction.create_iqube_tokens(
+                    [(owner, {"index": index}) for index, owner in enumerate(owners)]
+                )
+                elapsed = time.perf_counter() - started
+        finally:
+            node.close()
+
+    return {
+        "batch_size": batch_size,
+        # Sign and send only; the batch below also waits for every receipt
+        "single_send": summarize(single),
+        "batch": {
+            "seconds": elapsed,
+            "confirmed": sum(result["status"] == "confirmed" for result in results),
+            "throughput_per_second": batch_size / elapsed
+        }
+    }
+
+def bench_llm_queries(config: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Concurrent queries through the async client against a stub model API
+    """
+    from src.backend.natural_language_interface import NaturalLanguageInterface
+
+    server = StubServer(stubs.chat_completions(), config.latency, config.jitter, config.seed)
+    count = 32 if config.quick else 256
+
+    async def run() -> Dict[str, Any]:
+        interface = NaturalLanguageInterface(openai_api_key="bench", base_url=server.url)
+        interface.warmup()
+        latencies = []
+
+        async def query(index: int) -> None:
+            started = time.perf_counter()
+            await interface.aprocess_user_query(f"{SAMPLE_TEXTS[index % len(SAMPLE_TEXTS)]} {index}")
+            latencies.append(time.perf_counter() - started)
+
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(query(index) for index in range(count)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await interface.aclose()
+        return summarize(latencies, elapsed=elapsed)
+
+    try:
+        return {"queries": count, "async": asyncio.run(run())}
+    finally:
+        server.close()
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def bench_ws_fanout(config: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Delivery latency of one status change to N WebSocket viewers
+    """
+    import uvicorn
+    import websockets
+
+    from src.backend.main import AigentQubeApp
+    from src.backend.status_registry import InMemoryStatusRegistry
+
+    updates = 10 if config.quick else 50
+    results = {}
+    for clients in ((10, 100) if config.quick else (10, 100, 500)):
+        registry = InMemoryStatusRegistry()
+        registry.put("alpha", {"status": "active", "tick": 0})
+        aigentqube = AigentQubeApp(
+            warmup=False, status_interval=60, status_registry=registry
+        )
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(
+            aigentqube.app, host="127.0.0.1", port=port, log_level="warning"
+        ))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+
+        async def run() -> Dict[str, Any]:
+            url = f"ws://127.0.0.1:{port}/ws/agent/alpha?protocol=delta"
+            sockets = [await websockets.connect(url, max_queue=None) for _ in range(clients)]
+            try:
+                # Every viewer first gets its snapshot
+                await asyncio.gather(*(websocket.recv() for websocket in sockets))
+
+                async def receive(websocket) -> float:
+                    await websocket.recv()
+                    return time.perf_counter()
+
+                # One update at a time, so the hub never coalesces two writes
+                delivery = []
+                started = time.perf_counter()
+                for tick in range(1, updates + 1):
+                    published = time.perf_counter()
+                    registry.put("alpha", {"status": "active", "tick": tick})
+                    arrivals = await asyncio.gather(*(receive(websocket) for websocket in sockets))
+                    delivery.extend(arrival - published for arrival in arrivals)
+                elapsed = time.perf_counter() - started
+            finally:
+                await asyncio.gather(*(websocket.close() for websocket in sockets))
+
+            return summarize(delivery, items=clients * updates, elapsed=elapsed)
+
+        try:
+            results[str(clients)] = asyncio.run(run())
+        finally:
+            server.should_exit = True
+            thread.join()
+    return {"updates": updates, "clients": results}
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {
+    "domain_detection": bench_domain_detection,
+    "wallet_analysis": bench_wallet_analysis,
+    "token_minting": bench_token_minting,
+    "llm_queries": bench_llm_queries,
+    "ws_fanout": bench_ws_fanout,
+}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main(argv: Sequence[str] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads for a fast smoke run")
+    parser.add_argument("--latency", type=float, default=20.0, help="Stub service latency in ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Extra uniform stub latency in ms")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed of the jitter")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/<commit>.json)")
+    config = parser.parse_args(argv)
+    config.latency /= 1000
+    config.jitter /= 1000
+    # Per-request INFO logs of the services would dominate the timings
+    logging.disable(logging.INFO)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "quick": config.quick,
+            "latency_ms": config.latency * 1000,
+            "jitter_ms": config.jitter * 1000,
+            "seed": config.seed
+        },
+        "results": {}
+    }
+    for name in config.only or BENCHMARKS:
+        print(f"Running {name}...", file=sys.stderr)
+        started = time.perf_counter()
+        report["results"][name] = BENCHMARKS[name](config)
+        print(f"  done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    output = config.output or os.path.join(os.path.dirname(__file__), "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as result_file:
+        json.dump(report, result_file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Local HTTP stub server and chat completions bodies shared by benchmarks and tests
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubServer:
+    """
+    Local HTTP server answering JSON requests with a test-supplied handler
+
+    Every reply can be delayed by latency seconds plus uniform jitter to
+    mimic a remote service; seed makes the delays reproducible.
+    """
+    def __init__(self, handler, latency=0.0, jitter=0.0, seed=None):
+        self.handler = handler
+        self.requests = []
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, body):
+                stub.requests.append((self.command, self.path, body))
+                stub.delay()
+                status, payload = stub.handler(self.command, self.path, body)
+                if isinstance(payload, bytes):
+                    encoded, content_type = payload, "text/event-stream"
+                else:
+                    encoded, content_type = json.dumps(payload).encode(), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def do_GET(self):
+                self._respond(None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._respond(json.loads(self.rfile.read(length) or b"null"))
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # The default listen backlog of 5 drops bursts of concurrent
+            # connects, which then wait a full second for the SYN retry
+            request_queue_size = 128
+
+        self.server = Server(("127.0.0.1", 0), RequestHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._random_lock:
+                extra = self._random.uniform(0, self.jitter)
+            time.sleep(self.latency + extra)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def chat_completion(content, total_tokens=10):
+    """
+    Minimal chat completions response body
+    """
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {
+            "prompt_tokens": total_tokens // 2,
+            "completion_tokens": total_tokens - total_tokens // 2,
+            "total_tokens": total_tokens
+        }
+    }
+
+def chat_completion_stream(parts, total_tokens=10):
+    """
+    Server-sent events body of a streamed chat completion
+    """
+    chunks = [
+        {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4",
+            "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]
+        }
+        for part in parts
+    ]
+    chunks.append({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [],
+        "usage": {
+            "prompt_tokens": total_tokens // 2,
+            "completion_tokens": total_tokens - total_tokens // 2,
+            "total_tokens": total_tokens
+        }
+    })
+    events = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode()
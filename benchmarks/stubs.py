@@ -0,0 +1,92 @@
+"""
+Stub JSON-RPC node, Metis REST API and chat completions API for benchmarks
+
+Each factory returns a handler for benchmarks.stub_server.StubServer, which
+adds the configured latency and jitter to every reply.
+"""
+import rlp
+from web3 import Web3
+
+from benchmarks.stub_server import chat_completion, chat_completion_stream
+
+BALANCE_OF_SELECTOR = "0x70a08231"
+DECIMALS_SELECTOR = "0x313ce567"
+
+def _receipt(txn_hash, contract):
+    return {
+        "transactionHash": txn_hash, "transactionIndex": "0x0",
+        "blockHash": "0x" + "22" * 32, "blockNumber": "0x65", "from": contract, "to": contract,
+        "cumulativeGasUsed": "0x1", "gasUsed": "0x1", "effectiveGasPrice": "0x1",
+        "contractAddress": None, "logs": [], "logsBloom": "0x" + "00" * 256,
+        "status": "0x1", "type": "0x0"
+    }
+
+def json_rpc_node(contract="0x00000000000000000000000000000000000000AA", start_nonce=0):
+    """
+    JSON-RPC node answering balance reads and accepting signed transactions
+
+    ERC-20 balanceOf returns the token address as a whole-token amount and
+    decimals() returns 18. Sent transactions are mined immediately.
+    """
+    def answer(request):
+        method, params = request["method"], request.get("params") or []
+        result = {
+            "web3_clientVersion": "stub/1.0",
+            "eth_chainId": "0x440",
+            "eth_gasPrice": hex(10 ** 9),
+            "eth_blockNumber": "0x64",
+            "eth_getBalance": hex(2 * 10 ** 18),
+            "eth_getTransactionCount": hex(start_nonce)
+        }.get(method)
+
+        if method == "eth_call":
+            data, token = params[0]["data"], int(params[0]["to"], 16)
+            value = 18 if data.startswith(DECIMALS_SELECTOR) else token * 10 ** 18
+            result = "0x" + hex(value)[2:].rjust(64, "0")
+        elif method == "eth_sendRawTransaction":
+            rlp.decode(bytes.fromhex(params[0][2:]))
+            result = Web3.keccak(hexstr=params[0]).hex()
+        elif method == "eth_getTransactionReceipt":
+            result = _receipt(params[0], contract)
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def handler(method, path, body):
+        if isinstance(body, list):
+            return 200, [answer(request) for request in body]
+        return 200, answer(body)
+
+    return handler
+
+def metis_api(transactions_per_token=50):
+    """
+    Metis REST API returning a fixed page of transactions per token
+    """
+    def handler(method, path, body):
+        parts = path.split("?")[0].split("/")
+        wallet, token = parts[-4], parts[-2]
+        transactions = [
+            {
+                "hash": f"0x{index:064x}",
+                "blockNumber": str(100 + index),
+                "timeStamp": 1_700_000_000 + index * 60,
+                "value": index % 7 + 1,
+                "from": token if index % 2 else wallet,
+                "to": wallet if index % 2 else token
+            }
+            for index in range(transactions_per_token)
+        ]
+        return 200, {"transactions": transactions}
+
+    return handler
+
+def chat_completions(total_tokens=42):
+    """
+    Chat completions API echoing the last user message, streamed on request
+    """
+    def handler(method, path, body):
+        content = body["messages"][-1]["content"]
+        if body.get("stream"):
+            return 200, chat_completion_stream(content.split(" "), total_tokens)
+        return 200, chat_completion(content, total_tokens)
+
+    return handler
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from web3 import Web3
+
+from .blockchain_monitor import (
+    build_activity_metrics,
+    collect_balances,
+    eth_call_batch_payload,
+    parse_eth_call_batch,
+    plan_balance_calls,
+)
+from .wallet_analytics import WalletMetricsEngine
+
+class HostRateLimiter:
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize a token-bucket rate limiter with one bucket per key
+
+        :param rate: Requests per second allowed per key
+        :param burst: Bucket capacity (defaults to one second worth of requests)
+        :param clock: Monotonic time source, injectable for tests
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._clock = clock
+        self._buckets: Dict[str, List[float]] = {}
+
+    async def acquire(self, key: str) -> None:
+        """
+        Wait until a request for key is allowed
+
+        :param key: Bucket key, usually a host name
+        """
+        while True:
+            now = self._clock()
+            tokens, updated_at = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+
+            if tokens >= 1:
+                self._buckets[key] = [tokens - 1, now]
+                return
+
+            self._buckets[key] = [tokens, now]
+            await asyncio.sleep((1 - tokens) / self.rate)
+
+class AsyncMetisBlockchainMonitor:
+    def __init__(
+        self,
+        metis_api_key: str,
+        wallet_address: str,
+        rpc_url: str = 'https://metis-mainnet.public.blastapi.io',
+        metis_base_url: str = "https://api.metis.io/v1",
+        max_batch_size: int = 100,
+        max_concurrency: int = 10,
+        requests_per_second: Optional[float] = None,
+        request_timeout: float = 30.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        decimals_cache: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initialize asyncio-based Metis Blockchain Monitor
+
+        All requests share one pooled keep-alive HTTP client, a concurrency
+        limit and an optional per-host rate limit. The client, limiter and
+        decimals cache can be injected to share them across many wallets.
+        Unlike MetisBlockchainMonitor it talks to a single rpc_url and does
+        not go through an RPCPool, so there is no endpoint failover; point
+        rpc_url at a load balancer when that is needed.
+
+        :param metis_api_key: API key for Metis blockchain services
+        :param wallet_address: Ethereum wallet address to monitor
+        :param rpc_url: Metis JSON-RPC endpoint (one URL, without failover)
+        :param metis_base_url: Metis REST API base URL
+        :param max_batch_size: Maximum calls packed into one JSON-RPC batch request
+        :param max_concurrency: Maximum in-flight HTTP requests of this monitor
+        :param requests_per_second: Optional per-host request rate limit
+        :param request_timeout: Per-request timeout in seconds
+        :param http_client: Optional shared async HTTP client
+        :param rate_limiter: Optional shared rate limiter (overrides requests_per_second)
+        :param decimals_cache: Optional shared cache of token decimals
+        """
+        self.api_key = metis_api_key
+        self.wallet_address = Web3.to_checksum_address(wallet_address)
+        self.rpc_url = rpc_url
+        self.metis_base_url = metis_base_url
+        self.max_batch_size = max_batch_size
+
+        self._owns_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency
+            ),
+            timeout=request_timeout
+        )
+        self.rate_limiter = rate_limiter or (
+            HostRateLimiter(requests_per_second) if requests_per_second else None
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._decimals = decimals_cache if decimals_cache is not None else {}
+
+        self.logger = logging.getLogger(__name__)
+
+    async def __aenter__(self) -> "AsyncMetisBlockchainMonitor":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Close the HTTP client if this monitor created it
+        """
+        if self._owns_client:
+            await self.http_client.aclose()
+
+    async def get_wallet_balance(self, token_contract_address: Optional[str] = None) -> float:
+        """
+        Retrieve wallet balance for native or ERC-20 token
+
+        :param token_contract_address: Optional contract address for specific token
+        :return: Balance of the token
+        """
+        try:
+            if token_contract_address:
+                balances = await self.get_wallet_balances([token_contract_address])
+                return balances[token_contract_address]
+
+            reply = await self._request("POST", self.rpc_url, json={
+                "jsonrpc": "2.0",
+                "id": 0,
+                "method": "eth_getBalance",
+                "params": [self.wallet_address, "latest"]
+            })
+            return float(Web3.from_wei(int(reply["result"], 16), 'ether'))
+        except Exception as e:
+            self.logger.error(f"Error retrieving wallet balance: {e}")
+            return 0.0
+
+    async def get_wallet_balances(self, token_contract_addresses: List[str]) -> Dict[str, float]:
+        """
+        Retrieve ERC-20 balances with concurrently sent JSON-RPC batches
+
+        :param token_contract_addresses: Contract addresses of the tokens
+        :return: Balance per token address, 0.0 for tokens that failed
+        """
+        balances = {token: 0.0 for token in token_contract_addresses}
+        if not token_contract_addresses:
+            return balances
+
+        try:
+            checksummed, calls = plan_balance_calls(
+                self.wallet_address, token_contract_addresses, self._decimals
+            )
+            chunks = [
+                calls[start:start + self.max_batch_size]
+                for start in range(0, len(calls), self.max_batch_size)
+            ]
+            replies = await asyncio.gather(*(
+                self._request("POST", self.rpc_url, json=eth_call_batch_payload(chunk))
+                for chunk in chunks
+            ))
+
+            results: Dict[Any, Optional[int]] = {}
+            for chunk, reply in zip(chunks, replies):
+                results.update(parse_eth_call_batch(chunk, reply))
+
+            balances, failed = collect_balances(checksummed, results, self._decimals)
+            for token in failed:
+                self.logger.error(f"Error retrieving balance for token {token}")
+
+        except Exception as e:
+            self.logger.error(f"Error retrieving wallet balances: {e}")
+
+        return balances
+
+    async def get_token_transactions(self, token_contract_address: str, limit: int = 50) -> List[Dict]:
+        """
+        Retrieve recent token transactions for a specific contract
+
+        :param token_contract_address: Contract address of the token
+        :param limit: Maximum number of transactions to retrieve
+        :return: List of recent transactions
+        """
+        try:
+            endpoint = f"{self.metis_base_url}/wallets/{self.wallet_address}/tokens/{token_contract_address}/transactions"
+            reply = await self._request(
+                "GET",
+                endpoint,
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                },
+                params={'limit': limit}
+            )
+            transactions = reply.get('transactions', [])
+            if not isinstance(transactions, list):
+                raise ValueError(f"Unexpected transactions payload: {type(transactions).__name__}")
+            return transactions
+        except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Transport failures and malformed bodies alike only lose this token
+            self.logger.error(f"Error retrieving token transactions: {e}")
+            return []
+
+    async def analyze_wallet_activity(self, tracked_tokens: Optional[List[str]] = None) -> Dict:
+        """
+        Comprehensive wallet activity analysis with all reads in flight at once
+
+        Wall-clock time follows the slowest request rather than the sum of all.
+
+        :param tracked_tokens: Optional list of token contract addresses to track
+        :return: Dictionary of wallet activity metrics
+        """
+        try:
+            tracked_tokens = tracked_tokens or []
+
+            native_balance, token_balances, *transaction_lists = await asyncio.gather(
+                self.get_wallet_balance(),
+                self.get_wallet_balances(tracked_tokens),
+                *(self.get_token_transactions(token) for token in tracked_tokens)
+            )
+
+            engine = WalletMetricsEngine()
+            for token, transactions in zip(tracked_tokens, transaction_lists):
+                engine.add_transactions(token, transactions, self.wallet_address)
+
+            return build_activity_metrics(native_balance, token_balances, engine)
+        except Exception as e:
+            self.logger.error(f"Error analyzing wallet activity: {e}")
+            return {}
+
+    async def _request(self, method: str, url: str, **kwargs) -> Any:
+        """
+        Send one request through the concurrency and rate limits
+
+        :param method: HTTP method
+        :param url: Request URL
+        :return: Decoded JSON body
+        """
+        async with self._semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(urlsplit(url).netloc)
+            response = await self.http_client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json()
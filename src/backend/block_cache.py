@@ -0,0 +1,318 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from .cache import SingleFlight, SQLiteTTLCache, TTLCache
+
+BlockIdentifier = Union[int, str]
+
+# (address, method, args) identifying one read
+Read = Tuple[str, str, Tuple]
+
+# (block number, block hash) of a chain head
+Head = Tuple[int, str]
+
+_MISSING = object()
+
+def chain_head(web3: Any) -> Head:
+    """
+    Read the number and hash of the latest block in one request
+
+    :param web3: Web3 instance
+    :return: (block number, block hash)
+    """
+    block = web3.eth.get_block("latest")
+    block_hash = block["hash"]
+    return block["number"], block_hash.hex() if isinstance(block_hash, bytes) else str(block_hash)
+
+class BlockReadCache:
+    def __init__(
+        self,
+        block_number_fn: Optional[Callable[[], int]] = None,
+        maxsize: int = 4096,
+        disk_path: Optional[str] = None,
+        disk_maxsize: int = 100000,
+        head_ttl: float = 2.0,
+        confirmations: int = 12,
+        clock: Callable[[], float] = time.monotonic,
+        head_fn: Optional[Callable[[], Head]] = None
+    ):
+        """
+        Initialize a cache of on-chain reads keyed by block
+
+        A read at a fixed block never changes, so results are cached under
+        (address, method, args, block) without expiry. "latest" is resolved
+        at most once per head_ttl, or whenever a new block is announced
+        through notify_new_block(), so repeated reads within a block hit the
+        cache.
+
+        Blocks less than `confirmations` deep can still be replaced by a
+        reorg, so when head_fn also reports the head hash, reads of those
+        blocks are keyed by hash: a block replaced at the same height gets
+        new keys, and since a hash pins the block contents such results go
+        to the optional disk tier right away. Deeper results, and every
+        result when only block numbers are known, are keyed by number and
+        persisted once `confirmations` deep.
+
+        :param block_number_fn: Returns the current chain head block number (used without head_fn)
+        :param maxsize: Maximum entries of the in-memory LRU tier
+        :param disk_path: Optional SQLite file of the persistent tier
+        :param disk_maxsize: Maximum entries of the disk tier
+        :param head_ttl: Seconds a resolved "latest" block stays valid without notifications
+        :param confirmations: Depth below the head before a result is persisted
+        :param clock: Monotonic time source, injectable for tests
+        :param head_fn: Returns (number, hash) of the chain head, e.g. chain_head(web3)
+        """
+        if block_number_fn is None and head_fn is None:
+            raise ValueError("block_number_fn or head_fn is required")
+        self.block_number_fn = block_number_fn
+        self.head_fn = head_fn
+        self.head_ttl = head_ttl
+        self.confirmations = confirmations
+        self._clock = clock
+
+        self.memory = TTLCache(maxsize)
+        self.disk = SQLiteTTLCache(disk_path, maxsize=disk_maxsize) if disk_path else None
+        self._flight = SingleFlight()
+
+        self._head: Optional[int] = None
+        # Hashes of recent heads that a reorg could still replace
+        self._hashes: Dict[int, str] = {}
+        self._head_resolved_at = 0.0
+        self._head_lock = threading.Lock()
+        self.head_lookups = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def head(self) -> Optional[int]:
+        return self._head
+
+    def notify_new_block(self, block_number: int, block_hash: Optional[str] = None) -> None:
+        """
+        Announce a new chain head, e.g. from a block filter or subscription
+
+        A head lower than the current one, or a hash differing from the one
+        seen earlier at the same height, signals a reorg: in-memory results
+        of the abandoned blocks are dropped. Persisted results are either
+        `confirmations` deep or keyed by the hash of their block and are kept.
+
+        :param block_number: New head block number
+        :param block_hash: Optional hash of the new head block
+        """
+        with self._head_lock:
+            replaced = block_hash is not None and self._hashes.get(block_number, block_hash) != block_hash
+            if replaced or (self._head is not None and block_number < self._head):
+                self.memory.clear()
+                self._hashes = {
+                    number: known for number, known in self._hashes.items() if number < block_number
+                }
+            self._head = block_number
+            if block_hash is not None:
+                self._hashes[block_number] = block_hash
+            for number in [number for number in self._hashes if number < block_number - self.confirmations]:
+                del self._hashes[number]
+            self._head_resolved_at = self._clock()
+
+    def resolve_block(self, block: BlockIdentifier = "latest") -> int:
+        """
+        Resolve a block identifier to a block number
+
+        :param block: Block number or "latest"
+        :return: Block number
+        """
+        if isinstance(block, int):
+            return block
+        if block != "latest":
+            raise ValueError(f"Unsupported block identifier: {block}")
+
+        with self._head_lock:
+            fresh = (
+                self._head is not None
+                and self._clock() - self._head_resolved_at < self.head_ttl
+            )
+            if fresh:
+                return self._head
+
+        if self.head_fn is not None:
+            block_number, block_hash = self.head_fn()
+        else:
+            block_number, block_hash = self.block_number_fn(), None
+        self.head_lookups += 1
+        # The hash is checked on every lookup to catch reorgs at the same height
+        if block_number != self._head or block_hash is not None:
+            self.notify_new_block(block_number, block_hash)
+        else:
+            with self._head_lock:
+                self._head_resolved_at = self._clock()
+        return block_number
+
+    def get_or_load(
+        self,
+        address: str,
+        method: str,
+        args: Tuple,
+        loader: Callable[[int], Any],
+        block: BlockIdentifier = "latest"
+    ) -> Any:
+        """
+        Return the cached result of a read, loading it once per block
+
+        Concurrent misses for the same key share one loader call.
+
+        :param address: Contract or account address read from
+        :param method: Contract function or RPC method name
+        :param args: Hashable call arguments
+        :param loader: Performs the read at the given block number
+        :param block: Block number or "latest"
+        :return: Read result
+        """
+        block_number = self.resolve_block(block)
+        key = self._key(address, method, args, block_number)
+
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        disk_key = self._disk_key(key)
+        if self.disk is not None:
+            value = self.disk.get(disk_key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+
+        value, _ = self._flight.do(key, lambda: self._load(key, disk_key, loader, block_number))
+        return value
+
+    def get_or_load_many(
+        self,
+        reads: Sequence[Read],
+        loader: Callable[[List[Read], int], Dict[Read, Any]],
+        block: BlockIdentifier = "latest"
+    ) -> Dict[Read, Any]:
+        """
+        Return cached results of many reads, loading every miss in one call
+
+        Lets batched reads (e.g. one JSON-RPC batch) share the cache with
+        single reads. A None result means the read failed and is not cached.
+
+        :param reads: (address, method, args) reads
+        :param loader: Performs the missing reads at the given block number
+        :param block: Block number or "latest"
+        :return: Result per read, None for failed reads
+        """
+        block_number = self.resolve_block(block)
+        results: Dict[Read, Any] = {}
+        missing: List[Read] = []
+
+        for read in dict.fromkeys(reads):
+            key = self._key(*read, block_number)
+            value = self.memory.get(key, _MISSING)
+            if value is _MISSING and self.disk is not None:
+                value = self.disk.get(self._disk_key(key), _MISSING)
+                if value is not _MISSING:
+                    self.memory.set(key, value)
+            if value is _MISSING:
+                missing.append(read)
+            else:
+                results[read] = value
+
+        if missing:
+            loaded = loader(missing, block_number)
+            for read in missing:
+                value = loaded.get(read)
+                results[read] = value
+                if value is not None:
+                    key = self._key(*read, block_number)
+                    self._store(key, self._disk_key(key), value, block_number)
+        return results
+
+    def call(self, contract_function: Any, block: BlockIdentifier = "latest") -> Any:
+        """
+        Cached equivalent of contract_function.call()
+
+        :param contract_function: Bound web3 ContractFunction
+        :param block: Block number or "latest"
+        :return: Decoded call result
+        """
+        return self.get_or_load(
+            contract_function.address,
+            contract_function.fn_name,
+            tuple(contract_function.args),
+            lambda block_number: contract_function.call(block_identifier=block_number),
+            block
+        )
+
+    def get_balance(self, web3: Any, address: str, block: BlockIdentifier = "latest") -> int:
+        """
+        Cached equivalent of web3.eth.get_balance(address)
+
+        :param web3: Web3 instance
+        :param address: Account address
+        :param block: Block number or "latest"
+        :return: Balance in wei
+        """
+        return self.get_or_load(
+            address,
+            "eth_getBalance",
+            (),
+            lambda block_number: web3.eth.get_balance(address, block_identifier=block_number),
+            block
+        )
+
+    def clear(self) -> None:
+        self.memory.clear()
+        with self._head_lock:
+            self._hashes.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache effectiveness counters
+
+        :return: Head state and stats per tier
+        """
+        return {
+            "head": self._head,
+            "head_lookups": self.head_lookups,
+            "coalesced": self._flight.coalesced,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
+
+    def _load(
+        self,
+        key: Hashable,
+        disk_key: str,
+        loader: Callable[[int], Any],
+        block_number: int
+    ) -> Any:
+        value = loader(block_number)
+        self._store(key, disk_key, value, block_number)
+        return value
+
+    def _key(self, address: str, method: str, args: Tuple, block_number: int) -> Tuple:
+        # Recent blocks are told apart by hash, deep ones are final by number
+        with self._head_lock:
+            deep = self._head is not None and block_number <= self._head - self.confirmations
+            block_hash = None if deep else self._hashes.get(block_number)
+        block = block_number if block_hash is None else (block_number, block_hash)
+        return (address.lower(), method, tuple(args), block)
+
+    def _store(self, key: Tuple, disk_key: str, value: Any, block_number: int) -> None:
+        self.memory.set(key, value)
+
+        # Only results pinned to a block hash or deep enough to survive reorgs are persisted
+        if self.disk is not None and self._head is not None:
+            if isinstance(key[-1], tuple) or block_number <= self._head - self.confirmations:
+                try:
+                    self.disk.set(disk_key, value)
+                except TypeError:
+                    self.logger.debug(f"Result of {key} is not JSON-serializable, not persisted")
+
+    @staticmethod
+    def _disk_key(key: Tuple) -> str:
+        return json.dumps(key, default=str)
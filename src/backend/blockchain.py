@@ -1,38 +1,113 @@
+import functools
+import json
+import logging
 import os
-from typing import Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple, Union
 
 from web3 import Web3
+from web3.exceptions import TimeExhausted
 from web3.middleware import geth_poa_middleware
 from dotenv import load_dotenv
 
+from .block_cache import BlockIdentifier, BlockReadCache, chain_head
+from .metadata_codec import MetadataCodec
+from .nonce_manager import NonceManager
+from .rpc_pool import PooledHTTPProvider, RPCPool
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=32)
+def _parse_abi(abi_path: str, modified_ns: int) -> list:
+    """
+    Parse an ABI file once per path and modification time
+    """
+    with open(abi_path, 'r') as abi_file:
+        return json.load(abi_file)
+
 class BlockchainInteraction:
-    def __init__(self, network_url: str = None):
+    def __init__(
+        self,
+        network_url: Union[str, Sequence[str], None] = None,
+        read_cache: Optional[BlockReadCache] = None,
+        metadata_codec: Optional[MetadataCodec] = None,
+        rpc_pool: Optional[RPCPool] = None
+    ):
         """
         Initialize blockchain connection
         
-        :param network_url: Blockchain network URL (Sepolia testnet by default)
+        :param network_url: Blockchain network URL(s), comma-separated or a list (Sepolia testnet by default)
+        :param read_cache: Optional block-keyed cache of contract reads (one is created by default)
+        :param metadata_codec: Encoder of token metadata (compact canonical JSON by default)
+        :param rpc_pool: Optional shared endpoint pool (overrides network_url)
         """
         self.network_url = network_url or os.getenv(
             'NETWORK_URL', 
             'https://sepolia.infura.io/v3/YOUR_INFURA_PROJECT_ID'
         )
         
-        self.w3 = Web3(Web3.HTTPProvider(self.network_url))
+        # Every request is spread over the endpoints with failover
+        self.rpc_pool = rpc_pool or RPCPool(self.network_url)
+        self.w3 = Web3(PooledHTTPProvider(self.rpc_pool))
         self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        self.read_cache = read_cache or BlockReadCache(head_fn=lambda: chain_head(self.w3))
+        self.nonce_manager = NonceManager(self.w3)
+        self.metadata_codec = metadata_codec or MetadataCodec()
+        self._chain_id: Optional[int] = None
         
-        # Contract interaction setup
+        # Contract interaction setup; the ABI is read and the node contacted on first use
         self.contract_address = os.getenv('TOKEN_QUBE_CONTRACT_ADDRESS')
-        self.contract_abi = self._load_contract_abi()
+        self.abi_path = os.getenv(
+            'CONTRACT_ABI_PATH', 
+            'contracts/TokenQube.json'
+        )
+        self._contract = None
+        self._contract_lock = threading.Lock()
+    
+    @property
+    def contract_abi(self) -> list:
+        return self._load_contract_abi()
+    
+    @property
+    def contract(self):
+        """
+        TokenQube contract, connected on first use
         
-        if self.w3.is_connected():
-            self.contract = self.w3.eth.contract(
-                address=self.contract_address, 
-                abi=self.contract_abi
-            )
-        else:
-            raise ConnectionError("Could not connect to blockchain network")
+        :raises ConnectionError: If the network cannot be reached
+        """
+        if self._contract is None:
+            with self._contract_lock:
+                if self._contract is None:
+                    contract_abi = self._load_contract_abi()
+                    if not self.w3.is_connected():
+                        raise ConnectionError("Could not connect to blockchain network")
+                    self._contract = self.w3.eth.contract(
+                        address=self.contract_address, 
+                        abi=contract_abi
+                    )
+        return self._contract
+    
+    def warmup(self) -> threading.Thread:
+        """
+        Connect to the network and load the contract in a background thread
+        
+        Failures are logged; the next use of the contract retries.
+        
+        :return: The started daemon thread
+        """
+        def connect():
+            try:
+                self.contract
+                self._get_chain_id()
+            except Exception as e:
+                logger.warning(f"Blockchain warmup failed: {e}")
+        
+        thread = threading.Thread(target=connect, name="blockchain-warmup", daemon=True)
+        thread.start()
+        return thread
     
     def _load_contract_abi(self) -> list:
         """
@@ -40,17 +115,10 @@ class BlockchainInteraction:
         
         :return: Contract ABI as list
         """
-        import json
-        abi_path = os.getenv(
-            'CONTRACT_ABI_PATH', 
-            'contracts/TokenQube.json'
-        )
-        
         try:
-            with open(abi_path, 'r') as abi_file:
-                return json.load(abi_file)
+            return _parse_abi(self.abi_path, os.stat(self.abi_path).st_mtime_ns)
         except FileNotFoundError:
-            raise FileNotFoundError(f"Contract ABI not found at {abi_path}")
+            raise FileNotFoundError(f"Contract ABI not found at {self.abi_path}")
     
     def create_iqube_token(self, owner_address: str, metadata: Dict[str, Any]) -> str:
         """
@@ -60,46 +128,170 @@ class BlockchainInteraction:
         :param metadata: iQube token metadata
         :return: Transaction hash of token creation
         """
-        # Placeholder for actual token creation logic
-        # This would interact with the smart contract's token creation method
+        try:
+            return self._send_create_token(
+                owner_address, metadata, owner_address, os.getenv('OWNER_PRIVATE_KEY')
+            )
+        except Exception as e:
+            raise RuntimeError(f"Token creation failed: {e}")
+    
+    def create_iqube_tokens(
+        self,
+        batch: Iterable[Tuple[str, Dict[str, Any]]],
+        wait_for_receipts: bool = True,
+        receipt_timeout: float = 120.0,
+        max_workers: int = 16
+    ) -> List[Dict[str, Any]]:
+        """
+        Create many iQube tokens with pipelined transactions
+        
+        Transactions are signed with locally allocated nonces and sent back
+        to back without waiting for each other; receipts are then awaited
+        concurrently. A transaction that fails before it is sent returns its
+        nonce so the next one reuses it; after a failed send the nonce is
+        resynced from the node's pending count, since the node may have
+        accepted it, so no gap or reused nonce blocks the account.
+        
+        :param batch: (owner address, metadata) pairs
+        :param wait_for_receipts: Wait until every sent transaction is mined
+        :param receipt_timeout: Seconds to wait for each receipt
+        :param max_workers: Receipts awaited in parallel
+        :return: Per-token result with owner, transaction_hash, status and error
+        """
+        private_key = os.getenv('OWNER_PRIVATE_KEY')
+        sender = self.w3.eth.account.from_key(private_key).address
+        
+        results = []
+        for owner_address, metadata in batch:
+            result = {'owner': owner_address, 'transaction_hash': None, 'status': 'sent', 'error': None}
+            try:
+                result['transaction_hash'] = self._send_create_token(
+                    owner_address, metadata, sender, private_key
+                )
+            except Exception as e:
+                result.update(status='error', error=str(e))
+            results.append(result)
+        
+        if wait_for_receipts:
+            sent = [result for result in results if result['transaction_hash']]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for result, outcome in zip(sent, executor.map(
+                    lambda result: self._wait_for_receipt(result['transaction_hash'], receipt_timeout),
+                    sent
+                )):
+                    result.update(outcome)
+        
+        return results
+    
+    def _send_create_token(
+        self,
+        owner_address: str,
+        metadata: Dict[str, Any],
+        sender: str,
+        private_key: str
+    ) -> str:
+        """
+        Sign and send one createToken transaction without blocking on the node
+        
+        :param owner_address: Blockchain address of token owner
+        :param metadata: iQube token metadata
+        :param sender: Account signing the transaction
+        :param private_key: Private key of sender
+        :return: Transaction hash
+        """
+        nonce = self.nonce_manager.allocate(sender)
         try:
             txn = self.contract.functions.createToken(
-                owner_address,
-                str(metadata)  # Convert metadata to string for storage
+                Web3.to_checksum_address(owner_address),
+                self.metadata_codec.encode(metadata)
             ).build_transaction({
-                'from': owner_address,
-                'nonce': self.w3.eth.get_transaction_count(owner_address),
+                'from': sender,
+                'nonce': nonce,
                 'gas': 2000000,
-                'gasPrice': self.w3.eth.gas_price
+                'gasPrice': self._gas_price(),
+                'chainId': self._get_chain_id()
             })
             
-            signed_txn = self.w3.eth.account.sign_transaction(
-                txn, 
-                private_key=os.getenv('OWNER_PRIVATE_KEY')
-            )
-            
+            signed_txn = self.w3.eth.account.sign_transaction(txn, private_key=private_key)
+        except Exception:
+            # Nothing reached the node, so the nonce is still free
+            self.nonce_manager.release(sender, nonce)
+            raise
+        
+        try:
             txn_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            return txn_hash.hex()
+        except Exception:
+            # The node may have taken the nonce (a timeout after it accepted
+            # the transaction) or be ahead of the local counter; start over
+            # from its pending count
+            self.nonce_manager.resync(sender)
+            raise
         
+        return txn_hash.hex()
+    
+    def _wait_for_receipt(self, txn_hash: str, timeout: float) -> Dict[str, Any]:
+        try:
+            receipt = self.w3.eth.wait_for_transaction_receipt(txn_hash, timeout=timeout)
+            return {
+                'status': 'confirmed' if receipt['status'] == 1 else 'reverted',
+                'block_number': receipt['blockNumber']
+            }
+        except TimeExhausted:
+            return {'status': 'pending'}
         except Exception as e:
-            raise RuntimeError(f"Token creation failed: {e}")
+            return {'status': 'error', 'error': str(e)}
+    
+    def _gas_price(self) -> int:
+        """
+        Current gas price, read from the node at most once per block
+        """
+        return self.read_cache.get_or_load(
+            'network', 'eth_gasPrice', (), lambda block_number: self.w3.eth.gas_price
+        )
+    
+    def _get_chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
     
-    def get_iqube_token_details(self, token_id: str) -> Dict[str, Any]:
+    def get_iqube_token_details(
+        self,
+        token_id: str,
+        block_identifier: BlockIdentifier = "latest"
+    ) -> Dict[str, Any]:
         """
         Retrieve details of an existing iQube token
         
+        Reads are cached per block with their metadata already decoded, so
+        repeated lookups within a block neither reach the node nor decode
+        again. Metadata is returned as plain JSON-compatible values shared
+        with the cache; treat it as read-only.
+        
         :param token_id: Unique identifier of the iQube token
+        :param block_identifier: Block number or "latest"
         :return: Token details dictionary
         """
         try:
-            token_details = self.contract.functions.getTokenDetails(token_id).call()
-            return {
-                'owner': token_details[0],
-                'metadata': token_details[1],
-                'creation_timestamp': token_details[2]
-            }
+            function = self.contract.functions.getTokenDetails(token_id)
+            token_details = self.read_cache.get_or_load(
+                function.address,
+                'getTokenDetails:decoded',
+                tuple(function.args),
+                lambda block_number: self._decode_token_details(
+                    function.call(block_identifier=block_number)
+                ),
+                block_identifier
+            )
+            return dict(token_details)
         except Exception as e:
             raise RuntimeError(f"Could not retrieve token details: {e}")
+    
+    def _decode_token_details(self, token_details: Sequence[Any]) -> Dict[str, Any]:
+        return {
+            'owner': token_details[0],
+            'metadata': self.metadata_codec.decode(token_details[1]),
+            'creation_timestamp': token_details[2]
+        }
 
 # Example usage
 if __name__ == "__main__":
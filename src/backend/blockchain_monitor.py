@@ -1,22 +1,225 @@
+import os
+import threading
+import numpy as np
 import requests
 from web3 import Web3
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .block_cache import BlockIdentifier, BlockReadCache, chain_head
+from .metrics import REGISTRY
+from .rpc_pool import PooledHTTPProvider, RPCPool
+from .transaction_store import TransactionStore, transaction_key
+from .wallet_analytics import TransactionColumns, WalletMetricsEngine
+
+DEFAULT_METIS_RPC_URL = 'https://metis-mainnet.public.blastapi.io'
+
+METIS_REQUEST_SECONDS = REGISTRY.histogram(
+    'aigentqube_metis_request_seconds', 'Metis REST API request latency'
+)
+METIS_ERRORS = REGISTRY.counter(
+    'aigentqube_metis_errors_total', 'Failed Metis REST API requests'
+)
+
+# 4-byte selectors of the read-only ERC-20 calls packed into JSON-RPC batches
+BALANCE_OF_SELECTOR = "0x70a08231"
+DECIMALS_SELECTOR = "0x313ce567"
+
+def plan_balance_calls(
+    wallet_address: str,
+    token_contract_addresses: List[str],
+    known_decimals: Dict[str, int]
+) -> Tuple[Dict[str, str], List[tuple]]:
+    """
+    Plan the eth_calls needed to read many ERC-20 balances of one wallet
+
+    :param wallet_address: Checksummed wallet address
+    :param token_contract_addresses: Contract addresses of the tokens
+    :param known_decimals: Cached decimals per checksummed token address
+    :return: (checksummed address per token, (key, address, calldata) calls)
+    """
+    checksummed = {
+        token: Web3.to_checksum_address(token)
+        for token in token_contract_addresses
+    }
+    owner_argument = wallet_address[2:].lower().rjust(64, "0")
+
+    calls = []
+    for token, address in checksummed.items():
+        calls.append((("balance", token), address, BALANCE_OF_SELECTOR + owner_argument))
+    for address in sorted(set(checksummed.values()) - set(known_decimals)):
+        calls.append((("decimals", address), address, DECIMALS_SELECTOR))
+
+    return checksummed, calls
+
+def eth_call_batch_payload(calls: List[tuple], block: BlockIdentifier = "latest") -> List[Dict]:
+    """
+    Build a JSON-RPC batch of eth_call requests, using list positions as ids
+
+    :param calls: (key, contract address, calldata) tuples
+    :param block: Block number or tag every call reads at
+    :return: JSON-RPC batch payload
+    """
+    block_tag = hex(block) if isinstance(block, int) else block
+    return [
+        {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "eth_call",
+            "params": [{"to": address, "data": data}, block_tag]
+        }
+        for request_id, (_, address, data) in enumerate(calls)
+    ]
+
+def parse_eth_call_batch(calls: List[tuple], body: Any) -> Dict[Any, Optional[int]]:
+    """
+    Decode a JSON-RPC batch reply to uint256 results keyed like the calls
+
+    :param calls: Calls the batch was built from
+    :param body: Decoded JSON reply
+    :return: Result per call key, None for failed calls
+    """
+    if isinstance(body, dict):
+        # Providers answer a rejected batch with a single error object
+        raise RuntimeError(f"JSON-RPC batch rejected: {body.get('error')}")
+
+    replies = {reply.get("id"): reply for reply in body}
+    results: Dict[Any, Optional[int]] = {}
+    for request_id, (key, _, _) in enumerate(calls):
+        result = replies.get(request_id, {}).get("result")
+        results[key] = int(result, 16) if result not in (None, "0x") else None
+    return results
+
+def collect_balances(
+    checksummed: Dict[str, str],
+    results: Dict[Any, Optional[int]],
+    decimals_cache: Dict[str, int]
+) -> Tuple[Dict[str, float], List[str]]:
+    """
+    Turn raw balanceOf/decimals results into token balances
+
+    Newly read decimals are stored in decimals_cache.
+
+    :param checksummed: Checksummed address per requested token
+    :param results: Decoded call results
+    :param decimals_cache: Cached decimals per checksummed token address
+    :return: (balance per token, tokens whose balance could not be read)
+    """
+    for (kind, address), value in results.items():
+        if kind == "decimals" and value is not None:
+            decimals_cache[address] = value
+
+    balances = {}
+    failed = []
+    for token, address in checksummed.items():
+        raw_balance = results.get(("balance", token))
+        token_decimals = decimals_cache.get(address)
+        if raw_balance is None or token_decimals is None:
+            failed.append(token)
+            balances[token] = 0.0
+        else:
+            balances[token] = raw_balance / (10 ** token_decimals)
+    return balances, failed
+
+def calculate_transaction_volume(transactions: List[Dict]) -> float:
+    """
+    Calculate total transaction volume
+
+    :param transactions: List of transactions
+    :return: Total transaction volume
+    """
+    return float(np.fromiter(
+        (float(transaction.get('value', 0) or 0) for transaction in transactions),
+        dtype=np.float64,
+        count=len(transactions)
+    ).sum())
+
+def calculate_activity_score(transactions: List[Dict]) -> float:
+    """
+    Generate a wallet activity score
+
+    :param transactions: List of transactions
+    :return: Activity score between 0-100
+    """
+    transaction_count = len(transactions)
+    volume = calculate_transaction_volume(transactions)
+
+    # Simple activity scoring mechanism
+    return min(
+        (transaction_count * volume) / 10000,
+        100  # Cap at 100
+    )
+
+def build_activity_metrics(
+    native_balance: float,
+    token_balances: Dict[str, float],
+    engine: WalletMetricsEngine
+) -> Dict:
+    """
+    Assemble the analyze_wallet_activity result from a metrics engine
+
+    :param native_balance: Native token balance
+    :param token_balances: Balance per tracked token
+    :param engine: Engine holding the wallet's transactions
+    :return: Dictionary of wallet activity metrics
+    """
+    return {
+        'native_balance': native_balance,
+        'token_balances': token_balances,
+        **engine.metrics()
+    }
 
 class MetisBlockchainMonitor:
-    def __init__(self, metis_api_key: str, wallet_address: str):
+    def __init__(
+        self,
+        metis_api_key: str,
+        wallet_address: str,
+        rpc_url: Union[str, Sequence[str], None] = None,
+        max_batch_size: int = 100,
+        metis_base_url: str = "https://api.metis.io/v1",
+        store: Optional[TransactionStore] = None,
+        page_size: int = 50,
+        read_cache: Optional[BlockReadCache] = None,
+        rpc_pool: Optional[RPCPool] = None
+    ):
         """
         Initialize Metis Blockchain Monitor
         
         :param metis_api_key: API key for Metis blockchain services
         :param wallet_address: Ethereum wallet address to monitor
+        :param rpc_url: Metis JSON-RPC endpoint(s); METIS_RPC_URLS or the public Blast node by default
+        :param max_batch_size: Maximum calls packed into one JSON-RPC batch request
+        :param metis_base_url: Metis REST API base URL
+        :param store: Optional local store enabling incremental ingestion
+        :param page_size: Transactions requested per page when syncing the store
+        :param read_cache: Optional block-keyed cache of balance reads (one is created by default)
+        :param rpc_pool: Optional shared endpoint pool (overrides rpc_url)
         """
         self.api_key = metis_api_key
         self.wallet_address = Web3.to_checksum_address(wallet_address)
-        self.metis_base_url = "https://api.metis.io/v1"
+        self.metis_base_url = metis_base_url
+        self.rpc_pool = rpc_pool or RPCPool(
+            rpc_url or os.getenv('METIS_RPC_URLS', DEFAULT_METIS_RPC_URL)
+        )
+        self.rpc_url = self.rpc_pool.endpoints[0].url
+        self.max_batch_size = max_batch_size
+        self.store = store
+        self.page_size = page_size
         
         # Configure Web3 provider
-        self.web3 = Web3(Web3.HTTPProvider('https://metis-mainnet.public.blastapi.io'))
+        self.web3 = Web3(PooledHTTPProvider(self.rpc_pool))
+        self.session = requests.Session()
+        self.read_cache = read_cache or BlockReadCache(head_fn=lambda: chain_head(self.web3))
+
+        # Contract objects are reused and decimals() never changes for a token
+        self._contracts: Dict[str, Any] = {}
+        self._decimals: Dict[str, int] = {}
+
+        # Metrics of the stored history, fed only rows stored since the last analysis
+        self._engine: Optional[WalletMetricsEngine] = None
+        self._engine_tokens: Tuple[str, ...] = ()
+        self._engine_rowid = 0
+        self._engine_lock = threading.Lock()
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
@@ -32,27 +235,94 @@ class MetisBlockchainMonitor:
         try:
             if token_contract_address:
                 # ERC-20 token balance
-                contract_address = Web3.to_checksum_address(token_contract_address)
-                contract = self.web3.eth.contract(address=contract_address, abi=self._get_erc20_abi())
+                contract = self._get_contract(token_contract_address)
                 
-                token_balance = contract.functions.balanceOf(self.wallet_address).call()
-                token_decimals = contract.functions.decimals().call()
+                token_balance = self.read_cache.call(
+                    contract.functions.balanceOf(self.wallet_address)
+                )
+                token_decimals = self._decimals.get(contract.address)
+                if token_decimals is None:
+                    token_decimals = contract.functions.decimals().call()
+                    self._decimals[contract.address] = token_decimals
                 
                 return token_balance / (10 ** token_decimals)
             else:
                 # Native token (METIS) balance
-                balance = self.web3.eth.get_balance(self.wallet_address)
-                return Web3.from_wei(balance, 'ether')
+                balance = self.read_cache.get_balance(self.web3, self.wallet_address)
+                return float(Web3.from_wei(balance, 'ether'))
         except Exception as e:
             self.logger.error(f"Error retrieving wallet balance: {e}")
             return 0.0
     
-    def get_token_transactions(self, token_contract_address: str, limit: int = 50) -> List[Dict]:
+    def get_wallet_balances(self, token_contract_addresses: List[str]) -> Dict[str, float]:
+        """
+        Retrieve ERC-20 balances for many tokens in batched JSON-RPC requests
+
+        All balanceOf calls, plus decimals() for tokens not seen before, are
+        packed into as few batch requests as max_batch_size allows. Balances
+        go through read_cache at one resolved block, so only the reads not
+        yet cached for that block are sent.
+
+        :param token_contract_addresses: Contract addresses of the tokens
+        :return: Balance per token address, 0.0 for tokens that failed
+        """
+        balances = {token: 0.0 for token in token_contract_addresses}
+        if not token_contract_addresses:
+            return balances
+
+        try:
+            checksummed, calls = plan_balance_calls(
+                self.wallet_address, token_contract_addresses, self._decimals
+            )
+            # Keyed like read_cache.call(contract.functions.balanceOf(wallet))
+            reads = {
+                token: (address, "balanceOf", (self.wallet_address,))
+                for token, address in checksummed.items()
+            }
+            decimals_calls = [call for call in calls if call[0][0] == "decimals"]
+            results: Dict[Any, Optional[int]] = {}
+
+            def load(missing, block_number):
+                wanted = set(missing)
+                pending = [
+                    call for call in calls
+                    if call[0][0] == "decimals" or reads[call[0][1]] in wanted
+                ]
+                results.update(self._batch_eth_call(pending, block_number))
+                return {
+                    reads[key[1]]: value for key, value in results.items() if key[0] == "balance"
+                }
+
+            block_number = self.read_cache.resolve_block()
+            cached = self.read_cache.get_or_load_many(list(reads.values()), load, block_number)
+            if decimals_calls and not any(key[0] == "decimals" for key in results):
+                # Every balance was cached, but some decimals are still unknown
+                results.update(self._batch_eth_call(decimals_calls, block_number))
+            results.update({("balance", token): cached.get(read) for token, read in reads.items()})
+
+            balances, failed = collect_balances(checksummed, results, self._decimals)
+            for token in failed:
+                self.logger.error(f"Error retrieving balance for token {token}")
+
+        except Exception as e:
+            self.logger.error(f"Error retrieving wallet balances: {e}")
+
+        return balances
+
+    def get_token_transactions(
+        self,
+        token_contract_address: str,
+        limit: int = 50,
+        start_block: Optional[int] = None,
+        page: Optional[int] = None
+    ) -> List[Dict]:
         """
         Retrieve recent token transactions for a specific contract
         
         :param token_contract_address: Contract address of the token
         :param limit: Maximum number of transactions to retrieve
+        :param start_block: Optional inclusive first block; pages forward in block order
+        :param page: Optional 1-based page of limit transactions from start_block
         :return: List of recent transactions
         """
         try:
@@ -63,18 +333,87 @@ class MetisBlockchainMonitor:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
-                endpoint, 
-                headers=headers,
-                params={'limit': limit}
-            )
+            params: Dict[str, Any] = {'limit': limit}
+            if start_block is not None:
+                params.update({'startblock': start_block, 'sort': 'asc'})
+            if page is not None:
+                params['page'] = page
+
+            with METIS_REQUEST_SECONDS.time():
+                response = self.session.get(
+                    endpoint, 
+                    headers=headers,
+                    params=params
+                )
             
             response.raise_for_status()
             return response.json().get('transactions', [])
         except requests.RequestException as e:
+            METIS_ERRORS.inc()
             self.logger.error(f"Error retrieving token transactions: {e}")
             return []
     
+    def sync_token_transactions(self, token_contract_address: str) -> int:
+        """
+        Page forward from the stored cursor and append only new transactions
+
+        The cursor block is re-requested inclusively so transactions sharing
+        it are not missed; duplicates are dropped by the store. A full page
+        lying within one block is followed by the next page from the same
+        start, so blocks holding more than page_size transfers are read
+        completely.
+
+        :param token_contract_address: Contract address of the token
+        :return: Number of newly stored transactions
+        """
+        if self.store is None:
+            raise RuntimeError("No transaction store configured")
+
+        start_block = self.store.get_cursor(self.wallet_address, token_contract_address) or 0
+        page_number = 1
+        previous_keys: Optional[List[Optional[str]]] = None
+        stored = 0
+
+        while True:
+            page = self.get_token_transactions(
+                token_contract_address,
+                limit=self.page_size,
+                start_block=start_block,
+                page=page_number
+            )
+            if not page:
+                break
+
+            keys = [transaction_key(tx) for tx in page]
+            if keys == previous_keys:
+                # The API ignores the page parameter and repeats itself
+                self.logger.warning(
+                    f"Token transaction paging stalled in block {start_block} "
+                    f"for {token_contract_address}"
+                )
+                break
+            previous_keys = keys
+
+            stored += self.store.add_transactions(
+                self.wallet_address, token_contract_address, page
+            )
+            blocks = [TransactionStore.block_number(tx) for tx in page]
+            highest_block = max(blocks)
+            self.store.set_cursor(
+                self.wallet_address, token_contract_address, highest_block
+            )
+
+            # A short page is the end
+            if len(page) < self.page_size:
+                break
+            if min(blocks) < highest_block:
+                start_block, page_number = highest_block, 1
+            else:
+                # The whole page shares one block; read the rest of it
+                page_number += 1
+
+        return stored
+
     def analyze_wallet_activity(self, tracked_tokens: Optional[List[str]] = None) -> Dict:
         """
         Comprehensive wallet activity analysis
@@ -89,29 +428,49 @@ class MetisBlockchainMonitor:
             native_balance = self.get_wallet_balance()
             
             # Token balances
-            token_balances = {
-                token: self.get_wallet_balance(token)
-                for token in tracked_tokens
-            }
+            token_balances = self.get_wallet_balances(tracked_tokens)
             
-            # Aggregate transactions
-            all_transactions = []
+            if self.store is not None:
+                # Fetch only new activity and fold only it into the running metrics
+                for token in tracked_tokens:
+                    self.sync_token_transactions(token)
+                with self._engine_lock:
+                    engine = self._stored_metrics_engine(tracked_tokens)
+                    return build_activity_metrics(native_balance, token_balances, engine)
+
+            # Aggregate transactions into columns and compute metrics in one pass
+            engine = WalletMetricsEngine()
             for token in tracked_tokens:
-                all_transactions.extend(self.get_token_transactions(token))
-            
-            # Calculate metrics
-            activity_metrics = {
-                'native_balance': native_balance,
-                'token_balances': token_balances,
-                'total_transaction_volume': self._calculate_transaction_volume(all_transactions),
-                'activity_score': self._calculate_activity_score(all_transactions)
-            }
-            
-            return activity_metrics
+                engine.add_transactions(
+                    token, self.get_token_transactions(token), self.wallet_address
+                )
+            return build_activity_metrics(native_balance, token_balances, engine)
         except Exception as e:
             self.logger.error(f"Error analyzing wallet activity: {e}")
             return {}
     
+    def _stored_metrics_engine(self, tracked_tokens: List[str]) -> WalletMetricsEngine:
+        """
+        Bring the running metrics engine up to date with the store
+
+        Only rows stored since the previous call are added; the engine is
+        rebuilt from the full history when the tracked tokens change.
+
+        :param tracked_tokens: Token contract addresses to analyze
+        :return: Engine covering every stored transaction of those tokens
+        """
+        tokens = tuple(sorted({token.lower() for token in tracked_tokens}))
+        if self._engine is None or tokens != self._engine_tokens:
+            self._engine = WalletMetricsEngine()
+            self._engine_tokens = tokens
+            self._engine_rowid = 0
+
+        rows, self._engine_rowid = self.store.get_rows_after(
+            self.wallet_address, list(tokens), self._engine_rowid
+        )
+        self._engine.add(TransactionColumns.from_rows(rows, self.wallet_address, count=len(rows)))
+        return self._engine
+
     def _calculate_transaction_volume(self, transactions: List[Dict]) -> float:
         """
         Calculate total transaction volume
@@ -119,10 +478,7 @@ class MetisBlockchainMonitor:
         :param transactions: List of transactions
         :return: Total transaction volume
         """
-        return sum(
-            transaction.get('value', 0) 
-            for transaction in transactions
-        )
+        return calculate_transaction_volume(transactions)
     
     def _calculate_activity_score(self, transactions: List[Dict]) -> float:
         """
@@ -131,15 +487,39 @@ class MetisBlockchainMonitor:
         :param transactions: List of transactions
         :return: Activity score between 0-100
         """
-        transaction_count = len(transactions)
-        volume = self._calculate_transaction_volume(transactions)
-        
-        # Simple activity scoring mechanism
-        return min(
-            (transaction_count * volume) / 10000, 
-            100  # Cap at 100
-        )
+        return calculate_activity_score(transactions)
     
+    def _batch_eth_call(
+        self,
+        calls: List[tuple],
+        block: BlockIdentifier = "latest"
+    ) -> Dict[Any, Optional[int]]:
+        """
+        Execute eth_call requests as JSON-RPC batches
+
+        :param calls: (key, contract address, calldata) tuples
+        :param block: Block number or tag every call reads at
+        :return: Decoded uint256 result per key, None for failed calls
+        """
+        results: Dict[Any, Optional[int]] = {}
+
+        for start in range(0, len(calls), self.max_batch_size):
+            chunk = calls[start:start + self.max_batch_size]
+            reply = self.rpc_pool.request(eth_call_batch_payload(chunk, block))
+            results.update(parse_eth_call_batch(chunk, reply))
+
+        return results
+
+    def _get_contract(self, token_contract_address: str):
+        contract_address = Web3.to_checksum_address(token_contract_address)
+        contract = self._contracts.get(contract_address)
+        if contract is None:
+            contract = self.web3.eth.contract(
+                address=contract_address, abi=self._get_erc20_abi()
+            )
+            self._contracts[contract_address] = contract
+        return contract
+
     def _get_erc20_abi(self) -> List[Dict]:
         """
         Minimal ERC-20 ABI for balance and decimal queries
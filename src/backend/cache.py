@@ -0,0 +1,358 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+def normalize_text_key(text: str) -> str:
+    """
+    Build a cache key for free text that ignores case and whitespace layout
+
+    :param text: Raw input text
+    :return: Hex digest of the case-folded, whitespace-collapsed text
+    """
+    normalized = " ".join(text.casefold().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+class TTLCache:
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize a bounded, thread-safe LRU cache with optional expiry
+
+        :param maxsize: Maximum number of entries kept before evicting the LRU one
+        :param ttl: Optional time-to-live in seconds for every entry
+        :param clock: Monotonic time source, injectable for tests
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a key, refreshing its LRU position on a hit
+
+        :param key: Cache key
+        :param default: Value returned on a miss
+        :return: Cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry when full
+
+        :param key: Cache key
+        :param value: Value to store
+        """
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drop every entry while keeping the counters
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache effectiveness counters
+
+        :return: Dictionary of size, limits and hit/miss/eviction counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class SQLiteTTLCache:
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = 10000,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize an on-disk LRU cache with optional expiry backed by SQLite
+
+        Values must be JSON-serializable. Expiry uses wall-clock time so
+        entries stay valid across process restarts.
+
+        :param path: SQLite database file
+        :param maxsize: Maximum number of entries kept before evicting the LRU ones
+        :param ttl: Optional time-to-live in seconds for every entry
+        :param clock: Wall-clock time source, injectable for tests
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+        )
+        self._connection.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Look up a key, refreshing its LRU position on a hit
+
+        :param key: Cache key
+        :param default: Value returned on a miss
+        :return: Cached value or default
+        """
+        now = self._clock()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._connection.commit()
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._connection.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            self.hits += 1
+            return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries when full
+
+        :param key: Cache key
+        :param value: JSON-serializable value to store
+        """
+        now = self._clock()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            (size,) = self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if size > self.maxsize:
+                evicted = self._connection.execute(
+                    """
+                    DELETE FROM cache WHERE key IN (
+                        SELECT key FROM cache ORDER BY accessed_at LIMIT ?
+                    )
+                    """,
+                    (size - self.maxsize,)
+                ).rowcount
+                self.evictions += evicted
+            self._connection.commit()
+
+    def clear(self) -> None:
+        """
+        Drop every entry while keeping the counters
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache effectiveness counters
+
+        :return: Dictionary of size, limits and hit/miss/eviction counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution (threads)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers sharing a key
+
+        :param key: Deduplication key
+        :param fn: Zero-argument callable producing the result
+        :return: (result, shared) where shared is True for callers that waited
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+
+        try:
+            call["result"] = fn()
+            return call["result"], False
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+class _LeaderCancelled(Exception):
+    """Set on a shared call whose leader was cancelled, so followers retry"""
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutine calls with the same key into one execution
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Await fn once for all concurrent callers sharing a key
+
+        If the caller running fn is cancelled its followers are not: one of
+        them runs its own fn and the others wait for that instead.
+
+        :param key: Deduplication key
+        :param fn: Zero-argument coroutine function producing the result
+        :return: (result, shared) where shared is True for callers that waited
+        """
+        counted = False
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            if not counted:
+                self.coalesced += 1
+                counted = True
+            try:
+                # Shield so a cancelled follower does not cancel the shared call
+                return await asyncio.shield(future), True
+            except _LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark exceptions as retrieved even when nobody else is waiting
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._calls[key]
@@ -1,14 +1,79 @@
+import hashlib
+import json
 import logging
-from typing import Dict, List, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .cache import TTLCache, normalize_text_key
+from .domain_classifier import OnlineDomainClassifier
+from .metrics import REGISTRY
+
+DETECT_DOMAIN_SECONDS = REGISTRY.histogram(
+    "aigentqube_detect_domain_seconds", "Time of one domain detection call, single text or batch"
+)
+DETECT_DOMAIN_TEXTS = REGISTRY.counter(
+    "aigentqube_detect_domain_texts_total", "Texts whose domain was detected"
+)
+
+# Size of the hashed feature space shared by domains and queries
+HASH_FEATURES = 2 ** 18
+
+# Bumped whenever the artifact layout or the feature pipeline changes
+ARTIFACT_VERSION = 1
+
+def domains_fingerprint(domains: Dict[str, List[str]]) -> str:
+    """
+    Identify a domain definition and feature pipeline for artifact reuse
+
+    :param domains: Domain definitions
+    :return: Hex digest that changes whenever the fitted matrix would
+    """
+    description = json.dumps(
+        {"version": ARTIFACT_VERSION, "features": HASH_FEATURES, "domains": domains},
+        sort_keys=True
+    )
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+@dataclass(frozen=True)
+class DomainSnapshot:
+    """
+    Immutable view of the domain registry published to readers
+    """
+    version: int
+    names: Tuple[str, ...]
+    keywords: Mapping[str, Tuple[str, ...]]
+    matrix: sparse.csr_matrix
+    keyword_index: Mapping[Tuple[str, ...], FrozenSet[str]]
+    max_phrase_length: int
 
 class AgentContextTransformer:
-    def __init__(self, domains: Optional[Dict[str, List[str]]] = None):
+    def __init__(
+        self,
+        domains: Optional[Dict[str, List[str]]] = None,
+        cache_size: int = 0,
+        cache_ttl: Optional[float] = None,
+        classifier: Optional[OnlineDomainClassifier] = None,
+        artifact_path: Optional[str] = None
+    ):
         """
         Initialize Context Transformer
         
+        scikit-learn is only imported when text is first vectorized. With an
+        artifact_path, the domain matrix and keyword index are loaded from a
+        prebuilt file (written on the first run) instead of being computed;
+        otherwise they are computed on first use or by warmup().
+        
         :param domains: Optional custom domain definitions
+        :param cache_size: Maximum memoized results per cache (0 disables caching)
+        :param cache_ttl: Optional lifetime in seconds of memoized results
+        :param classifier: Optional trainable classifier enabling feedback learning
+        :param artifact_path: Optional .npz file caching the fitted domain snapshot
         """
         # Default domain knowledge base
         self.default_domains = {
@@ -31,50 +96,589 @@ class AgentContextTransformer:
             "general": []  # Catch-all domain
         }
         
-        # Use custom domains if provided, otherwise use default
-        self.domains = domains or self.default_domains
-        
-        # Initialize TF-IDF vectorizer
-        self.vectorizer = TfidfVectorizer()
-        
-        # Prepare domain vectors
-        self.domain_vectors = {
-            domain: self.vectorizer.fit_transform(keywords)
-            for domain, keywords in self.domains.items()
-        }
-        
+        # Stateless hashed feature space, built on first use
+        self._vectorizer = None
+        self._analyzer: Optional[Callable[[str], List[str]]] = None
+        self._vectorizer_lock = threading.Lock()
+        self.classifier = classifier
+        self.artifact_path = artifact_path
+
+        # Opt-in memoization of repeated classification work
+        self.domain_cache = TTLCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.capability_cache = (
+            TTLCache(cache_size, cache_ttl) if cache_size > 0 else None
+        )
+
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
-    
+
+        # Writers serialize on this lock; readers only load the snapshot reference
+        self._write_lock = threading.RLock()
+        self._initial_domains = domains or self.default_domains
+        self._snapshot: Optional[DomainSnapshot] = None
+        if artifact_path is not None:
+            self._snapshot = self._load_artifact(domains_fingerprint(self._initial_domains))
+
+    @property
+    def vectorizer(self):
+        """
+        HashingVectorizer of the shared feature space, imported on first use
+        """
+        if self._vectorizer is None:
+            with self._vectorizer_lock:
+                if self._vectorizer is None:
+                    from sklearn.feature_extraction.text import HashingVectorizer
+
+                    vectorizer = HashingVectorizer(
+                        n_features=HASH_FEATURES,
+                        alternate_sign=False,
+                        norm="l2"
+                    )
+                    self._analyzer = vectorizer.build_analyzer()
+                    self._vectorizer = vectorizer
+        return self._vectorizer
+
+    @property
+    def analyzer(self) -> Callable[[str], List[str]]:
+        if self._analyzer is None:
+            self.vectorizer
+        return self._analyzer
+
+    def warmup(self) -> None:
+        """
+        Import and exercise the text pipeline ahead of the first query
+        """
+        self.detect_domains(["warmup"])
+
+    @property
+    def snapshot(self) -> DomainSnapshot:
+        """
+        Current immutable domain registry snapshot, built on first access
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._write_lock:
+                if self._snapshot is None:
+                    self._snapshot = self._initial_snapshot(self._initial_domains)
+                snapshot = self._snapshot
+        return snapshot
+
+    @property
+    def domains(self) -> Dict[str, List[str]]:
+        return {
+            name: list(keywords)
+            for name, keywords in self.snapshot.keywords.items()
+        }
+
+    @property
+    def domain_names(self) -> List[str]:
+        return list(self.snapshot.names)
+
+    @property
+    def domain_matrix(self) -> sparse.csr_matrix:
+        return self.snapshot.matrix
+
+    @property
+    def domain_version(self) -> int:
+        return self.snapshot.version
+
+    def set_domains(self, domains: Dict[str, List[str]]) -> None:
+        """
+        Replace the domain definitions and invalidate memoized results
+
+        :param domains: New domain definitions
+        """
+        with self._write_lock:
+            self._publish(
+                self._build_snapshot(domains, self.snapshot.version + 1)
+            )
+
+    def register_domain(self, name: str, keywords: List[str]) -> None:
+        """
+        Add a new domain by appending a single row to the domain matrix
+
+        :param name: Name of the new domain
+        :param keywords: Keywords describing the domain
+        """
+        with self._write_lock:
+            current = self.snapshot
+            if name in current.keywords:
+                raise ValueError(f"Domain already registered: {name}")
+
+            self._publish(self._derive_snapshot(
+                current,
+                names=current.names + (name,),
+                changed={name: tuple(keywords)},
+                matrix=sparse.vstack(
+                    [current.matrix, self._domain_row(keywords)], format="csr"
+                )
+            ))
+
+    def update_keywords(self, name: str, keywords: List[str]) -> None:
+        """
+        Replace the keywords of an existing domain, recomputing only its row
+
+        :param name: Name of the domain to update
+        :param keywords: New keywords for the domain
+        """
+        with self._write_lock:
+            current = self.snapshot
+            if name not in current.keywords:
+                raise KeyError(f"Unknown domain: {name}")
+
+            index = current.names.index(name)
+            self._publish(self._derive_snapshot(
+                current,
+                names=current.names,
+                changed={name: tuple(keywords)},
+                matrix=sparse.vstack([
+                    current.matrix[:index],
+                    self._domain_row(keywords),
+                    current.matrix[index + 1:]
+                ], format="csr")
+            ))
+
+    def remove_domain(self, name: str) -> None:
+        """
+        Remove a domain by dropping its row from the domain matrix
+
+        :param name: Name of the domain to remove
+        """
+        with self._write_lock:
+            current = self.snapshot
+            if name not in current.keywords:
+                raise KeyError(f"Unknown domain: {name}")
+            if len(current.names) == 1:
+                raise ValueError("Cannot remove the last remaining domain")
+
+            index = current.names.index(name)
+            keep = [row for row in range(len(current.names)) if row != index]
+            self._publish(self._derive_snapshot(
+                current,
+                names=tuple(n for n in current.names if n != name),
+                changed={name: None},
+                matrix=current.matrix[keep]
+            ))
+
+    def record_feedback(self, text: str, domain: str) -> None:
+        """
+        Train the classifier on a labeled or user-corrected query
+
+        :param text: Query text
+        :param domain: Correct domain for the query
+        """
+        if self.classifier is None:
+            raise RuntimeError("No trainable classifier configured")
+        if domain not in self.snapshot.keywords:
+            raise KeyError(f"Unknown domain: {domain}")
+
+        self.classifier.partial_fit([text], [domain])
+
+        # Predictions may have changed for any text
+        if self.domain_cache is not None:
+            self.domain_cache.clear()
+
+    def clear_cache(self) -> None:
+        """
+        Drop all memoized domain and capability results
+        """
+        for cache in (self.domain_cache, self.capability_cache):
+            if cache is not None:
+                cache.clear()
+
+    def cache_stats(self) -> Dict[str, Optional[Dict]]:
+        """
+        Report hit/miss/eviction counters of the memoization layer
+
+        :return: Stats per cache, or None for a disabled cache
+        """
+        return {
+            "detect_domain": self.domain_cache.stats() if self.domain_cache else None,
+            "adjust_capabilities": (
+                self.capability_cache.stats() if self.capability_cache else None
+            )
+        }
+
+    def _domain_row(self, keywords: List[str]) -> sparse.csr_matrix:
+        """
+        Build a domain centroid row in the hashed feature space
+
+        The row is the L2-normalized mean of the keyword vectors, so a dot
+        product with a (normalized) query vector is its cosine similarity.
+        Domains without keywords get an all-zero row and never win on score.
+
+        :param keywords: Keywords describing the domain
+        :return: Sparse matrix of shape (1, HASH_FEATURES)
+        """
+        if not keywords:
+            return sparse.csr_matrix((1, HASH_FEATURES))
+
+        from sklearn.preprocessing import normalize
+
+        centroid = sparse.csr_matrix(self.vectorizer.transform(keywords).mean(axis=0))
+        return normalize(centroid)
+
+    def _initial_snapshot(self, domains: Dict[str, List[str]]) -> DomainSnapshot:
+        """
+        Build the first snapshot, writing the artifact when one is configured
+
+        :param domains: Domain definitions
+        :return: Snapshot with version 0
+        """
+        snapshot = self._build_snapshot(domains, version=0)
+        if self.artifact_path is not None:
+            self._save_artifact(snapshot, domains_fingerprint(domains))
+        return snapshot
+
+    def _load_artifact(self, fingerprint: str) -> Optional[DomainSnapshot]:
+        if not os.path.exists(self.artifact_path):
+            return None
+        try:
+            with np.load(self.artifact_path, allow_pickle=False) as artifact:
+                meta = json.loads(str(artifact["meta"]))
+                if meta["fingerprint"] != fingerprint:
+                    return None
+                matrix = sparse.csr_matrix(
+                    (artifact["data"], artifact["indices"], artifact["indptr"]),
+                    shape=tuple(artifact["shape"])
+                )
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable domain artifact {self.artifact_path}: {e}")
+            return None
+
+        keyword_index = {
+            tuple(phrase): frozenset(names) for phrase, names in meta["keyword_index"]
+        }
+        return DomainSnapshot(
+            version=0,
+            names=tuple(meta["names"]),
+            keywords=MappingProxyType({
+                name: tuple(keywords) for name, keywords in meta["keywords"].items()
+            }),
+            matrix=matrix,
+            keyword_index=MappingProxyType(keyword_index),
+            max_phrase_length=meta["max_phrase_length"]
+        )
+
+    def _save_artifact(self, snapshot: DomainSnapshot, fingerprint: str) -> None:
+        meta = {
+            "fingerprint": fingerprint,
+            "names": list(snapshot.names),
+            "keywords": {name: list(keywords) for name, keywords in snapshot.keywords.items()},
+            "keyword_index": [
+                [list(phrase), sorted(names)] for phrase, names in snapshot.keyword_index.items()
+            ],
+            "max_phrase_length": snapshot.max_phrase_length
+        }
+        temporary = f"{self.artifact_path}.tmp.npz"
+        try:
+            np.savez(
+                temporary,
+                data=snapshot.matrix.data,
+                indices=snapshot.matrix.indices,
+                indptr=snapshot.matrix.indptr,
+                shape=np.array(snapshot.matrix.shape),
+                meta=np.array(json.dumps(meta))
+            )
+            os.replace(temporary, self.artifact_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write domain artifact {self.artifact_path}: {e}")
+
+    def _build_snapshot(
+        self,
+        domains: Dict[str, List[str]],
+        version: int
+    ) -> DomainSnapshot:
+        """
+        Build a snapshot from scratch for a complete domain definition
+
+        :param domains: Domain definitions
+        :param version: Version number of the new snapshot
+        :return: New immutable snapshot
+        """
+        names = tuple(domains)
+        keywords = {name: tuple(domains[name]) for name in names}
+        return DomainSnapshot(
+            version=version,
+            names=names,
+            keywords=MappingProxyType(keywords),
+            matrix=sparse.vstack(
+                [self._domain_row(domains[name]) for name in names], format="csr"
+            ),
+            **self._keyword_index(keywords)
+        )
+
+    def _derive_snapshot(
+        self,
+        current: DomainSnapshot,
+        names: Tuple[str, ...],
+        changed: Dict[str, Optional[Tuple[str, ...]]],
+        matrix: sparse.csr_matrix
+    ) -> DomainSnapshot:
+        """
+        Derive the next snapshot from the current one and a set of changes
+
+        :param current: Snapshot being replaced
+        :param names: Domain names in matrix row order
+        :param changed: Updated keywords per domain, None for removed domains
+        :param matrix: Domain matrix matching names
+        :return: New immutable snapshot
+        """
+        keywords = dict(current.keywords)
+        for name, domain_keywords in changed.items():
+            if domain_keywords is None:
+                keywords.pop(name, None)
+            else:
+                keywords[name] = domain_keywords
+
+        return DomainSnapshot(
+            version=current.version + 1,
+            names=names,
+            keywords=MappingProxyType(keywords),
+            matrix=matrix,
+            **self._update_keyword_index(current, changed)
+        )
+
+    def _keyword_index(self, keywords: Mapping[str, Tuple[str, ...]]) -> Dict:
+        """
+        Index analyzed keyword phrases to the domains that list them
+
+        :param keywords: Keywords per domain
+        :return: keyword_index and max_phrase_length snapshot fields
+        """
+        index: Dict[Tuple[str, ...], set] = {}
+        for name, domain_keywords in keywords.items():
+            for keyword in domain_keywords:
+                phrase = tuple(self.analyzer(keyword))
+                if phrase:
+                    index.setdefault(phrase, set()).add(name)
+
+        return {
+            "keyword_index": MappingProxyType(
+                {phrase: frozenset(names) for phrase, names in index.items()}
+            ),
+            "max_phrase_length": max(map(len, index), default=0)
+        }
+
+    def _update_keyword_index(
+        self,
+        current: DomainSnapshot,
+        changed: Dict[str, Optional[Tuple[str, ...]]]
+    ) -> Dict:
+        """
+        Patch the current keyword index, analyzing only the changed domains
+
+        :param current: Snapshot being replaced
+        :param changed: Updated keywords per domain, None for removed domains
+        :return: keyword_index and max_phrase_length snapshot fields
+        """
+        index = dict(current.keyword_index)
+        for name, domain_keywords in changed.items():
+            for keyword in current.keywords.get(name, ()):
+                phrase = tuple(self.analyzer(keyword))
+                names = index.get(phrase, frozenset()) - {name}
+                if names:
+                    index[phrase] = names
+                else:
+                    index.pop(phrase, None)
+            for keyword in domain_keywords or ():
+                phrase = tuple(self.analyzer(keyword))
+                if phrase:
+                    index[phrase] = index.get(phrase, frozenset()) | {name}
+
+        return {
+            "keyword_index": MappingProxyType(index),
+            "max_phrase_length": max(map(len, index), default=0)
+        }
+
+    def _match_keywords(self, text: str, snapshot: DomainSnapshot) -> Optional[str]:
+        """
+        Exact keyword short-circuit for queries that name a single domain
+
+        :param text: Input text
+        :param snapshot: Domain snapshot to match against
+        :return: The only domain whose keywords appear in the text, else None
+        """
+        tokens = self.analyzer(text)
+        matched: set = set()
+        for length in range(1, snapshot.max_phrase_length + 1):
+            for start in range(len(tokens) - length + 1):
+                matched |= snapshot.keyword_index.get(
+                    tuple(tokens[start:start + length]), frozenset()
+                )
+                if len(matched) > 1:
+                    return None
+
+        return next(iter(matched)) if matched else None
+
+    def _publish(self, snapshot: DomainSnapshot) -> None:
+        """
+        Atomically swap in a new snapshot and drop stale memoized results
+
+        :param snapshot: Snapshot to publish
+        """
+        self._snapshot = snapshot
+        self.clear_cache()
+
+    def detect_domains(self, texts: List[str]) -> List[Dict]:
+        """
+        Detect the domains of a batch of texts with one sparse matrix product
+
+        :param texts: Input texts to analyze
+        :return: One {"domain", "scores", "source"} dictionary per input text, in order
+        """
+        if not texts:
+            return []
+
+        DETECT_DOMAIN_TEXTS.inc(len(texts))
+        with DETECT_DOMAIN_SECONDS.time():
+            return self._detect_domains(texts)
+
+    def _detect_domains(self, texts: List[str]) -> List[Dict]:
+        """
+        Detect the domains of a non-empty batch, serving repeats from the cache
+        """
+        # Every text in the batch is scored against the same snapshot
+        snapshot = self.snapshot
+
+        if self.domain_cache is None:
+            return self._score_texts(texts, snapshot)
+
+        # Serve repeats from the cache and score only the misses as one batch
+        keys = [(snapshot.version, normalize_text_key(text)) for text in texts]
+        results: List[Optional[Dict]] = [self.domain_cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+
+        if missing:
+            scored = self._score_texts([texts[index] for index in missing], snapshot)
+            for index, result in zip(missing, scored):
+                results[index] = result
+                if result["scores"]:
+                    self.domain_cache.set(keys[index], result)
+
+        # Hand out copies so callers cannot mutate cached entries
+        return [
+            {
+                "domain": result["domain"],
+                "scores": dict(result["scores"]),
+                "source": result["source"]
+            }
+            for result in results
+        ]
+
+    def _score_texts(self, texts: List[str], snapshot: DomainSnapshot) -> List[Dict]:
+        """
+        Score texts against a snapshot's domain matrix without consulting the cache
+
+        :param texts: Non-empty list of input texts
+        :param snapshot: Domain snapshot to score against
+        :return: One {"domain", "scores", "source"} dictionary per input text
+        """
+        try:
+            if self.classifier is not None:
+                results = self._classify_texts(texts, snapshot)
+            else:
+                results = self._similarity_scores(texts, snapshot)
+
+            self.logger.info(f"Detected domains for {len(texts)} texts")
+
+            return results
+
+        except Exception as e:
+            self.logger.error(f"Error detecting domains: {e}")
+            return [
+                {"domain": "general", "scores": {}, "source": "error"}
+                for _ in texts
+            ]
+
+    def _similarity_scores(self, texts: List[str], snapshot: DomainSnapshot) -> List[Dict]:
+        """
+        Cosine similarity of each text against every domain centroid
+
+        :param texts: Non-empty list of input texts
+        :param snapshot: Domain snapshot to score against
+        :return: One {"domain", "scores", "source"} dictionary per input text
+        """
+        # (n_texts, features) x (features, n_domains) -> cosine similarities
+        text_matrix = self.vectorizer.transform(texts)
+        scores = np.asarray(
+            (text_matrix @ snapshot.matrix.T).todense()
+        )
+        best = scores.argmax(axis=1)
+
+        results = []
+        for row, best_index in zip(scores, best):
+            # No keyword overlap at all falls through to the catch-all domain
+            if row[best_index] <= 0 and "general" in snapshot.keywords:
+                detected_domain = "general"
+            else:
+                detected_domain = snapshot.names[best_index]
+            results.append({
+                "domain": detected_domain,
+                "scores": dict(zip(snapshot.names, row.tolist())),
+                "source": "similarity"
+            })
+
+        return results
+
+    def _classify_texts(self, texts: List[str], snapshot: DomainSnapshot) -> List[Dict]:
+        """
+        Trainable-mode scoring: keyword fast path, then model, then similarity
+
+        :param texts: Non-empty list of input texts
+        :param snapshot: Domain snapshot to score against
+        :return: One {"domain", "scores", "source"} dictionary per input text
+        """
+        results: List[Optional[Dict]] = [None] * len(texts)
+
+        for index, text in enumerate(texts):
+            domain = self._match_keywords(text, snapshot)
+            if domain is not None:
+                results[index] = {
+                    "domain": domain,
+                    "scores": {name: float(name == domain) for name in snapshot.names},
+                    "source": "keyword"
+                }
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if pending and self.classifier.is_trained:
+            predictions = self.classifier.predict([texts[index] for index in pending])
+            for index, (domain, probabilities) in zip(pending, predictions):
+                # Ignore labels for domains that have since been removed
+                if domain in snapshot.keywords:
+                    results[index] = {
+                        "domain": domain,
+                        "scores": {
+                            name: probabilities.get(name, 0.0)
+                            for name in snapshot.names
+                        },
+                        "source": "model"
+                    }
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if pending:
+            scored = self._similarity_scores(
+                [texts[index] for index in pending], snapshot
+            )
+            for index, result in zip(pending, scored):
+                results[index] = result
+
+        return results
+
     def detect_domain(self, text: str) -> str:
         """
         Detect the domain of the given text
-        
+
         :param text: Input text to analyze
         :return: Detected domain
         """
-        try:
-            # Vectorize input text
-            text_vector = self.vectorizer.transform([text])
-            
-            # Calculate cosine similarity with domain vectors
-            domain_scores = {
-                domain: cosine_similarity(text_vector, vector)[0][0]
-                for domain, vector in self.domain_vectors.items()
-            }
-            
-            # Find domain with highest similarity
-            detected_domain = max(domain_scores, key=domain_scores.get)
-            
-            # Log domain detection
-            self.logger.info(f"Detected domain: {detected_domain}")
-            
-            return detected_domain
-        
-        except Exception as e:
-            self.logger.error(f"Error detecting domain: {e}")
-            return "general"
+        detected_domain = self.detect_domains([text])[0]["domain"]
+
+        # Log domain detection
+        self.logger.info(f"Detected domain: {detected_domain}")
+
+        return detected_domain
     
     def get_domain_capabilities(self, domain: str) -> Dict:
         """
@@ -121,6 +725,16 @@ class AgentContextTransformer:
         :return: Adjusted capabilities
         """
         try:
+            # Domain names match case-sensitively, so the raw name is the key
+            cache_key = (self.domain_version, detected_domain)
+            if self.capability_cache is not None:
+                cached = self.capability_cache.get(cache_key)
+                if cached is not None:
+                    return {
+                        "domain": cached["domain"],
+                        "capabilities": dict(cached["capabilities"])
+                    }
+
             # Get base capabilities for the domain
             base_capabilities = self.get_domain_capabilities(detected_domain)
             
@@ -129,10 +743,17 @@ class AgentContextTransformer:
             
             self.logger.info(f"Adjusted capabilities for {detected_domain} domain")
             
-            return {
+            adjusted = {
                 "domain": detected_domain,
                 "capabilities": base_capabilities
             }
+            if self.capability_cache is not None:
+                self.capability_cache.set(cache_key, {
+                    "domain": detected_domain,
+                    "capabilities": dict(base_capabilities)
+                })
+
+            return adjusted
         
         except Exception as e:
             self.logger.error(f"Error adjusting capabilities: {e}")
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# Rough per-message framing overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (about four characters per token for English text)
+
+    :param text: Text to measure
+    :return: Estimated token count
+    """
+    return max(1, (len(text) + 3) // 4)
+
+def extractive_summary(previous: str, dropped: List[Dict[str, str]]) -> str:
+    """
+    Default summarizer: keep the first sentence of every dropped turn
+
+    :param previous: Summary accumulated so far
+    :param dropped: Turns being evicted from the history
+    :return: Updated summary
+    """
+    lines = [previous] if previous else []
+    for message in dropped:
+        first_sentence = message["content"].strip().split("\n")[0].split(". ")[0]
+        lines.append(f"{message['role']}: {first_sentence[:200]}")
+    return "\n".join(lines)
+
+class ConversationSession:
+    """
+    History of one conversation with incrementally maintained token counts
+    """
+    def __init__(self):
+        self.turns: Deque[Tuple[Dict[str, str], int]] = deque()
+        self.turn_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        # Evicted turns waiting to be folded into the summary
+        self.pending: List[Dict[str, str]] = []
+        self.summarizing = False
+
+    @property
+    def tokens(self) -> int:
+        return self.turn_tokens + self.summary_tokens
+
+class ConversationContextManager:
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        summary_budget: int = 300,
+        max_sessions: int = 1000,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = extractive_summary
+    ):
+        """
+        Initialize the per-session conversation store
+
+        :param token_budget: Maximum tokens of history (summary plus turns) kept per session
+        :param summary_budget: Maximum tokens of the rolling summary of evicted turns
+        :param max_sessions: Number of sessions kept before evicting the least recent
+        :param token_counter: Function estimating the tokens of a text
+        :param summarizer: Folds evicted turns into a summary; None drops them
+        """
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_sessions = max_sessions
+        self.token_counter = token_counter
+        self.summarizer = summarizer
+
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """
+        Add a turn to a session and trim it back under the token budget
+
+        Evicted turns are summarized without holding the store's lock, so a
+        slow summarizer only delays the session it is summarizing.
+
+        :param session_id: Conversation identifier
+        :param role: Chat role of the turn ("user" or "assistant")
+        :param content: Turn text
+        """
+        session = self._append(session_id, role, content)
+        if session is not None:
+            self._summarize(session)
+
+    async def aappend(self, session_id: str, role: str, content: str) -> None:
+        """
+        Async variant of append that summarizes in a worker thread
+
+        Keeps a slow (e.g. model-backed) summarizer off the event loop.
+
+        :param session_id: Conversation identifier
+        :param role: Chat role of the turn ("user" or "assistant")
+        :param content: Turn text
+        """
+        session = self._append(session_id, role, content)
+        if session is not None:
+            await asyncio.to_thread(self._summarize, session)
+
+    def build_messages(
+        self,
+        session_id: str,
+        system_prompt: str,
+        query: str
+    ) -> List[Dict[str, str]]:
+        """
+        Render the chat messages for a new query within the token budget
+
+        The newest turns that fit alongside the system prompt and query are
+        included; older ones are only represented by the summary.
+
+        :param session_id: Conversation identifier
+        :param system_prompt: System prompt for the detected domain
+        :param query: New user query
+        :return: Chat messages ready to send
+        """
+        available = (
+            self.token_budget
+            - self._message_tokens(system_prompt)
+            - self._message_tokens(query)
+        )
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                summary = session.summary
+                turns = list(session.turns)
+            else:
+                summary, turns = "", []
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary:
+            summary_message = {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}"
+            }
+            summary_tokens = self._message_tokens(summary_message["content"])
+            if summary_tokens <= available:
+                messages.append(summary_message)
+                available -= summary_tokens
+
+        history: List[Dict[str, str]] = []
+        for message, tokens in reversed(turns):
+            if tokens > available:
+                break
+            history.append(message)
+            available -= tokens
+
+        messages.extend(reversed(history))
+        messages.append({"role": "user", "content": query})
+        return messages
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return [message for message, _ in session.turns] if session else []
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "tokens": sum(session.tokens for session in self._sessions.values())
+            }
+
+    def _append(self, session_id: str, role: str, content: str) -> Optional[ConversationSession]:
+        """
+        Add a turn and trim the session under the lock
+
+        :return: The session when the caller must now summarize it, else None
+        """
+        tokens = self._message_tokens(content)
+        with self._lock:
+            session = self._session(session_id)
+            session.turns.append(({"role": role, "content": content}, tokens))
+            session.turn_tokens += tokens
+            if not self._trim(session) or session.summarizing:
+                return None
+            session.summarizing = True
+            return session
+
+    def _session(self, session_id: str) -> ConversationSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ConversationSession()
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _trim(self, session: ConversationSession) -> bool:
+        """
+        Evict the oldest turns until the session fits
+
+        :param session: Session to trim, with the lock held
+        :return: Whether evicted turns are waiting to be summarized
+        """
+        while session.tokens > self.token_budget and len(session.turns) > 1:
+            message, tokens = session.turns.popleft()
+            session.turn_tokens -= tokens
+            if self.summarizer is not None:
+                session.pending.append(message)
+        return bool(session.pending)
+
+    def _summarize(self, session: ConversationSession) -> None:
+        """
+        Fold pending turns into the summary, calling the summarizer unlocked
+
+        Only one caller summarizes a session at a time; turns evicted
+        meanwhile are picked up by its next round.
+
+        :param session: Session marked as summarizing
+        """
+        try:
+            while True:
+                with self._lock:
+                    dropped, session.pending = session.pending, []
+                    if not dropped:
+                        # Cleared under the same lock append() checks it with
+                        session.summarizing = False
+                        return
+                    previous = session.summary
+
+                summary = self.summarizer(previous, dropped)
+                # Keep the most recent summary lines when the summary outgrows its budget
+                lines = summary.split("\n")
+                while len(lines) > 1 and self.token_counter("\n".join(lines)) > self.summary_budget:
+                    lines.pop(0)
+                summary = "\n".join(lines)
+                summary_tokens = self._message_tokens(summary)
+
+                with self._lock:
+                    session.summary = summary
+                    session.summary_tokens = summary_tokens
+        except BaseException:
+            with self._lock:
+                session.summarizing = False
+            raise
+
+    def _message_tokens(self, content: str) -> int:
+        return self.token_counter(content) + MESSAGE_OVERHEAD_TOKENS
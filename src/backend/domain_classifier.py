@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+WEIGHTS_FILE = "weights.npy"
+META_FILE = "meta.json"
+
+class OnlineDomainClassifier:
+    def __init__(
+        self,
+        n_features: int = 2 ** 18,
+        learning_rate: float = 0.5,
+        min_confidence: float = 0.5
+    ):
+        """
+        Initialize an incrementally trained softmax domain classifier
+
+        Features are hashed, so the model never needs a vocabulary refit and
+        new domains only add a weight row. Everything runs on CPU with NumPy.
+
+        :param n_features: Size of the hashed feature space
+        :param learning_rate: SGD step size used by partial_fit
+        :param min_confidence: Minimum probability for a prediction to be trusted
+        """
+        self.n_features = n_features
+        self.learning_rate = learning_rate
+        self.min_confidence = min_confidence
+        # Imported here so that loading the module stays cheap
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            alternate_sign=False,
+            norm="l2"
+        )
+
+        self.classes: List[str] = []
+        self.weights = np.zeros((0, n_features), dtype=np.float32)
+        self.bias = np.zeros(0, dtype=np.float32)
+        self.samples_seen = 0
+        self._lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.samples_seen > 0 and len(self.classes) > 1
+
+    def partial_fit(self, texts: List[str], labels: List[str]) -> None:
+        """
+        Update the model with one mini-batch of labeled queries
+
+        :param texts: Query texts
+        :param labels: Correct domain for each text
+        """
+        if len(texts) != len(labels):
+            raise ValueError("texts and labels must have the same length")
+        if not texts:
+            return
+
+        features = self.vectorizer.transform(texts)
+
+        with self._lock:
+            for label in labels:
+                if label not in self.classes:
+                    self._add_class(label)
+
+            targets = np.array([self.classes.index(label) for label in labels])
+            probabilities = self._softmax(features @ self.weights.T + self.bias)
+
+            # Cross-entropy gradient, applied only to the touched feature columns
+            gradient = probabilities
+            gradient[np.arange(len(targets)), targets] -= 1.0
+            gradient /= len(targets)
+
+            columns = np.unique(features.indices)
+            step = (features[:, columns].T @ gradient).T
+            self.weights[:, columns] -= (self.learning_rate * step).astype(np.float32)
+            self.bias -= (self.learning_rate * gradient.sum(axis=0)).astype(np.float32)
+            self.samples_seen += len(targets)
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """
+        Compute class probabilities for a batch of texts
+
+        :param texts: Query texts
+        :return: Array of shape (n_texts, n_classes), columns ordered as classes
+        """
+        weights, bias, _ = self._model()
+        return self._probabilities(texts, weights, bias)
+
+    def predict(self, texts: List[str]) -> List[Tuple[Optional[str], Dict[str, float]]]:
+        """
+        Predict the domain of each text
+
+        :param texts: Query texts
+        :return: (domain or None when below min_confidence, probabilities) per text
+        """
+        weights, bias, classes = self._model()
+        if not texts or not classes:
+            return [(None, {}) for _ in texts]
+
+        predictions = []
+        for row in self._probabilities(texts, weights, bias):
+            best = int(row.argmax())
+            domain = classes[best] if row[best] >= self.min_confidence else None
+            predictions.append((domain, dict(zip(classes, row.tolist()))))
+
+        return predictions
+
+    def save(self, directory: str) -> None:
+        """
+        Persist weights as a raw .npy file plus a JSON metadata sidecar
+
+        :param directory: Target directory, created if missing
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            weights_tmp = os.path.join(directory, WEIGHTS_FILE + ".tmp")
+            with open(weights_tmp, "wb") as weights_file:
+                np.save(weights_file, np.ascontiguousarray(self.weights))
+
+            meta_tmp = os.path.join(directory, META_FILE + ".tmp")
+            with open(meta_tmp, "w") as meta_file:
+                json.dump({
+                    "n_features": self.n_features,
+                    "classes": self.classes,
+                    "bias": self.bias.tolist(),
+                    "samples_seen": self.samples_seen
+                }, meta_file)
+
+            os.replace(weights_tmp, os.path.join(directory, WEIGHTS_FILE))
+            os.replace(meta_tmp, os.path.join(directory, META_FILE))
+
+        self.logger.info(f"Saved domain classifier to {directory}")
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        learning_rate: float = 0.5,
+        min_confidence: float = 0.5
+    ) -> "OnlineDomainClassifier":
+        """
+        Load a saved classifier, memory-mapping the weight matrix
+
+        The weights are mapped copy-on-write, so startup does not read the
+        whole file and further training never modifies it until save().
+
+        :param directory: Directory written by save()
+        :return: Loaded classifier
+        """
+        with open(os.path.join(directory, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+
+        classifier = cls(
+            n_features=meta["n_features"],
+            learning_rate=learning_rate,
+            min_confidence=min_confidence
+        )
+        classifier.classes = list(meta["classes"])
+        classifier.bias = np.asarray(meta["bias"], dtype=np.float32)
+        classifier.samples_seen = meta["samples_seen"]
+        classifier.weights = np.load(
+            os.path.join(directory, WEIGHTS_FILE), mmap_mode="c"
+        )
+
+        if classifier.weights.shape != (len(classifier.classes), classifier.n_features):
+            raise ValueError(f"Corrupt classifier weights in {directory}")
+
+        return classifier
+
+    def _model(self) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        Weights, bias and classes of one consistent model version
+
+        _add_class replaces the arrays one at a time, so they are read
+        together under the lock; the scoring itself runs unlocked.
+        """
+        with self._lock:
+            return self.weights, self.bias, list(self.classes)
+
+    def _probabilities(self, texts: List[str], weights: np.ndarray, bias: np.ndarray) -> np.ndarray:
+        features = self.vectorizer.transform(texts)
+        return self._softmax(features @ weights.T + bias)
+
+    def _add_class(self, label: str) -> None:
+        self.classes.append(label)
+        self.weights = np.vstack([
+            self.weights, np.zeros((1, self.n_features), dtype=np.float32)
+        ])
+        self.bias = np.append(self.bias, np.float32(0.0))
+
+    @staticmethod
+    def _softmax(scores) -> np.ndarray:
+        scores = np.asarray(scores, dtype=np.float64)
+        scores -= scores.max(axis=1, keepdims=True)
+        exponentials = np.exp(scores)
+        return exponentials / exponentials.sum(axis=1, keepdims=True)
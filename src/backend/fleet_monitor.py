@@ -0,0 +1,414 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import httpx
+from web3 import Web3
+
+from .async_blockchain_monitor import AsyncMetisBlockchainMonitor, HostRateLimiter
+from .blockchain_monitor import build_activity_metrics, collect_balances, plan_balance_calls
+from .transaction_store import TransactionStore, transaction_key
+from .wallet_analytics import WalletMetricsEngine
+
+# Newest block seen per token and the transactions inside it
+ActivityMarker = Tuple[Tuple[int, FrozenSet[Optional[str]]], ...]
+
+def activity_marker(transactions_per_token: List[List[Dict]]) -> ActivityMarker:
+    """
+    Summarize the newest activity of a wallet's tokens
+
+    The marker changes whenever a transaction newer than the previous poll
+    appears, even if the API caps how many transactions it returns.
+
+    :param transactions_per_token: Transactions per tracked token
+    :return: (newest block, keys of its transactions) per token
+    """
+    marker = []
+    for transactions in transactions_per_token:
+        blocks = [TransactionStore.block_number(tx) for tx in transactions]
+        newest = max(blocks, default=0)
+        marker.append((newest, frozenset(
+            transaction_key(tx) for tx, block in zip(transactions, blocks) if block == newest
+        )))
+    return tuple(marker)
+
+class RequestBudget(HostRateLimiter):
+    """
+    Rate limiter enforcing one request budget across every host and wallet
+    """
+    async def acquire(self, key: str = "") -> None:
+        await super().acquire("*")
+
+class WalletSchedule:
+    """
+    Polling state of one wallet in the fleet
+    """
+    def __init__(self, monitor: AsyncMetisBlockchainMonitor, tracked_tokens: List[str], interval: float):
+        self.monitor = monitor
+        self.tracked_tokens = tracked_tokens
+        self.interval = interval
+        self.next_due = 0.0
+        # Sequence number of the wallet's one live queue entry
+        self.queue_sequence = -1
+        self.metrics: Dict = {}
+        self.activity: Optional[ActivityMarker] = None
+        self.last_polled: Optional[float] = None
+        # Consecutive failed polls and the latest error, reset by a successful poll
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+class FleetMonitor:
+    def __init__(
+        self,
+        metis_api_key: str,
+        rpc_url: str = 'https://metis-mainnet.public.blastapi.io',
+        metis_base_url: str = "https://api.metis.io/v1",
+        requests_per_second: float = 50.0,
+        max_connections: int = 50,
+        max_batch_size: int = 100,
+        base_interval: float = 60.0,
+        hot_interval: float = 10.0,
+        idle_interval: float = 900.0,
+        request_timeout: float = 30.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize a monitor polling many wallets over shared connections
+
+        Every wallet shares one HTTP connection pool, one global request
+        budget and one token decimals cache. Wallets are polled from a
+        priority queue ordered by due time; wallets with new activity are
+        polled more often, quiet ones back off towards idle_interval.
+
+        :param metis_api_key: API key for Metis blockchain services
+        :param rpc_url: Metis JSON-RPC endpoint
+        :param metis_base_url: Metis REST API base URL
+        :param requests_per_second: Global RPC/API request budget of the fleet
+        :param max_connections: Size of the shared HTTP connection pool
+        :param max_batch_size: Maximum calls packed into one JSON-RPC batch request
+        :param base_interval: Initial polling interval of a wallet in seconds
+        :param hot_interval: Shortest polling interval for active wallets
+        :param idle_interval: Longest polling interval for quiet wallets
+        :param request_timeout: Per-request timeout in seconds
+        :param http_client: Optional shared async HTTP client
+        :param clock: Monotonic time source, injectable for tests
+        """
+        self.api_key = metis_api_key
+        self.rpc_url = rpc_url
+        self.metis_base_url = metis_base_url
+        self.max_batch_size = max_batch_size
+        self.base_interval = base_interval
+        self.hot_interval = hot_interval
+        self.idle_interval = idle_interval
+        self._clock = clock
+
+        self._owns_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=request_timeout
+        )
+        self.budget = RequestBudget(requests_per_second)
+        self.max_connections = max_connections
+        self._decimals: Dict[str, int] = {}
+
+        self._wallets: Dict[str, WalletSchedule] = {}
+        self._queue: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+
+        self.logger = logging.getLogger(__name__)
+
+    def add_wallet(
+        self,
+        wallet_address: str,
+        tracked_tokens: Optional[List[str]] = None,
+        interval: Optional[float] = None
+    ) -> None:
+        """
+        Start monitoring a wallet; it is due for polling immediately
+
+        :param wallet_address: Wallet address to monitor
+        :param tracked_tokens: Token contract addresses to track for this wallet
+        :param interval: Optional initial polling interval in seconds
+        """
+        address = Web3.to_checksum_address(wallet_address)
+        monitor = AsyncMetisBlockchainMonitor(
+            metis_api_key=self.api_key,
+            wallet_address=address,
+            rpc_url=self.rpc_url,
+            metis_base_url=self.metis_base_url,
+            max_batch_size=self.max_batch_size,
+            max_concurrency=self.max_connections,
+            http_client=self.http_client,
+            rate_limiter=self.budget,
+            decimals_cache=self._decimals
+        )
+        schedule = WalletSchedule(monitor, list(tracked_tokens or []), interval or self.base_interval)
+        self._wallets[address] = schedule
+        self._enqueue(schedule, address, self._clock())
+
+    def remove_wallet(self, wallet_address: str) -> None:
+        # Its queue entry no longer matches a live schedule and is skipped when popped
+        self._wallets.pop(Web3.to_checksum_address(wallet_address), None)
+
+    def get_wallet_metrics(self, wallet_address: str) -> Dict:
+        """
+        Latest metrics of a wallet, shaped like analyze_wallet_activity()
+
+        :param wallet_address: Monitored wallet address
+        :return: Dictionary of wallet activity metrics, empty before the first poll
+        """
+        schedule = self._wallets.get(Web3.to_checksum_address(wallet_address))
+        return dict(schedule.metrics) if schedule else {}
+
+    def next_due_in(self) -> Optional[float]:
+        """
+        Seconds until the next wallet is due, None when nothing is scheduled
+        """
+        self._drop_stale_entries()
+        if not self._queue:
+            return None
+        return max(0.0, self._queue[0][0] - self._clock())
+
+    async def poll_due(self) -> List[str]:
+        """
+        Poll every wallet that is due, sharing one balance batch between them
+
+        A wallet whose poll fails keeps its last metrics and is retried
+        with a backoff; it never drops out of the queue.
+
+        :return: Addresses of the polled wallets
+        """
+        now = self._clock()
+        popped: List[Tuple[str, WalletSchedule]] = []
+        while self._queue and self._queue[0][0] <= now:
+            entry = heapq.heappop(self._queue)
+            if self._is_live(entry):
+                popped.append((entry[2], self._wallets[entry[2]]))
+
+        if not popped:
+            return []
+
+        due = [address for address, _ in popped]
+        errors: Dict[str, BaseException] = {}
+        polled = set()
+        try:
+            balances = await self._read_balances(due, errors)
+            transaction_lists = await asyncio.gather(*(
+                asyncio.gather(*(
+                    schedule.monitor.get_token_transactions(token)
+                    for token in schedule.tracked_tokens
+                ), return_exceptions=True)
+                for _, schedule in popped
+            ))
+
+            for (address, schedule), transactions_per_token in zip(popped, transaction_lists):
+                if address in errors or self._wallets.get(address) is not schedule:
+                    continue
+                try:
+                    for result in transactions_per_token:
+                        if isinstance(result, BaseException):
+                            raise result
+
+                    engine = WalletMetricsEngine()
+                    for token, transactions in zip(schedule.tracked_tokens, transactions_per_token):
+                        engine.add_transactions(token, transactions, address)
+
+                    native_balance, token_balances = balances[address]
+                    schedule.metrics = build_activity_metrics(native_balance, token_balances, engine)
+                    activity = activity_marker(transactions_per_token)
+                except Exception as e:
+                    errors[address] = e
+                    continue
+
+                self._reschedule(schedule, address, activity)
+                polled.add(address)
+        finally:
+            for address, schedule in popped:
+                if address not in polled and self._wallets.get(address) is schedule:
+                    self._retry(schedule, address, errors.get(address))
+
+        return due
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        Poll wallets as they fall due until stop is set
+
+        :param stop: Event ending the polling loop
+        """
+        while not stop.is_set():
+            try:
+                await self.poll_due()
+            except Exception as e:
+                self.logger.error(f"Error polling wallet fleet: {e}")
+
+            delay = self.next_due_in()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay if delay is not None else 1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.http_client.aclose()
+
+    async def _read_balances(
+        self,
+        addresses: List[str],
+        errors: Dict[str, BaseException]
+    ) -> Dict[str, Tuple[float, Dict[str, float]]]:
+        """
+        Read native and token balances of many wallets in shared JSON-RPC batches
+
+        Token decimals are requested once per token for the whole fleet.
+
+        :param addresses: Wallet addresses to read
+        :param errors: Receives the error of every wallet that cannot be read
+        :return: (native balance, token balances) per readable wallet
+        """
+        requests: List[Tuple[Any, str, list]] = []
+        plans = {}
+        decimals_requested = set()
+
+        for address in addresses:
+            try:
+                checksummed, calls = plan_balance_calls(
+                    address, self._wallets[address].tracked_tokens, self._decimals
+                )
+            except ValueError as e:
+                errors[address] = e
+                continue
+            plans[address] = checksummed
+            requests.append((("native", address), "eth_getBalance", [address, "latest"]))
+            for key, contract, data in calls:
+                if key[0] == "decimals":
+                    if contract in decimals_requested:
+                        continue
+                    decimals_requested.add(contract)
+                    request_key = key
+                else:
+                    request_key = (address, key)
+                requests.append((request_key, "eth_call", [{"to": contract, "data": data}, "latest"]))
+
+        results = await self._batch_rpc(requests)
+
+        # Group the replies by wallet in one pass; decimals are shared by all
+        decimals = {}
+        per_wallet: Dict[str, Dict[Any, Optional[int]]] = {address: {} for address in plans}
+        for key, value in results.items():
+            if key[0] == "decimals":
+                decimals[key] = value
+            elif key[0] in per_wallet:
+                per_wallet[key[0]][key[1]] = value
+
+        balances = {}
+        for address in plans:
+            wallet_results = per_wallet[address]
+            wallet_results.update(decimals)
+            token_balances, failed = collect_balances(plans[address], wallet_results, self._decimals)
+            for token in failed:
+                self.logger.error(f"Error retrieving balance of {token} for {address}")
+
+            native = results.get(("native", address))
+            native_balance = float(Web3.from_wei(native, 'ether')) if native is not None else 0.0
+            balances[address] = (native_balance, token_balances)
+
+        return balances
+
+    async def _batch_rpc(self, requests: List[Tuple[Any, str, list]]) -> Dict[Any, Optional[int]]:
+        """
+        Send JSON-RPC requests in concurrent batches within the request budget
+
+        :param requests: (key, method, params) tuples
+        :return: Decoded integer result per key, None for failed requests
+        """
+        chunks = [
+            requests[start:start + self.max_batch_size]
+            for start in range(0, len(requests), self.max_batch_size)
+        ]
+
+        async def send(chunk):
+            await self.budget.acquire()
+            response = await self.http_client.post(self.rpc_url, json=[
+                {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+                for request_id, (_, method, params) in enumerate(chunk)
+            ])
+            response.raise_for_status()
+            body = response.json()
+            if isinstance(body, dict):
+                raise RuntimeError(f"JSON-RPC batch rejected: {body.get('error')}")
+            return {reply.get("id"): reply.get("result") for reply in body}
+
+        results: Dict[Any, Optional[int]] = {}
+        replies = await asyncio.gather(*(send(chunk) for chunk in chunks), return_exceptions=True)
+        for chunk, reply in zip(chunks, replies):
+            if isinstance(reply, BaseException):
+                self.logger.error(f"Error sending JSON-RPC batch: {reply}")
+                reply = {}
+            for request_id, (key, _, _) in enumerate(chunk):
+                results[key] = self._parse_quantity(key, reply.get(request_id))
+        return results
+
+    def _parse_quantity(self, key: Any, result: Any) -> Optional[int]:
+        """Decode a hex JSON-RPC result, None when missing or malformed"""
+        if result in (None, "0x"):
+            return None
+        try:
+            return int(result, 16)
+        except (TypeError, ValueError):
+            self.logger.error(f"Malformed JSON-RPC result for {key}: {result!r}")
+            return None
+
+    def _reschedule(self, schedule: WalletSchedule, address: str, activity: ActivityMarker) -> None:
+        """
+        Adapt a wallet's polling interval to its activity and requeue it
+
+        :param schedule: Wallet polling state
+        :param address: Wallet address
+        :param activity: Newest activity seen in this poll
+        """
+        if schedule.activity is not None:
+            if activity != schedule.activity:
+                schedule.interval = max(self.hot_interval, schedule.interval / 2)
+            else:
+                schedule.interval = min(self.idle_interval, schedule.interval * 2)
+
+        schedule.activity = activity
+        schedule.last_polled = self._clock()
+        schedule.failures = 0
+        schedule.last_error = None
+        self._enqueue(schedule, address, schedule.last_polled + schedule.interval)
+
+    def _retry(self, schedule: WalletSchedule, address: str, error: Optional[BaseException]) -> None:
+        """
+        Requeue a wallet whose poll failed, backing off on repeated failures
+
+        :param schedule: Wallet polling state
+        :param address: Wallet address
+        :param error: Error of the failed poll, None if the round was aborted
+        """
+        schedule.failures += 1
+        schedule.last_error = str(error) if error is not None else "poll aborted"
+        self.logger.error(f"Error polling wallet {address}: {schedule.last_error}")
+        delay = min(self.idle_interval, self.hot_interval * 2 ** (schedule.failures - 1))
+        self._enqueue(schedule, address, self._clock() + delay)
+
+    def _enqueue(self, schedule: WalletSchedule, address: str, due: float) -> None:
+        schedule.next_due = due
+        schedule.queue_sequence = next(self._sequence)
+        heapq.heappush(self._queue, (due, schedule.queue_sequence, address))
+
+    def _is_live(self, entry: Tuple[float, int, str]) -> bool:
+        """Whether a queue entry is its wallet's current one, not left by a removal"""
+        schedule = self._wallets.get(entry[2])
+        return schedule is not None and schedule.queue_sequence == entry[1]
+
+    def _drop_stale_entries(self) -> None:
+        while self._queue and not self._is_live(self._queue[0]):
+            heapq.heappop(self._queue)
@@ -1,11 +1,36 @@
+import time
+
+# Recorded first so startup time covers module imports too
+PROCESS_START = time.perf_counter()
+
 import asyncio
+import contextlib
+import hashlib
 import logging
-from typing import Dict, Any
+import os
+import threading
+import weakref
+from typing import TYPE_CHECKING, Dict, Any, Iterable, Optional
 
 import structlog
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 
+from .metrics import REGISTRY as METRICS
+from .status_hub import StatusHub, StatusSubscription, StatusUpdate
+from .status_protocol import PROTOCOLS, DeltaSession, is_resync_request
+from .status_registry import (
+    StatusRecord,
+    StatusRegistry,
+    create_status_registry,
+    format_timestamp,
+    status_payload
+)
+
+if TYPE_CHECKING:
+    from .natural_language_interface import NaturalLanguageInterface
+
 # Configure structured logging
 logging.basicConfig(level=logging.INFO)
 structlog.configure(
@@ -25,51 +50,439 @@ structlog.configure(
 )
 logger = structlog.get_logger()
 
+WS_FRAMES_SENT = METRICS.counter(
+    "aigentqube_ws_frames_sent_total", "WebSocket frames sent per channel", ["channel"]
+)
+
+# Live app instances, held weakly so the gauges never keep an app alive
+_APPS: "weakref.WeakSet[AigentQubeApp]" = weakref.WeakSet()
+
+# Read at scrape time only, summed over the live apps of this process
+METRICS.gauge(
+    "aigentqube_ws_status_subscribers", "Open agent status subscriptions",
+    lambda: sum(app.status_hub.subscriber_count() for app in list(_APPS))
+)
+METRICS.gauge(
+    "aigentqube_ws_status_queued", "Status updates waiting in subscriber queues",
+    lambda: sum(app.status_hub.stats()["queued"] for app in list(_APPS))
+)
+
+def status_etag(query: Iterable[Any], records: Iterable[StatusRecord]) -> str:
+    """
+    Weak ETag of one status query's result
+
+    Covers the query parameters and the version of every returned record,
+    so it differs between queries and only changes when their records do.
+    The registry-wide version in the body may be older on a 304, which
+    only makes a client's next since= request re-check a few versions.
+
+    :param query: Route and parameters identifying the query
+    :param records: Records the response is built from
+    :return: Weak entity tag
+    """
+    digest = hashlib.sha1(repr(tuple(query)).encode("utf-8"))
+    for record in records:
+        digest.update(f"|{record.agent_id}:{record.version}".encode("utf-8"))
+    return f'W/"status-{digest.hexdigest()[:20]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names etag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
+
 class AgentConfig(BaseModel):
     name: str
     version: str
     blockchain_networks: list[str]
 
 class AigentQubeApp:
-    def __init__(self):
+    def __init__(
+        self,
+        natural_language_interface: Optional["NaturalLanguageInterface"] = None,
+        stream_queue_size: int = 32,
+        warmup: bool = True,
+        status_interval: float = 5.0,
+        status_queue_size: int = 8,
+        status_registry: Optional[StatusRegistry] = None,
+        max_status_ids: int = 500,
+        max_page_size: int = 500
+    ):
         self.app = FastAPI(
             title="AigentQube Dashboard",
             description="Intelligent Agent Monitoring System",
             version="0.1.0"
         )
+        self._natural_language_interface = natural_language_interface
+        self.stream_queue_size = stream_queue_size
+        # Shared by all workers when STATUS_REGISTRY_PATH points at one SQLite file
+        self.status_registry = status_registry or create_status_registry(
+            os.getenv("STATUS_REGISTRY_PATH")
+        )
+        # Each watched agent's status is computed once per tick for all viewers
+        # and pushed as soon as the registry reports a change
+        self.status_hub = StatusHub(
+            self.get_agent_status,
+            interval=status_interval,
+            queue_size=status_queue_size,
+            wait_for_change=self._wait_for_status_change
+        )
+        # Upper bounds on the work a single bulk status request may cause
+        self.max_status_ids = max_status_ids
+        self.max_page_size = max_page_size
+        _APPS.add(self)
+        self.warmup = warmup
+        self.startup_seconds: Optional[float] = None
+        self.warm = threading.Event()
+        self._interface_lock = threading.Lock()
+        self.app.router.add_event_handler("startup", self.on_startup)
+        self.app.router.add_event_handler("shutdown", self.on_shutdown)
         self.setup_routes()
 
+    @property
+    def natural_language_interface(self) -> "NaturalLanguageInterface":
+        """Query interface, created from OPENAI_API_KEY on first use"""
+        if self._natural_language_interface is None:
+            with self._interface_lock:
+                if self._natural_language_interface is None:
+                    from .context_transformer import AgentContextTransformer
+                    from .natural_language_interface import NaturalLanguageInterface
+
+                    self._natural_language_interface = NaturalLanguageInterface(
+                        openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+                        context_transformer=AgentContextTransformer(
+                            artifact_path=os.getenv("DOMAIN_ARTIFACT_PATH")
+                        )
+                    )
+        return self._natural_language_interface
+
+    async def on_startup(self) -> None:
+        """
+        Record time to readiness and warm up services in the background
+
+        Readiness never waits for the warmup; the first query that arrives
+        before it finishes initializes whatever is still missing.
+        """
+        self.startup_seconds = time.perf_counter() - PROCESS_START
+        logger.info("Worker ready", startup_seconds=round(self.startup_seconds, 3))
+        if self.warmup:
+            threading.Thread(
+                target=self._warm_up, name="aigentqube-warmup", daemon=True
+            ).start()
+        else:
+            self.warm.set()
+
+    async def on_shutdown(self) -> None:
+        await self.status_hub.close()
+        self.status_registry.close()
+
+    def _warm_up(self) -> None:
+        started = time.perf_counter()
+        try:
+            self.natural_language_interface.warmup()
+            logger.info("Warmup finished", seconds=round(time.perf_counter() - started, 3))
+        except Exception as e:
+            logger.warning(f"Warmup failed: {e}")
+        finally:
+            self.warm.set()
+
     def setup_routes(self):
+        @self.app.get("/health")
+        async def health() -> Dict[str, Any]:
+            """Liveness and readiness probe; answers before warmup completes"""
+            return {
+                "status": "ok",
+                "startup_seconds": self.startup_seconds,
+                "warm": self.warm.is_set()
+            }
+
+        @self.app.get("/metrics")
+        async def metrics() -> Response:
+            """Prometheus scrape endpoint; 404 while metrics are disabled"""
+            if not METRICS.enabled:
+                raise HTTPException(status_code=404, detail="Metrics are disabled")
+            return PlainTextResponse(
+                METRICS.render(), media_type="text/plain; version=0.0.4"
+            )
+
+        @self.app.get("/agents/status")
+        async def bulk_agent_status(
+            request: Request,
+            ids: str = Query(..., description="Comma-separated agent IDs"),
+            since: Optional[int] = Query(None, ge=0)
+        ) -> Response:
+            """
+            Statuses of many agents in one response
+
+            Only agents with a registered status are returned; the others are
+            listed as missing. With since, only statuses changed after that
+            version are included.
+            """
+            agent_ids = list(dict.fromkeys(
+                agent_id.strip() for agent_id in ids.split(",") if agent_id.strip()
+            ))
+            if len(agent_ids) > self.max_status_ids:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"At most {self.max_status_ids} agent IDs per request"
+                )
+
+            # Read before the statuses so the version is never newer than the body
+            version = self.status_registry.version
+            records = self.status_registry.get_many(agent_ids)
+            returned = [
+                record for record in records.values()
+                if since is None or record.version > since
+            ]
+            etag = status_etag(("bulk", tuple(agent_ids), since), returned)
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+
+            return JSONResponse(
+                {
+                    "version": version,
+                    "statuses": {record.agent_id: status_payload(record) for record in returned},
+                    "missing": [agent_id for agent_id in agent_ids if agent_id not in records]
+                },
+                headers={"ETag": etag, "Cache-Control": "no-cache"}
+            )
+
+        @self.app.get("/agents")
+        async def list_agent_statuses(
+            request: Request,
+            after: Optional[str] = Query(None, description="Last agent ID of the previous page"),
+            since: Optional[int] = Query(None, ge=0, description="Only statuses changed after this version"),
+            limit: int = Query(100, ge=1, le=self.max_page_size)
+        ) -> Response:
+            """
+            Page through registered agent statuses
+
+            Pages are ordered by agent ID and continue from next_after. With
+            since, the listing becomes a change feed ordered by version that
+            continues from next_since.
+            """
+            version = self.status_registry.version
+            if since is not None:
+                records = self.status_registry.changed_since(since, limit)
+                cursor = {"next_since": records[-1].version if len(records) == limit else None}
+            else:
+                records = self.status_registry.list_records(after, limit)
+                cursor = {"next_after": records[-1].agent_id if len(records) == limit else None}
+
+            etag = status_etag(("list", after, since, limit), records)
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+
+            return JSONResponse(
+                {
+                    "version": version,
+                    "statuses": [status_payload(record) for record in records],
+                    **cursor
+                },
+                headers={"ETag": etag, "Cache-Control": "no-cache"}
+            )
+
         @self.app.websocket("/ws/agent/{agent_id}")
         async def agent_status_stream(websocket: WebSocket, agent_id: str):
-            """Real-time agent status WebSocket endpoint"""
+            """
+            Real-time agent status WebSocket endpoint
+
+            By default every update is the full status as JSON. Clients can
+            negotiate ?protocol=delta (optionally &encoding=msgpack) to get a
+            snapshot first and then sequenced deltas and heartbeats, and send
+            {"type": "resync"} to get a fresh snapshot.
+            """
+            protocol = websocket.query_params.get("protocol", "full")
+            try:
+                if protocol not in PROTOCOLS:
+                    raise ValueError(f"Unknown status protocol: {protocol}")
+                session = DeltaSession(
+                    websocket.query_params.get("encoding", "json")
+                ) if protocol == "delta" else None
+            except ValueError as e:
+                logger.warning(f"Rejected status WebSocket for agent {agent_id}: {e}")
+                await websocket.close(code=1008)
+                return
+
             await websocket.accept()
             try:
-                while True:
-                    # Simulate agent status updates
-                    agent_status = await self.get_agent_status(agent_id)
-                    await websocket.send_json(agent_status)
-                    await asyncio.sleep(5)  # Update every 5 seconds
+                async with self.status_hub.subscribe(agent_id) as subscription:
+                    await self.stream_status(websocket, subscription, session)
             except WebSocketDisconnect:
                 logger.info(f"WebSocket disconnected for agent {agent_id}")
 
+        @self.app.websocket("/ws/query")
+        async def query_stream(websocket: WebSocket):
+            """
+            Streaming query WebSocket endpoint
+
+            Clients send {"query": ..., "context": {...}} and receive delta
+            events followed by a done event. Any client message sent while a
+            response is streaming cancels that generation.
+            """
+            await websocket.accept()
+            try:
+                while True:
+                    request = await websocket.receive_json()
+                    query = request.get("query") if isinstance(request, dict) else None
+                    if not query:
+                        await websocket.send_json(
+                            {"type": "error", "message": "Missing query"}
+                        )
+                        continue
+                    await self.stream_query(websocket, query, request.get("context"))
+            except WebSocketDisconnect:
+                logger.info("Query WebSocket disconnected")
+
+    async def stream_query(
+        self,
+        websocket: WebSocket,
+        query: str,
+        agent_context: Optional[Dict] = None
+    ) -> None:
+        """
+        Forward one streamed response to a WebSocket client
+
+        A bounded queue sits between the upstream stream and the socket, so a
+        slow client stops upstream reads instead of buffering without limit.
+        Disconnects and cancel messages cancel the upstream generation.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.stream_queue_size)
+
+        async def produce():
+            try:
+                async with contextlib.aclosing(
+                    self.natural_language_interface.astream_user_query(
+                        query, agent_context
+                    )
+                ) as events:
+                    async for event in events:
+                        await queue.put(event)
+            except Exception as e:
+                logger.error(f"Error streaming query: {e}")
+                await queue.put({
+                    "type": "error",
+                    "message": "I'm sorry, but I encountered an error processing your query."
+                })
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        watcher = asyncio.create_task(websocket.receive())
+        try:
+            while True:
+                getter = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, watcher}, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if watcher in done:
+                    getter.cancel()
+                    message = watcher.result()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    await websocket.send_json({"type": "cancelled"})
+                    return
+
+                event = getter.result()
+                if event is None:
+                    return
+                WS_FRAMES_SENT.labels("query").inc()
+                await websocket.send_json(event)
+        finally:
+            producer.cancel()
+            watcher.cancel()
+
+    async def stream_status(
+        self,
+        websocket: WebSocket,
+        subscription: StatusSubscription,
+        session: Optional[DeltaSession] = None
+    ) -> None:
+        """
+        Forward hub updates to a WebSocket client until it disconnects
+
+        Client messages are read concurrently so a disconnect or resync
+        request is handled even while no update is due. With a delta
+        session, frames are pre-encoded once per update and shared.
+        """
+        async def send(update: StatusUpdate) -> None:
+            WS_FRAMES_SENT.labels("status").inc()
+            if session is None:
+                await websocket.send_json(update.status)
+                return
+            frame = session.frame(update)
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+
+        watcher = asyncio.create_task(websocket.receive())
+        try:
+            while True:
+                getter = asyncio.create_task(subscription.get())
+                done, _ = await asyncio.wait(
+                    {getter, watcher}, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if watcher in done:
+                    message = watcher.result()
+                    if message["type"] == "websocket.disconnect":
+                        getter.cancel()
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    watcher = asyncio.create_task(websocket.receive())
+
+                    if session is not None and is_resync_request(message):
+                        session.resync()
+                        latest = self.status_hub.latest(subscription.agent_id)
+                        if latest is not None and getter not in done:
+                            await send(latest)
+
+                if getter in done:
+                    await send(getter.result())
+                else:
+                    getter.cancel()
+        finally:
+            watcher.cancel()
+
     async def get_agent_status(self, agent_id: str) -> Dict[str, Any]:
         """
         Retrieve current status of an agent
         
-        Simulated method - replace with actual agent monitoring logic
+        Statuses written to the registry by producers take precedence;
+        agents without one get simulated data
         """
+        record = self.status_registry.get(agent_id)
+        if record is not None:
+            return status_payload(record)
         return {
             "agent_id": agent_id,
             "status": "active",
-            "last_updated": structlog.processors.TimeStamper(fmt="iso").get_timestamp(),
+            "last_updated": format_timestamp(time.time()),
             "context_depth": 0.75,
             "blockchain_sync": True
         }
 
+    async def _wait_for_status_change(
+        self,
+        agent_id: str,
+        status: Dict[str, Any],
+        timeout: float
+    ) -> bool:
+        return await self.status_registry.wait_for_change(
+            agent_id, status.get("version", 0), timeout
+        )
+
 aigentqube_app = AigentQubeApp()
 app = aigentqube_app.app
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        # permessage-deflate for status frames; disable to trade bandwidth for CPU
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() != "false"
+    )
@@ -0,0 +1,246 @@
+import ast
+import base64
+import hashlib
+import json
+import os
+import re
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # optional binary codec
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # optional binary codec
+    cbor2 = None
+
+# Encoded metadata looks like "iq1:<format>[+z]:<payload>" or "iq1:ref:<sha256>"
+HEADER_VERSION = "iq1"
+
+# Off-chain references are lowercase hex SHA-256 digests and nothing else
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# Deeper payloads are rejected before parsing; deep nesting can exhaust the C stack
+MAX_NESTING = 64
+
+# Decompressed payloads are capped so a small on-chain value cannot expand without bound
+MAX_DECODED_BYTES = 1 << 20
+
+# Quoted strings (skipped whole, escapes included) or a single bracket
+_NESTING_TOKENS = re.compile(r""""(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[\[\]{}()]""", re.DOTALL)
+
+def nesting_depth(text: str) -> int:
+    """
+    Deepest bracket nesting of text, ignoring brackets inside quoted strings
+
+    :param text: JSON or Python literal text
+    :return: Maximum depth reached
+    """
+    depth = deepest = 0
+    for match in _NESTING_TOKENS.finditer(text):
+        char = match.group()
+        if char in "[{(":
+            depth += 1
+            deepest = max(deepest, depth)
+        elif char in "]})":
+            depth -= 1
+    return deepest
+
+def bounded_decompress(data: bytes) -> bytes:
+    """
+    zlib-decompress at most MAX_DECODED_BYTES of untrusted input
+
+    :param data: Compressed payload
+    :return: Decompressed bytes
+    """
+    decompressor = zlib.decompressobj()
+    raw = decompressor.decompress(data, MAX_DECODED_BYTES)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Metadata decompresses to more than {MAX_DECODED_BYTES} bytes")
+    if not decompressor.eof:
+        raise ValueError("Compressed metadata is truncated")
+    return raw
+
+def validate_digest(digest: str) -> str:
+    """
+    Reject anything but a SHA-256 hex digest before it becomes a file name
+
+    :param digest: Digest read from untrusted on-chain metadata
+    :return: The digest
+    """
+    if not isinstance(digest, str) or not DIGEST_PATTERN.fullmatch(digest):
+        raise ValueError("Off-chain metadata reference is not a SHA-256 hex digest")
+    return digest
+
+def canonical_json(metadata: Any) -> bytes:
+    """
+    Deterministic compact JSON: sorted keys, no whitespace, UTF-8
+
+    :param metadata: JSON-serializable metadata
+    :return: Encoded bytes, identical for equal inputs
+    """
+    return json.dumps(
+        metadata, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+def _json_loads(payload: bytes) -> Any:
+    text = payload.decode("utf-8")
+    if nesting_depth(text) > MAX_NESTING:
+        raise ValueError(f"Metadata is nested deeper than {MAX_NESTING} levels")
+    return json.loads(text)
+
+def _msgpack_dumps(metadata: Any) -> bytes:
+    return msgpack.packb(metadata, use_bin_type=True)
+
+def _msgpack_loads(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, raw=False)
+
+def _cbor_dumps(metadata: Any) -> bytes:
+    return cbor2.dumps(metadata, canonical=True)
+
+def _cbor_loads(payload: bytes) -> Any:
+    return cbor2.loads(payload)
+
+# Serializers per format name: (dumps, loads, optional module the format needs)
+FORMATS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any], Any]] = {
+    "json": (canonical_json, _json_loads, json),
+    "msgpack": (_msgpack_dumps, _msgpack_loads, msgpack),
+    "cbor": (_cbor_dumps, _cbor_loads, cbor2),
+}
+
+class FileMetadataStore:
+    """
+    Content-addressed off-chain metadata store in a local directory
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, content: bytes) -> str:
+        """
+        Store content under its SHA-256 digest
+
+        :param content: Encoded metadata
+        :return: Hex digest addressing the content
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.directory, digest)
+        if not os.path.exists(path):
+            temporary = f"{path}.tmp"
+            with open(temporary, "wb") as blob:
+                blob.write(content)
+            os.replace(temporary, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(os.path.join(self.directory, validate_digest(digest)), "rb") as blob:
+            return blob.read()
+
+class MetadataCodec:
+    def __init__(
+        self,
+        format: str = "json",
+        compress: Union[bool, str] = "auto",
+        store: Optional[FileMetadataStore] = None,
+        offchain_threshold: Optional[int] = None
+    ):
+        """
+        Initialize a versioned encoder for iQube token metadata
+
+        Metadata is serialized deterministically, optionally zlib-compressed
+        and prefixed with a version/format header so any reader can decode
+        it. Binary payloads are base64 encoded to fit the contract's string
+        field. Payloads above offchain_threshold are written to the store
+        and only their content hash goes on chain.
+
+        :param format: Serialization format: "json", "msgpack" or "cbor"
+        :param compress: True, False, or "auto" to compress only when it saves space
+        :param store: Optional off-chain content-addressed store
+        :param offchain_threshold: Encoded size in bytes above which metadata goes off chain
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown metadata format: {format}")
+        if FORMATS[format][2] is None:
+            raise ImportError(f"The {format} metadata format needs the {format} package installed")
+
+        self.format = format
+        self.compress = compress
+        self.store = store
+        self.offchain_threshold = offchain_threshold
+
+    def encode(self, metadata: Any) -> str:
+        """
+        Encode metadata for the on-chain string field
+
+        :param metadata: Metadata to encode
+        :return: Header-prefixed encoded metadata or content-hash reference
+        """
+        encoded = self._encode_inline(metadata)
+        size = len(encoded.encode("utf-8"))
+        if self.store is not None and self.offchain_threshold is not None and size > self.offchain_threshold:
+            digest = self.store.put(encoded.encode("utf-8"))
+            return f"{HEADER_VERSION}:ref:{digest}"
+        return encoded
+
+    def decode(self, text: str) -> Any:
+        """
+        Decode metadata written by encode() or by the legacy str(metadata) format
+
+        :param text: Metadata string read from the contract
+        :return: Decoded metadata
+        """
+        if not text.startswith(f"{HEADER_VERSION}:"):
+            return self._decode_legacy(text)
+
+        _, kind, payload = text.split(":", 2)
+        if kind == "ref":
+            if self.store is None:
+                raise ValueError("Metadata is stored off chain but no store is configured")
+            content = self.store.get(validate_digest(payload))
+            if hashlib.sha256(content).hexdigest() != payload:
+                raise ValueError(f"Off-chain metadata {payload} does not match its hash")
+            return self.decode(content.decode("utf-8"))
+
+        format, _, compression = kind.partition("+")
+        if format not in FORMATS or FORMATS[format][2] is None:
+            raise ValueError(f"Unsupported metadata format: {format}")
+
+        if format == "json" and not compression:
+            raw = payload.encode("utf-8")
+        else:
+            raw = base64.b64decode(payload)
+        if compression == "z":
+            raw = bounded_decompress(raw)
+        return FORMATS[format][1](raw)
+
+    def _encode_inline(self, metadata: Any) -> str:
+        raw = FORMATS[self.format][0](metadata)
+
+        candidates = []
+        if self.compress is not True:
+            if self.format == "json":
+                candidates.append(f"{HEADER_VERSION}:json:{raw.decode('utf-8')}")
+            else:
+                candidates.append(f"{HEADER_VERSION}:{self.format}:{base64.b64encode(raw).decode('ascii')}")
+        if self.compress:
+            compressed = base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+            candidates.append(f"{HEADER_VERSION}:{self.format}+z:{compressed}")
+
+        return min(candidates, key=lambda candidate: len(candidate.encode("utf-8")))
+
+    @staticmethod
+    def _decode_legacy(text: str) -> Any:
+        if nesting_depth(text) > MAX_NESTING:
+            return text
+        try:
+            return json.loads(text)
+        except (ValueError, RecursionError):
+            pass
+        try:
+            # Tokens minted before the codec stored str(metadata), a Python repr
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            return text
@@ -0,0 +1,289 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow upstream calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+LabelValues = Tuple[str, ...]
+GaugeValue = Union[float, Dict[LabelValues, float]]
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _NullMetric:
+    """
+    Stand-in handed out while metrics are disabled; every call is a no-op
+    """
+    def labels(self, *values: str) -> "_NullMetric":
+        return self
+
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def time(self) -> contextlib.AbstractContextManager:
+        return _NULL_TIMER
+
+_NULL_METRIC = _NullMetric()
+_NULL_TIMER = contextlib.nullcontext()
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: "_HistogramChild"):
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str]):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """
+        Child metric for one combination of label values
+
+        :return: The child, or a no-op stand-in while metrics are disabled
+        """
+        if not self._registry.enabled:
+            return _NULL_METRIC
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        if self._registry.enabled:
+            self.labels().inc(amount)
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in sorted(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float) -> None:
+        if self._registry.enabled:
+            self.labels().observe(value)
+
+    def time(self) -> contextlib.AbstractContextManager:
+        """
+        Context manager observing the seconds its block takes
+
+        While metrics are disabled it is a shared no-op that reads no clock.
+        """
+        if not self._registry.enabled:
+            return _NULL_TIMER
+        return self.labels().time()
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {count}"
+
+class Gauge(_Metric):
+    """
+    Gauge read from a callback at scrape time, so it costs nothing in between
+    """
+    kind = "gauge"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        read: Callable[[], GaugeValue]
+    ):
+        super().__init__(registry, name, help, labelnames)
+        self.read = read
+
+    def _samples(self) -> Iterator[str]:
+        value = self.read()
+        samples = value if isinstance(value, dict) else {(): value}
+        for values, sample in sorted(samples.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(sample)}"
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False):
+        """
+        Initialize a registry of counters, histograms and gauges
+
+        While disabled, timers read no clock, labels() returns a shared
+        no-op and nothing is locked or allocated on instrumented paths.
+
+        :param enabled: Whether observations are recorded
+        """
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], GaugeValue],
+        labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        """
+        Register a gauge computed by read() at scrape time
+
+        Registering a gauge under an existing name replaces it. Register
+        gauges once per process and let read() find the live objects.
+        """
+        gauge = Gauge(self, name, help, labelnames, read)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format
+
+        :return: Exposition text
+        """
+        with self._lock:
+            metrics: List[_Metric] = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric._samples())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """
+        Drop all recorded observations, keeping the registered metrics
+        """
+        with self._lock:
+            for metric in self._metrics.values():
+                metric._children.clear()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+# Process-wide registry; set METRICS_ENABLED=true (or enable it in code) to record
+REGISTRY = MetricsRegistry(
+    enabled=os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+)
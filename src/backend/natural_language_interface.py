@@ -1,26 +1,145 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, Optional
-from openai import OpenAI
+import threading
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Union
+
+import httpx
+from .cache import AsyncSingleFlight, SingleFlight, SQLiteTTLCache, TTLCache
 from .context_transformer import AgentContextTransformer
+from .conversation_context import ConversationContextManager
+from .metrics import REGISTRY
+
+QUERY_SECONDS = REGISTRY.histogram(
+    "aigentqube_query_seconds", "End-to-end time to answer one query", ["mode"]
+)
+QUERIES = REGISTRY.counter(
+    "aigentqube_queries_total", "Answered queries by how they were served", ["result"]
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "aigentqube_llm_request_seconds", "Upstream chat completion latency", ["mode"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "aigentqube_llm_tokens_total", "Tokens billed by upstream chat completions"
+)
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+DOMAIN_PROMPTS = {
+    "general": """
+            You are a helpful AI assistant. 
+            Provide clear, concise, and accurate responses.
+            """,
+    "technical": """
+            You are a technical AI assistant with expertise in multiple domains. 
+            Provide precise, detailed technical explanations.
+            Use industry-standard terminology and be as specific as possible.
+            """,
+    "creative": """
+            You are a creative AI assistant. 
+            Provide imaginative, engaging, and inspiring responses.
+            Think outside the box and offer unique perspectives.
+            """
+}
 
 class NaturalLanguageInterface:
     def __init__(
         self, 
         openai_api_key: str, 
-        context_transformer: Optional[AgentContextTransformer] = None
+        context_transformer: Optional[AgentContextTransformer] = None,
+        base_url: Optional[str] = None,
+        model: str = "gpt-4",
+        max_concurrency: int = 8,
+        request_timeout: float = 30.0,
+        max_connections: int = 20,
+        response_cache: Optional[Union[TTLCache, SQLiteTTLCache]] = None,
+        context_manager: Optional[ConversationContextManager] = None
     ):
         """
         Initialize Natural Language Interface
         
         :param openai_api_key: API key for OpenAI services
         :param context_transformer: Optional context transformer for domain detection
+        :param base_url: Optional override of the chat completions API base URL
+        :param model: Chat completion model name
+        :param max_concurrency: Maximum in-flight async completions
+        :param request_timeout: Per-call timeout in seconds
+        :param max_connections: Size of the shared async HTTP connection pool
+        :param response_cache: Optional in-memory or SQLite cache of completions
+        :param context_manager: Optional multi-turn history store keyed by session_id
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        self.model = model
+        self.request_timeout = request_timeout
+
+        # API clients (and the openai import) are created on first use
+        self._api_key = openai_api_key
+        self._base_url = base_url
+        self._max_connections = max_connections
+        self._client: Optional["OpenAI"] = None
+        self._async_client: Optional["AsyncOpenAI"] = None
+        self._client_lock = threading.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Identical prompts are answered from cache, concurrent ones share a call
+        self.response_cache = response_cache
+        self._single_flight = SingleFlight()
+        self._async_single_flight = AsyncSingleFlight()
+
+        # Multi-turn history and rendered system prompts per domain
+        self.context_manager = context_manager
+        self._system_prompts: Dict[str, str] = {}
         self.context_transformer = context_transformer or AgentContextTransformer()
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+
+    @property
+    def client(self) -> "OpenAI":
+        """
+        Synchronous API client, created on first use
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    self._client = OpenAI(api_key=self._api_key, base_url=self._base_url)
+        return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """
+        Async API client on a pooled HTTP connection, created on first use
+        """
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+
+                    self._async_client = AsyncOpenAI(
+                        api_key=self._api_key,
+                        base_url=self._base_url,
+                        timeout=self.request_timeout,
+                        http_client=httpx.AsyncClient(
+                            limits=httpx.Limits(
+                                max_connections=self._max_connections,
+                                max_keepalive_connections=self._max_connections
+                            ),
+                            timeout=self.request_timeout
+                        )
+                    )
+        return self._async_client
+
+    def warmup(self) -> None:
+        """
+        Perform deferred imports and setup ahead of the first query
+        """
+        self.context_transformer.warmup()
+        self.client
+        self.async_client
     
     def process_user_query(
         self, 
@@ -34,39 +153,378 @@ class NaturalLanguageInterface:
         :param agent_context: Optional context for the agent
         :return: Processed response with metadata
         """
-        try:
-            # Detect domain and adjust prompt
-            domain = self.context_transformer.detect_domain(query)
-            system_prompt = self._generate_system_prompt(domain)
+        with QUERY_SECONDS.labels("sync").time():
+            try:
+                # Detect domain and adjust prompt
+                domain = self.context_transformer.detect_domain(query)
+                system_prompt = self._generate_system_prompt(domain)
+                messages = self._build_messages(system_prompt, query, agent_context)
+
+                cache_key = self._response_key(domain, messages)
+                result = self._cached_response(cache_key)
+                if result is None:
+                    result, shared = self._single_flight.do(
+                        cache_key, lambda: self._complete(messages, domain, cache_key)
+                    )
+                    if shared:
+                        result = self._shared_response(result)
+
+                self._record_turn(agent_context, query, result)
+                QUERIES.labels("cached" if result["cached"] else "upstream").inc()
+                return result
             
-            # Generate response using GPT-4
+            except Exception as e:
+                QUERIES.labels("error").inc()
+                self.logger.error(f"Error processing user query: {e}")
+                return self._error_response()
+
+    async def aprocess_user_query(
+        self,
+        query: str,
+        agent_context: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Async variant of process_user_query on the pooled async client
+
+        :param query: User's natural language query
+        :param agent_context: Optional context for the agent
+        :return: Processed response with metadata
+        """
+        with QUERY_SECONDS.labels("async").time():
+            try:
+                domain = self.context_transformer.detect_domain(query)
+                result = await self._acomplete(query, domain, agent_context)
+                await self._arecord_turn(agent_context, query, result)
+                QUERIES.labels("cached" if result["cached"] else "upstream").inc()
+                return result
+            except Exception as e:
+                QUERIES.labels("error").inc()
+                self.logger.error(f"Error processing user query: {e}")
+                return self._error_response()
+
+    async def process_user_queries(
+        self,
+        queries: List[str],
+        agent_context: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Process many queries concurrently, bounded by max_concurrency
+
+        Domains for the whole batch are detected in one pass, and failures are
+        reported per query without cancelling the rest of the batch. Each
+        query is timed and counted like a single aprocess_user_query() call.
+
+        :param queries: User queries
+        :param agent_context: Optional context shared by every query
+        :return: Processed responses in the same order as queries
+        """
+        if not queries:
+            return []
+
+        detections = self.context_transformer.detect_domains(queries)
+        results = await asyncio.gather(
+            *(
+                self._atimed_complete(query, detection["domain"], agent_context)
+                for query, detection in zip(queries, detections)
+            ),
+            return_exceptions=True
+        )
+
+        responses = []
+        for query, result in zip(queries, results):
+            if isinstance(result, BaseException):
+                QUERIES.labels("error").inc()
+                self.logger.error(f"Error processing user query: {result}")
+                responses.append(self._error_response())
+            else:
+                await self._arecord_turn(agent_context, query, result)
+                QUERIES.labels("cached" if result["cached"] else "upstream").inc()
+                responses.append(result)
+
+        return responses
+
+    async def astream_user_query(
+        self,
+        query: str,
+        agent_context: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Stream a response as it is generated
+
+        Yields {"type": "delta", "content": ...} events followed by one
+        {"type": "done", ...} event carrying the usual response metadata.
+        Closing the generator early closes the upstream HTTP stream, which
+        stops generation on the model side. Waiting longer than
+        request_timeout for the stream or its next chunk raises
+        asyncio.TimeoutError.
+
+        :param query: User's natural language query
+        :param agent_context: Optional context for the agent
+        :return: Async iterator of stream events
+        """
+        domain = self.context_transformer.detect_domain(query)
+        system_prompt = self._generate_system_prompt(domain)
+        messages = self._build_messages(system_prompt, query, agent_context)
+
+        cache_key = self._response_key(domain, messages)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            await self._arecord_turn(agent_context, query, cached)
+            yield {"type": "delta", "content": cached["response"]}
+            yield {"type": "done", **cached}
+            return
+
+        parts: List[str] = []
+        tokens_used = 0
+
+        async with self._semaphore:
+            # Like the non-streaming path, a stalled upstream gives the slot
+            # back after request_timeout, both before and between chunks
+            stream = await asyncio.wait_for(
+                self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                timeout=self.request_timeout
+            )
+            try:
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.request_timeout)
+                    except StopAsyncIteration:
+                        break
+                    if chunk.usage is not None:
+                        tokens_used = chunk.usage.total_tokens
+                    for choice in chunk.choices:
+                        if choice.delta.content:
+                            parts.append(choice.delta.content)
+                            yield {"type": "delta", "content": choice.delta.content}
+            finally:
+                await stream.close()
+
+        LLM_TOKENS.inc(tokens_used)
+        result = {
+            "response": "".join(parts),
+            "domain": domain,
+            "tokens_used": tokens_used,
+            "model": self.model,
+            "cached": False
+        }
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, result)
+        await self._arecord_turn(agent_context, query, result)
+
+        yield {"type": "done", **result}
+
+    def cache_stats(self) -> Dict:
+        """
+        Report response cache hit rate and request coalescing counters
+
+        :return: Cache stats (None when caching is disabled) and coalesced count
+        """
+        return {
+            "response_cache": (
+                self.response_cache.stats() if self.response_cache is not None else None
+            ),
+            "coalesced_requests": (
+                self._single_flight.coalesced + self._async_single_flight.coalesced
+            )
+        }
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled async HTTP connections
+        """
+        if self._async_client is not None:
+            await self._async_client.close()
+
+    async def _atimed_complete(
+        self,
+        query: str,
+        domain: str,
+        agent_context: Optional[Dict]
+    ) -> Dict:
+        with QUERY_SECONDS.labels("async").time():
+            return await self._acomplete(query, domain, agent_context)
+
+    async def _acomplete(
+        self,
+        query: str,
+        domain: str,
+        agent_context: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Run one chat completion under the concurrency limit and timeout
+
+        :param query: User's natural language query
+        :param domain: Detected domain for the query
+        :param agent_context: Optional context for the agent
+        :return: Processed response with metadata
+        """
+        system_prompt = self._generate_system_prompt(domain)
+        messages = self._build_messages(system_prompt, query, agent_context)
+
+        cache_key = self._response_key(domain, messages)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+        result, shared = await self._async_single_flight.do(
+            cache_key, lambda: self._acreate(messages, domain, cache_key)
+        )
+        return self._shared_response(result) if shared else result
+
+    def _complete(self, messages: List[Dict], domain: str, cache_key: str) -> Dict:
+        """
+        Call the model synchronously and cache the formatted response
+
+        :param messages: Chat messages to send
+        :param domain: Detected domain for the query
+        :param cache_key: Response cache key for the messages
+        :return: Processed response with metadata
+        """
+        # Generate response using GPT-4
+        with LLM_REQUEST_SECONDS.labels("sync").time():
             response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query}
-                ]
+                model=self.model,
+                messages=messages,
+                timeout=self.request_timeout
             )
-            
-            # Extract response details
-            ai_response = response.choices[0].message.content
-            token_usage = response.usage.total_tokens
-            
-            return {
-                "response": ai_response,
-                "domain": domain,
-                "tokens_used": token_usage,
-                "model": "gpt-4"
-            }
-        
-        except Exception as e:
-            self.logger.error(f"Error processing user query: {e}")
-            return {
-                "response": "I'm sorry, but I encountered an error processing your query.",
-                "domain": "error",
-                "tokens_used": 0,
-                "model": "gpt-4"
-            }
+
+        result = self._format_response(response, domain)
+        LLM_TOKENS.inc(result["tokens_used"])
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, result)
+        return result
+
+    async def _acreate(self, messages: List[Dict], domain: str, cache_key: str) -> Dict:
+        """
+        Call the model under the concurrency limit and cache the response
+
+        :param messages: Chat messages to send
+        :param domain: Detected domain for the query
+        :param cache_key: Response cache key for the messages
+        :return: Processed response with metadata
+        """
+        async with self._semaphore:
+            with LLM_REQUEST_SECONDS.labels("async").time():
+                response = await asyncio.wait_for(
+                    self.async_client.chat.completions.create(
+                        model=self.model,
+                        messages=messages
+                    ),
+                    timeout=self.request_timeout
+                )
+
+        result = self._format_response(response, domain)
+        LLM_TOKENS.inc(result["tokens_used"])
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, result)
+        return result
+
+    def _response_key(self, domain: str, messages: List[Dict]) -> str:
+        payload = json.dumps([self.model, domain, messages], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _cached_response(self, cache_key: str) -> Optional[Dict]:
+        """
+        Return a cached response reported as free, or None on a miss
+
+        :param cache_key: Response cache key
+        :return: Cached response with tokens_used set to 0
+        """
+        if self.response_cache is None:
+            return None
+
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        return {**cached, "tokens_used": 0, "cached": True}
+
+    def _shared_response(self, result: Dict) -> Dict:
+        # Coalesced callers did not pay for the upstream call they shared
+        return {**result, "tokens_used": 0, "cached": True}
+
+    def _build_messages(
+        self,
+        system_prompt: str,
+        query: str,
+        agent_context: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Build chat messages, including session history when one is tracked
+
+        :param system_prompt: System prompt for the detected domain
+        :param query: User's natural language query
+        :param agent_context: Optional context carrying a session_id
+        :return: Chat messages to send
+        """
+        session_id = self._session_id(agent_context)
+        if session_id is not None:
+            return self.context_manager.build_messages(session_id, system_prompt, query)
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query}
+        ]
+
+    def _record_turn(
+        self,
+        agent_context: Optional[Dict],
+        query: str,
+        result: Dict
+    ) -> None:
+        session_id = self._session_id(agent_context)
+        if session_id is None or result.get("domain") == "error":
+            return
+        self.context_manager.append(session_id, "user", query)
+        self.context_manager.append(session_id, "assistant", result["response"])
+
+    async def _arecord_turn(
+        self,
+        agent_context: Optional[Dict],
+        query: str,
+        result: Dict
+    ) -> None:
+        # Summarizing evicted turns may be slow, so it runs off the event loop
+        session_id = self._session_id(agent_context)
+        if session_id is None or result.get("domain") == "error":
+            return
+        await self.context_manager.aappend(session_id, "user", query)
+        await self.context_manager.aappend(session_id, "assistant", result["response"])
+
+    def _session_id(self, agent_context: Optional[Dict]) -> Optional[str]:
+        if self.context_manager is None or not agent_context:
+            return None
+        return agent_context.get("session_id")
+
+    def _format_response(self, response, domain: str) -> Dict:
+        """
+        Extract response details from a chat completion
+
+        :param response: Chat completion returned by the client
+        :param domain: Detected domain for the query
+        :return: Processed response with metadata
+        """
+        return {
+            "response": response.choices[0].message.content,
+            "domain": domain,
+            "tokens_used": response.usage.total_tokens,
+            "model": self.model,
+            "cached": False
+        }
+
+    def _error_response(self) -> Dict:
+        return {
+            "response": "I'm sorry, but I encountered an error processing your query.",
+            "domain": "error",
+            "tokens_used": 0,
+            "model": self.model,
+            "cached": False
+        }
     
     def _generate_system_prompt(self, domain: str) -> str:
         """
@@ -75,25 +533,14 @@ class NaturalLanguageInterface:
         :param domain: Detected domain for the query
         :return: Tailored system prompt
         """
-        domain_prompts = {
-            "general": """
-            You are a helpful AI assistant. 
-            Provide clear, concise, and accurate responses.
-            """,
-            "technical": """
-            You are a technical AI assistant with expertise in multiple domains. 
-            Provide precise, detailed technical explanations.
-            Use industry-standard terminology and be as specific as possible.
-            """,
-            "creative": """
-            You are a creative AI assistant. 
-            Provide imaginative, engaging, and inspiring responses.
-            Think outside the box and offer unique perspectives.
-            """
-        }
-        
+        prompt = self._system_prompts.get(domain)
+        if prompt is not None:
+            return prompt
+
         # Default to general prompt if domain not recognized
-        return domain_prompts.get(domain, domain_prompts["general"]) + f"""
+        prompt = DOMAIN_PROMPTS.get(domain, DOMAIN_PROMPTS["general"]) + f"""
         Current Domain: {domain}
         Maintain a professional and helpful tone.
         """
+        self._system_prompts[domain] = prompt
+        return prompt
@@ -0,0 +1,82 @@
+import heapq
+import logging
+import threading
+from typing import Any, Dict, List
+
+from web3 import Web3
+
+class NonceManager:
+    def __init__(self, web3: Web3):
+        """
+        Initialize a local nonce allocator for sending accounts
+
+        The next nonce of an account is read from its pending transaction
+        count once, then handed out locally so many transactions can be in
+        flight without nonce collisions. Nonces of transactions that failed
+        to send are returned and reused first, so no gap stalls the account.
+
+        :param web3: Web3 instance used to sync pending counts
+        """
+        self.web3 = web3
+        self._lock = threading.Lock()
+        self._next: Dict[str, int] = {}
+        self._released: Dict[str, List[int]] = {}
+
+        self.logger = logging.getLogger(__name__)
+
+    def allocate(self, address: str) -> int:
+        """
+        Reserve the next nonce of an account
+
+        :param address: Sending account address
+        :return: Nonce to sign the next transaction with
+        """
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            released = self._released.get(address)
+            if released:
+                return heapq.heappop(released)
+
+            if address not in self._next:
+                self._next[address] = self.web3.eth.get_transaction_count(address, "pending")
+            nonce = self._next[address]
+            self._next[address] = nonce + 1
+            return nonce
+
+    def release(self, address: str, nonce: int) -> None:
+        """
+        Return the nonce of a transaction that was never accepted by the node
+
+        :param address: Sending account address
+        :param nonce: Nonce that was allocated but not used
+        """
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            if self._next.get(address) == nonce + 1:
+                self._next[address] = nonce
+            else:
+                heapq.heappush(self._released.setdefault(address, []), nonce)
+
+    def resync(self, address: str) -> None:
+        """
+        Forget local state so the next allocation re-reads the pending count
+
+        Used after errors that mean local and node state diverged, such as
+        "nonce too low" from a transaction sent by another process.
+
+        :param address: Sending account address
+        """
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            self._next.pop(address, None)
+            self._released.pop(address, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                address: {
+                    "next": nonce,
+                    "released": sorted(self._released.get(address, []))
+                }
+                for address, nonce in self._next.items()
+            }
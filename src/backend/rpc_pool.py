@@ -0,0 +1,336 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Union
+from urllib.parse import urlsplit
+
+import requests
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .metrics import REGISTRY
+
+RPC_REQUEST_SECONDS = REGISTRY.histogram(
+    "aigentqube_rpc_request_seconds", "JSON-RPC request latency per endpoint", ["endpoint"]
+)
+RPC_ERRORS = REGISTRY.counter(
+    "aigentqube_rpc_errors_total", "Failed JSON-RPC requests per endpoint", ["endpoint"]
+)
+
+# Read-only methods that are safe to retry on another node or send twice
+IDEMPOTENT_METHODS = frozenset({
+    "eth_blockNumber", "eth_call", "eth_chainId", "eth_estimateGas", "eth_gasPrice",
+    "eth_getBalance", "eth_getBlockByHash", "eth_getBlockByNumber", "eth_getCode",
+    "eth_getLogs", "eth_getStorageAt", "eth_getTransactionByHash", "eth_getTransactionCount",
+    "eth_getTransactionReceipt", "eth_maxPriorityFeePerGas", "eth_feeHistory",
+    "net_version", "web3_clientVersion",
+})
+
+def parse_endpoints(urls: Union[str, Sequence[str]]) -> List[str]:
+    """
+    Accept one URL, a comma-separated list or a sequence of URLs
+
+    :param urls: Endpoint URL(s)
+    :return: Non-empty list of URLs
+    """
+    if isinstance(urls, str):
+        urls = urls.split(",")
+    endpoints = [url.strip() for url in urls if url and url.strip()]
+    if not endpoints:
+        raise ValueError("At least one RPC endpoint is required")
+    return endpoints
+
+def endpoint_label(index: int, url: str) -> str:
+    """
+    Metrics label of an endpoint that never contains its credentials
+
+    Provider API keys usually sit in the URL's path, query or user info,
+    so only the endpoint's position and host are kept.
+
+    :param index: Position of the endpoint in the pool
+    :param url: Endpoint URL
+    :return: Label such as "0-rpc.example.com"
+    """
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        host = None
+    return f"{index}-{host or 'unknown'}"
+
+class EndpointState:
+    """
+    Health statistics of one RPC endpoint
+    """
+    def __init__(self, url: str, window: int, label: str):
+        self.url = url
+        self.label = label
+        self.session = requests.Session()
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+class RPCPool:
+    def __init__(
+        self,
+        urls: Union[str, Sequence[str]],
+        ewma_alpha: float = 0.2,
+        failure_threshold: int = 3,
+        error_threshold: float = 0.5,
+        ejection_seconds: float = 30.0,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        request_timeout: float = 10.0,
+        latency_window: int = 200,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize a pool of JSON-RPC endpoints with failover
+
+        Requests are spread round-robin over healthy endpoints. Per endpoint
+        the pool tracks latency and error-rate EWMAs; an endpoint is ejected
+        for ejection_seconds after failure_threshold consecutive failures or
+        when its error EWMA exceeds error_threshold, then probed again.
+        Failed idempotent requests are retried on the next endpoint. With
+        hedging, an idempotent request still unanswered after the primary
+        endpoint's p95 latency (or hedge_delay) is duplicated to a second
+        endpoint and the first answer wins.
+
+        :param urls: Endpoint URL(s), a list or a comma-separated string
+        :param ewma_alpha: Weight of the newest sample in the EWMAs
+        :param failure_threshold: Consecutive failures that eject an endpoint
+        :param error_threshold: Error-rate EWMA that ejects an endpoint
+        :param ejection_seconds: How long an ejected endpoint is skipped
+        :param hedge: Duplicate slow idempotent requests to a second endpoint
+        :param hedge_delay: Fixed hedge delay in seconds instead of the p95 latency
+        :param request_timeout: Per-request timeout in seconds
+        :param latency_window: Latency samples kept per endpoint for the p95
+        :param clock: Monotonic time source, injectable for tests
+        """
+        self.endpoints = [
+            EndpointState(url, latency_window, endpoint_label(index, url))
+            for index, url in enumerate(parse_endpoints(urls))
+        ]
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.error_threshold = error_threshold
+        self.ejection_seconds = ejection_seconds
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.request_timeout = request_timeout
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._cursor = itertools.count()
+        self._position = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hedged = 0
+        self.hedge_wins = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def request(self, payload: Any, idempotent: bool = True) -> Any:
+        """
+        Send a JSON-RPC request or batch and return the decoded reply
+
+        JSON-RPC error objects are returned as-is; only transport failures
+        and HTTP errors count against an endpoint.
+
+        :param payload: JSON-RPC request object or batch list, or its encoded bytes
+        :param idempotent: Whether the request may be retried or hedged
+        :return: Decoded JSON reply
+        """
+        attempts = len(self.endpoints) if idempotent else 1
+        tried: List[EndpointState] = []
+        last_error: Optional[Exception] = None
+
+        while len(tried) < attempts:
+            endpoint = self._select(tried)
+            tried.append(endpoint)
+            try:
+                if idempotent and self.hedge and len(self.endpoints) > 1:
+                    return self._hedged_send(endpoint, payload, tried)
+                return self._send(endpoint, payload)
+            except requests.RequestException as e:
+                last_error = e
+                self.logger.warning(f"RPC request to {endpoint.url} failed: {e}")
+
+        raise ConnectionError(f"All RPC endpoints failed: {last_error}")
+
+    def healthy_endpoints(self) -> List[str]:
+        now = self._clock()
+        with self._lock:
+            return [endpoint.url for endpoint in self.endpoints if endpoint.ejected_until <= now]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report health statistics per endpoint
+
+        :return: Dictionary of pool counters and per-endpoint stats
+        """
+        now = self._clock()
+        with self._lock:
+            return {
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "endpoints": {
+                    endpoint.url: {
+                        "healthy": endpoint.ejected_until <= now,
+                        "requests": endpoint.requests,
+                        "failures": endpoint.failures,
+                        "ejections": endpoint.ejections,
+                        "latency_ewma": endpoint.latency_ewma,
+                        "error_ewma": endpoint.error_ewma,
+                        "p95": endpoint.p95()
+                    }
+                    for endpoint in self.endpoints
+                }
+            }
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for endpoint in self.endpoints:
+            endpoint.session.close()
+
+    def _select(self, exclude: Sequence[EndpointState], advance: bool = True) -> EndpointState:
+        """
+        Pick the next healthy endpoint round-robin
+
+        Hedge backups are picked with advance=False so they do not shift
+        the rotation of primary endpoints.
+
+        When every remaining endpoint is ejected, the one whose ejection
+        ends first is used rather than failing outright.
+        """
+        now = self._clock()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            if not candidates:
+                candidates = self.endpoints
+            start = next(self._cursor) if advance else self._position
+            self._position = start
+            for offset in range(len(candidates)):
+                endpoint = candidates[(start + offset) % len(candidates)]
+                if endpoint.ejected_until <= now:
+                    return endpoint
+            return min(candidates, key=lambda endpoint: endpoint.ejected_until)
+
+    def _send(self, endpoint: EndpointState, payload: Any) -> Any:
+        started = self._clock()
+        try:
+            if isinstance(payload, bytes):
+                response = endpoint.session.post(
+                    endpoint.url,
+                    data=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.request_timeout
+                )
+            else:
+                response = endpoint.session.post(endpoint.url, json=payload, timeout=self.request_timeout)
+            response.raise_for_status()
+            reply = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self._record(endpoint, self._clock() - started, failed=True)
+            if isinstance(e, requests.RequestException):
+                raise
+            raise requests.RequestException(f"Invalid JSON-RPC reply: {e}") from e
+
+        self._record(endpoint, self._clock() - started, failed=False)
+        return reply
+
+    def _hedged_send(self, primary: EndpointState, payload: Any, tried: List[EndpointState]) -> Any:
+        """
+        Send to primary and, if it is slower than its p95, also to a second endpoint
+        """
+        executor = self._get_executor()
+        delay = self.hedge_delay if self.hedge_delay is not None else primary.p95()
+        if delay is None:
+            return self._send(primary, payload)
+
+        futures: List[Future] = [executor.submit(self._send, primary, payload)]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            backup = self._select(tried, advance=False)
+            if backup is not primary:
+                tried.append(backup)
+                with self._lock:
+                    self.hedged += 1
+                futures.append(executor.submit(self._send, backup, payload))
+
+        pending = set(futures)
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def _record(self, endpoint: EndpointState, latency: float, failed: bool) -> None:
+        RPC_REQUEST_SECONDS.labels(endpoint.label).observe(latency)
+        if failed:
+            RPC_ERRORS.labels(endpoint.label).inc()
+
+        alpha = self.ewma_alpha
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.error_ewma = (1 - alpha) * endpoint.error_ewma + alpha * float(failed)
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                should_eject = (
+                    endpoint.consecutive_failures >= self.failure_threshold
+                    or endpoint.error_ewma > self.error_threshold
+                )
+                if should_eject and endpoint.ejected_until <= self._clock():
+                    endpoint.ejected_until = self._clock() + self.ejection_seconds
+                    endpoint.ejections += 1
+                    # One more failure after the ejection ends ejects it again
+                    endpoint.consecutive_failures = self.failure_threshold - 1
+                    self.logger.warning(f"Ejected unhealthy RPC endpoint {endpoint.url}")
+            else:
+                endpoint.consecutive_failures = 0
+                endpoint.latencies.append(latency)
+                endpoint.latency_ewma = latency if endpoint.latency_ewma is None else (
+                    (1 - alpha) * endpoint.latency_ewma + alpha * latency
+                )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(16, 4 * len(self.endpoints)), thread_name_prefix="rpc-hedge"
+                )
+            return self._executor
+
+class PooledHTTPProvider(JSONBaseProvider):
+    """
+    web3 provider sending every request through an RPCPool
+    """
+    def __init__(self, pool: RPCPool):
+        super().__init__()
+        self.pool = pool
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return self.pool.request(
+            self.encode_rpc_request(method, params),
+            idempotent=method in IDEMPOTENT_METHODS
+        )
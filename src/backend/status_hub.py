@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .metrics import REGISTRY
+
+DROPPED_UPDATES = REGISTRY.counter(
+    "aigentqube_ws_dropped_updates_total", "Status updates dropped for slow subscribers"
+)
+
+@dataclass
+class StatusUpdate:
+    """
+    One published agent status with its changes since the previous version
+
+    Encoded frames are cached on the update, so each one is serialized once
+    per tick no matter how many subscribers receive it.
+    """
+    agent_id: str
+    version: int
+    status: Dict[str, Any]
+    changed: Dict[str, Any]
+    removed: List[str]
+    frames: Dict[Any, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def unchanged(self) -> bool:
+        return not self.changed and not self.removed
+
+class StatusSubscription:
+    """
+    One subscriber's bounded queue of status updates
+
+    When the consumer falls behind, the oldest queued update is dropped,
+    so a slow client always catches up to the newest status.
+    """
+    def __init__(self, hub: "StatusHub", agent_id: str, queue_size: int):
+        self.hub = hub
+        self.agent_id = agent_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def put(self, update: StatusUpdate) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            DROPPED_UPDATES.inc()
+        self.queue.put_nowait(update)
+
+    async def get(self) -> StatusUpdate:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+    async def __aenter__(self) -> "StatusSubscription":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+class StatusHub:
+    def __init__(
+        self,
+        fetch_status: Callable[[str], Awaitable[Dict[str, Any]]],
+        interval: float = 5.0,
+        queue_size: int = 8,
+        wait_for_change: Optional[Callable[[str, Dict[str, Any], float], Awaitable[Any]]] = None
+    ):
+        """
+        Initialize a publish/subscribe hub for agent status updates
+
+        Each agent with at least one subscriber gets a single task that
+        computes its status once per interval and fans it out to every
+        subscriber. The task stops with the last subscriber, so agents
+        nobody watches cost nothing.
+
+        With wait_for_change, an agent's task sleeps until that coroutine
+        returns (it is given the agent, its last status and the interval
+        as timeout), so updates go out as soon as they are written.
+
+        :param fetch_status: Coroutine function computing one agent's status
+        :param interval: Seconds between status computations per agent
+        :param queue_size: Updates buffered per subscriber before the oldest is dropped
+        :param wait_for_change: Optional coroutine function waiting for the next change
+        """
+        self.fetch_status = fetch_status
+        self.interval = interval
+        self.queue_size = queue_size
+        self.wait_for_change = wait_for_change
+
+        self._subscribers: Dict[str, Set[StatusSubscription]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._latest: Dict[str, StatusUpdate] = {}
+        self.ticks = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def subscribe(self, agent_id: str) -> StatusSubscription:
+        """
+        Subscribe to an agent's status updates
+
+        A subscriber joining an active agent receives its latest status
+        immediately instead of waiting for the next tick.
+
+        :param agent_id: Agent to follow
+        :return: Subscription; close it (or use it as an async context manager) when done
+        """
+        subscription = StatusSubscription(self, agent_id, self.queue_size)
+        self._subscribers.setdefault(agent_id, set()).add(subscription)
+
+        if agent_id in self._latest:
+            subscription.put(self._latest[agent_id])
+        if agent_id not in self._tasks:
+            self._tasks[agent_id] = asyncio.create_task(self._run(agent_id))
+        return subscription
+
+    def unsubscribe(self, subscription: StatusSubscription) -> None:
+        subscribers = self._subscribers.get(subscription.agent_id)
+        if not subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.agent_id]
+            self._latest.pop(subscription.agent_id, None)
+            task = self._tasks.pop(subscription.agent_id, None)
+            if task is not None:
+                task.cancel()
+
+    def publish(self, agent_id: str, status: Dict[str, Any]) -> int:
+        """
+        Fan a status out to the agent's subscribers
+
+        The status gets the next version number of the agent and is diffed
+        once against the previous version for delta-encoding subscribers.
+
+        :param agent_id: Agent the status belongs to
+        :param status: Status to deliver
+        :return: Number of subscribers reached
+        """
+        subscribers = self._subscribers.get(agent_id)
+        if not subscribers:
+            return 0
+
+        previous = self._latest.get(agent_id)
+        previous_status = previous.status if previous is not None else {}
+        update = StatusUpdate(
+            agent_id=agent_id,
+            version=previous.version + 1 if previous is not None else 1,
+            status=status,
+            changed={
+                key: value for key, value in status.items()
+                if key not in previous_status or previous_status[key] != value
+            },
+            removed=[key for key in previous_status if key not in status]
+        )
+        self._latest[agent_id] = update
+        for subscription in subscribers:
+            subscription.put(update)
+        return len(subscribers)
+
+    def latest(self, agent_id: str) -> Optional[StatusUpdate]:
+        return self._latest.get(agent_id)
+
+    def subscriber_count(self, agent_id: Optional[str] = None) -> int:
+        if agent_id is not None:
+            return len(self._subscribers.get(agent_id, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(self._tasks),
+            "subscribers": self.subscriber_count(),
+            "ticks": self.ticks,
+            "queued": sum(
+                subscription.queue.qsize()
+                for subscribers in self._subscribers.values()
+                for subscription in subscribers
+            ),
+            "dropped": sum(
+                subscription.dropped
+                for subscribers in self._subscribers.values()
+                for subscription in subscribers
+            )
+        }
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._subscribers.clear()
+        self._latest.clear()
+
+    async def _run(self, agent_id: str) -> None:
+        while True:
+            status = None
+            try:
+                status = await self.fetch_status(agent_id)
+                self.ticks += 1
+                self.publish(agent_id, status)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error computing status of agent {agent_id}: {e}")
+
+            if self.wait_for_change is None or status is None:
+                await asyncio.sleep(self.interval)
+                continue
+            try:
+                await self.wait_for_change(agent_id, status, self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error waiting for changes of agent {agent_id}: {e}")
+                await asyncio.sleep(self.interval)
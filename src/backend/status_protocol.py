@@ -0,0 +1,108 @@
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # optional binary encoding
+    msgpack = None
+
+from .status_hub import StatusUpdate
+
+# Negotiated with ?protocol=...&encoding=... on the status WebSocket
+PROTOCOLS = ("full", "delta")
+ENCODINGS = ("json", "msgpack")
+
+Frame = Union[str, bytes]
+
+def encode_message(message: Dict[str, Any], encoding: str) -> Frame:
+    """
+    Serialize one frame: compact JSON text or MessagePack bytes
+
+    :param message: Frame content
+    :param encoding: "json" or "msgpack"
+    :return: Text for JSON, bytes for MessagePack
+    """
+    if encoding == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+def validate_encoding(encoding: str) -> str:
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown status encoding: {encoding}")
+    if encoding == "msgpack" and msgpack is None:
+        raise ValueError("The msgpack status encoding needs the msgpack package installed")
+    return encoding
+
+def update_frame(update: StatusUpdate, kind: str, encoding: str) -> Frame:
+    """
+    Encode a snapshot, delta or heartbeat frame of an update, at most once
+
+    Frames are cached on the update and shared by every connection that
+    sends the same kind in the same encoding.
+
+    :param update: Published status update
+    :param kind: "snapshot", "delta" or "heartbeat"
+    :param encoding: "json" or "msgpack"
+    :return: Encoded frame
+    """
+    key = (kind, encoding)
+    frame = update.frames.get(key)
+    if frame is None:
+        message: Dict[str, Any] = {"type": kind, "seq": update.version}
+        if kind == "snapshot":
+            message["data"] = update.status
+        elif kind == "delta":
+            message["changed"] = update.changed
+            if update.removed:
+                message["removed"] = update.removed
+        frame = update.frames[key] = encode_message(message, encoding)
+    return frame
+
+def is_resync_request(message: Dict[str, Any]) -> bool:
+    """
+    Whether a received WebSocket message is {"type": "resync"}
+
+    Accepts JSON text or, when msgpack is installed, MessagePack bytes.
+    """
+    try:
+        if message.get("text") is not None:
+            request = json.loads(message["text"])
+        elif message.get("bytes") is not None and msgpack is not None:
+            request = msgpack.unpackb(message["bytes"], raw=False)
+        else:
+            return False
+    except ValueError:
+        return False
+    return isinstance(request, dict) and request.get("type") == "resync"
+
+class DeltaSession:
+    """
+    Per-connection state of the delta protocol
+
+    The first frame is a full snapshot. Each following update is sent as
+    the fields that changed, or as a heartbeat when nothing did. If the
+    connection skipped versions (its queue dropped updates) or the client
+    asked to resync, the next frame is a snapshot again.
+    """
+    def __init__(self, encoding: str = "json"):
+        self.encoding = validate_encoding(encoding)
+        self.last_sequence: Optional[int] = None
+        self.snapshots = 0
+        self.deltas = 0
+        self.heartbeats = 0
+
+    def frame(self, update: StatusUpdate) -> Frame:
+        if self.last_sequence is None or update.version != self.last_sequence + 1:
+            kind = "snapshot"
+            self.snapshots += 1
+        elif update.unchanged:
+            kind = "heartbeat"
+            self.heartbeats += 1
+        else:
+            kind = "delta"
+            self.deltas += 1
+        self.last_sequence = update.version
+        return update_frame(update, kind, self.encoding)
+
+    def resync(self) -> None:
+        self.last_sequence = None
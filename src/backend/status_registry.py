@@ -0,0 +1,394 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+@dataclass(frozen=True)
+class StatusRecord:
+    """
+    Latest status of one agent
+
+    Versions come from one registry-wide counter, so they order all writes
+    and let readers ask for everything changed since a version.
+    """
+    agent_id: str
+    version: int
+    status: Dict[str, Any]
+    updated_at: float
+
+class ChangeNotifier:
+    """
+    Wakes asyncio waiters on any event loop when agents change
+
+    Producers may notify from any thread; waiters are woken through their
+    own loop with call_soon_threadsafe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def notify(self, agent_ids: Iterable[str]) -> None:
+        with self._lock:
+            waiters = [waiter for agent_id in agent_ids for waiter in self._waiters.get(agent_id, ())]
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # the waiter's loop is closed
+
+    def has_waiters(self) -> bool:
+        with self._lock:
+            return bool(self._waiters)
+
+    async def wait(self, agent_id: str, changed: Callable[[], bool], timeout: float) -> bool:
+        """
+        Wait until the agent changes or the timeout passes
+
+        :param agent_id: Agent to watch
+        :param changed: Checked after registering, so no change is missed
+        :param timeout: Maximum seconds to wait
+        :return: Whether a change was observed
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(agent_id, set()).add(waiter)
+        try:
+            if changed():
+                return True
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return changed()
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(agent_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[agent_id]
+
+class InMemoryStatusRegistry:
+    def __init__(self, clock: Callable[[], float] = time.time):
+        """
+        Initialize a status registry held by the current process
+
+        :param clock: Wall-clock time source, injectable for tests
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records: Dict[str, StatusRecord] = {}
+        self._version = 0
+        self.notifier = ChangeNotifier()
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def put(self, agent_id: str, status: Dict[str, Any]) -> StatusRecord:
+        """
+        Store an agent's status, bumping the version only if it changed
+
+        :param agent_id: Agent the status belongs to
+        :param status: JSON-serializable status
+        :return: Stored record
+        """
+        with self._lock:
+            record = self._records.get(agent_id)
+            if record is not None and record.status == status:
+                return record
+            self._version += 1
+            record = StatusRecord(agent_id, self._version, dict(status), self._clock())
+            self._records[agent_id] = record
+        self.notifier.notify([agent_id])
+        return record
+
+    def get(self, agent_id: str) -> Optional[StatusRecord]:
+        with self._lock:
+            return self._records.get(agent_id)
+
+    def get_many(self, agent_ids: Iterable[str]) -> Dict[str, StatusRecord]:
+        with self._lock:
+            records = self._records
+            return {agent_id: records[agent_id] for agent_id in agent_ids if agent_id in records}
+
+    def changed_since(self, version: int, limit: int = 100) -> List[StatusRecord]:
+        with self._lock:
+            records = [record for record in self._records.values() if record.version > version]
+        return sorted(records, key=lambda record: record.version)[:limit]
+
+    def list_records(self, after: Optional[str] = None, limit: int = 100) -> List[StatusRecord]:
+        with self._lock:
+            agent_ids = sorted(agent_id for agent_id in self._records if after is None or agent_id > after)
+            return [self._records[agent_id] for agent_id in agent_ids[:limit]]
+
+    async def wait_for_change(self, agent_id: str, after_version: int, timeout: float) -> bool:
+        """
+        Wait until the agent's status version exceeds after_version
+
+        :param agent_id: Agent to watch
+        :param after_version: Version the caller already has
+        :param timeout: Maximum seconds to wait
+        :return: Whether the agent changed
+        """
+        def changed() -> bool:
+            record = self.get(agent_id)
+            return record is not None and record.version > after_version
+
+        return await self.notifier.wait(agent_id, changed, timeout)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    def close(self) -> None:
+        pass
+
+class SQLiteStatusRegistry:
+    def __init__(
+        self,
+        path: str,
+        poll_interval: float = 0.05,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize a status registry shared by processes through SQLite
+
+        Every uvicorn worker opens the same WAL-mode database file.
+        Producers write each status once and all workers read it. Writes
+        from other processes are detected by polling PRAGMA data_version,
+        which is cheap and only changes when another connection commits.
+        The poller runs only while something waits for changes.
+
+        :param path: SQLite database file shared by the workers
+        :param poll_interval: Seconds between checks for writes of other processes
+        :param clock: Wall-clock time source, injectable for tests
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = self._connect()
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS statuses (
+                agent_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS statuses_version ON statuses (version);
+            """
+        )
+        self._connection.commit()
+
+        self.notifier = ChangeNotifier()
+        self._poller: Optional[threading.Thread] = None
+        # Set while a poller runs; only changed under _lock
+        self._polling = False
+        self._closed = threading.Event()
+
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM statuses"
+            ).fetchone()[0]
+
+    def put(self, agent_id: str, status: Dict[str, Any]) -> StatusRecord:
+        """
+        Store an agent's status, bumping the version only if it changed
+
+        :param agent_id: Agent the status belongs to
+        :param status: JSON-serializable status
+        :return: Stored record
+        """
+        encoded = json.dumps(status, sort_keys=True)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT version, status, updated_at FROM statuses WHERE agent_id = ?",
+                    (agent_id,)
+                ).fetchone()
+                if row is not None and row[1] == encoded:
+                    self._connection.rollback()
+                    return StatusRecord(agent_id, row[0], json.loads(row[1]), row[2])
+
+                (version,) = self._connection.execute(
+                    "SELECT COALESCE(MAX(version), 0) + 1 FROM statuses"
+                ).fetchone()
+                updated_at = self._clock()
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO statuses VALUES (?, ?, ?, ?)",
+                    (agent_id, version, encoded, updated_at)
+                )
+                self._connection.commit()
+            except BaseException:
+                self._connection.rollback()
+                raise
+        self.notifier.notify([agent_id])
+        return StatusRecord(agent_id, version, json.loads(encoded), updated_at)
+
+    def get(self, agent_id: str) -> Optional[StatusRecord]:
+        records = self.get_many([agent_id])
+        return records.get(agent_id)
+
+    def get_many(self, agent_ids: Iterable[str]) -> Dict[str, StatusRecord]:
+        agent_ids = list(agent_ids)
+        records: Dict[str, StatusRecord] = {}
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(agent_ids), 500):
+            chunk = agent_ids[start:start + 500]
+            records.update(
+                (record.agent_id, record) for record in self._query(
+                    f"SELECT * FROM statuses WHERE agent_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+            )
+        return records
+
+    def changed_since(self, version: int, limit: int = 100) -> List[StatusRecord]:
+        return self._query(
+            "SELECT * FROM statuses WHERE version > ? ORDER BY version LIMIT ?",
+            (version, limit)
+        )
+
+    def list_records(self, after: Optional[str] = None, limit: int = 100) -> List[StatusRecord]:
+        return self._query(
+            "SELECT * FROM statuses WHERE agent_id > ? ORDER BY agent_id LIMIT ?",
+            (after or "", limit)
+        )
+
+    async def wait_for_change(self, agent_id: str, after_version: int, timeout: float) -> bool:
+        """
+        Wait until the agent's status version exceeds after_version
+
+        Wakes on writes of this process immediately and on writes of other
+        processes within poll_interval.
+
+        :param agent_id: Agent to watch
+        :param after_version: Version the caller already has
+        :param timeout: Maximum seconds to wait
+        :return: Whether the agent changed
+        """
+        def changed() -> bool:
+            # Started once the waiter is registered, so a poller deciding
+            # to stop either sees this waiter or is replaced
+            self._start_poller()
+            record = self.get(agent_id)
+            return record is not None and record.version > after_version
+
+        return await self.notifier.wait(agent_id, changed, timeout)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM statuses").fetchone()[0]
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._poller is not None:
+            self._poller.join()
+        with self._lock:
+            self._connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _query(self, sql: str, params: Iterable[Any]) -> List[StatusRecord]:
+        with self._lock:
+            rows = self._connection.execute(sql, tuple(params)).fetchall()
+        return [
+            StatusRecord(agent_id, version, json.loads(status), updated_at)
+            for agent_id, version, status, updated_at in rows
+        ]
+
+    def _start_poller(self) -> None:
+        with self._lock:
+            if self._polling or self._closed.is_set():
+                return
+            self._polling = True
+            self._poller = threading.Thread(
+                target=self._poll, name="status-registry-poller", daemon=True
+            )
+            self._poller.start()
+
+    def _keep_polling(self) -> bool:
+        """
+        Decide under the lock _start_poller takes whether the poller goes on
+
+        :return: Whether anything still waits for changes
+        """
+        with self._lock:
+            self._polling = self.notifier.has_waiters()
+            return self._polling
+
+    def _poll(self) -> None:
+        """
+        Notify waiters about rows written by other processes
+
+        Stops once nobody waits; the next waiter starts it again.
+        """
+        try:
+            connection = self._connect()
+            try:
+                data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+                seen = connection.execute("SELECT COALESCE(MAX(version), 0) FROM statuses").fetchone()[0]
+                while not self._closed.wait(self.poll_interval) and self._keep_polling():
+                    current = connection.execute("PRAGMA data_version").fetchone()[0]
+                    if current == data_version:
+                        continue
+                    data_version = current
+                    rows = connection.execute(
+                        "SELECT agent_id, version FROM statuses WHERE version > ?", (seen,)
+                    ).fetchall()
+                    if rows:
+                        seen = max(version for _, version in rows)
+                        self.notifier.notify(agent_id for agent_id, _ in rows)
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Status registry poller stopped: {e}")
+            with self._lock:
+                self._polling = False
+
+StatusRegistry = Union[InMemoryStatusRegistry, SQLiteStatusRegistry]
+
+def create_status_registry(path: Optional[str] = None) -> StatusRegistry:
+    """
+    Registry shared through the SQLite file at path, or held in-process
+
+    :param path: Optional SQLite database file shared by all workers
+    :return: Status registry
+    """
+    if path:
+        return SQLiteStatusRegistry(path)
+    return InMemoryStatusRegistry()
+
+def format_timestamp(seconds: float) -> str:
+    """ISO 8601 UTC timestamp in the format structlog's TimeStamper writes"""
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def status_payload(record: StatusRecord) -> Dict[str, Any]:
+    """
+    Status as served to clients, with its agent, version and write time
+    """
+    return {
+        **record.status,
+        "agent_id": record.agent_id,
+        "version": record.version,
+        "last_updated": format_timestamp(record.updated_at)
+    }
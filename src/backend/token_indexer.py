@@ -0,0 +1,399 @@
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+# keccak256("Transfer(address,address,uint256)"), emitted by TokenQube on mint, transfer and burn
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+def _topic_address(topic: Any) -> str:
+    return Web3.to_checksum_address("0x" + bytes(topic)[-20:].hex())
+
+def _topic_int(topic: Any) -> int:
+    return int.from_bytes(bytes(topic), "big")
+
+def _hex(value: Any) -> str:
+    return "0x" + bytes(value).hex() if not isinstance(value, str) else value
+
+class TokenIndex:
+    def __init__(self, path: str = ":memory:"):
+        """
+        Initialize the local iQube token index backed by SQLite
+
+        Every Transfer log is kept so ownership can be recomputed after a
+        reorg; the tokens table holds the current state per token.
+
+        :param path: SQLite database file, in-memory by default
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS transfers (
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL,
+                transaction_hash TEXT NOT NULL,
+                token_id INTEGER NOT NULL,
+                from_address TEXT NOT NULL,
+                to_address TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                PRIMARY KEY (block_number, log_index)
+            );
+            CREATE INDEX IF NOT EXISTS transfers_token
+                ON transfers (token_id, block_number, log_index);
+            CREATE TABLE IF NOT EXISTS tokens (
+                token_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                minted_block INTEGER NOT NULL,
+                minted_at INTEGER NOT NULL,
+                updated_block INTEGER NOT NULL,
+                burned INTEGER NOT NULL DEFAULT 0,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tokens_owner ON tokens (owner);
+            CREATE INDEX IF NOT EXISTS tokens_minted_at ON tokens (minted_at);
+            CREATE TABLE IF NOT EXISTS blocks (
+                block_number INTEGER PRIMARY KEY,
+                block_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cursor (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                block_number INTEGER NOT NULL
+            );
+            """
+        )
+        self._connection.commit()
+
+        self.logger = logging.getLogger(__name__)
+
+    def get_cursor(self) -> Optional[int]:
+        """
+        Highest block already indexed
+
+        :return: Block number, or None before the first sync
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT block_number FROM cursor").fetchone()
+        return row[0] if row else None
+
+    def get_block_hash(self, block_number: int) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT block_hash FROM blocks WHERE block_number = ?", (block_number,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def apply(
+        self,
+        transfers: List[Tuple[int, int, str, int, str, str, int]],
+        to_block: int,
+        block_hash: str,
+        keep_hashes: int
+    ) -> List[int]:
+        """
+        Store a chunk of Transfer logs and advance the cursor atomically
+
+        :param transfers: (block, log index, tx hash, token id, from, to, timestamp) tuples in log order
+        :param to_block: Last block covered by the chunk
+        :param block_hash: Hash of to_block, used for reorg detection
+        :param keep_hashes: Number of recent block hashes retained
+        :return: Ids of newly minted tokens
+        """
+        minted = []
+        with self._lock:
+            connection = self._connection
+            connection.executemany(
+                "INSERT OR IGNORE INTO transfers VALUES (?, ?, ?, ?, ?, ?, ?)", transfers
+            )
+            for block_number, _, _, token_id, sender, receiver, timestamp in transfers:
+                if sender == ZERO_ADDRESS:
+                    minted.append(token_id)
+                    connection.execute(
+                        """
+                        INSERT OR REPLACE INTO tokens
+                            (token_id, owner, minted_block, minted_at, updated_block, burned, metadata)
+                        VALUES (?, ?, ?, ?, ?, 0, (SELECT metadata FROM tokens WHERE token_id = ?))
+                        """,
+                        (token_id, receiver, block_number, timestamp, block_number, token_id)
+                    )
+                else:
+                    connection.execute(
+                        "UPDATE tokens SET owner = ?, updated_block = ?, burned = ? WHERE token_id = ?",
+                        (receiver, block_number, int(receiver == ZERO_ADDRESS), token_id)
+                    )
+
+            connection.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?)", (to_block, block_hash))
+            connection.execute(
+                "DELETE FROM blocks WHERE block_number NOT IN "
+                "(SELECT block_number FROM blocks ORDER BY block_number DESC LIMIT ?)",
+                (keep_hashes,)
+            )
+            connection.execute("INSERT OR REPLACE INTO cursor VALUES (0, ?)", (to_block,))
+            connection.commit()
+        return minted
+
+    def rollback(self, block_number: int) -> None:
+        """
+        Forget everything indexed from block_number on and rebuild affected tokens
+
+        :param block_number: First block to discard
+        """
+        with self._lock:
+            connection = self._connection
+            affected = [
+                token_id for (token_id,) in connection.execute(
+                    "SELECT DISTINCT token_id FROM transfers WHERE block_number >= ?",
+                    (block_number,)
+                )
+            ]
+            connection.execute("DELETE FROM transfers WHERE block_number >= ?", (block_number,))
+            connection.execute("DELETE FROM blocks WHERE block_number >= ?", (block_number,))
+
+            for token_id in affected:
+                last = connection.execute(
+                    """
+                    SELECT block_number, to_address FROM transfers WHERE token_id = ?
+                    ORDER BY block_number DESC, log_index DESC LIMIT 1
+                    """,
+                    (token_id,)
+                ).fetchone()
+                if last is None:
+                    connection.execute("DELETE FROM tokens WHERE token_id = ?", (token_id,))
+                else:
+                    connection.execute(
+                        "UPDATE tokens SET owner = ?, updated_block = ?, burned = ? WHERE token_id = ?",
+                        (last[1], last[0], int(last[1] == ZERO_ADDRESS), token_id)
+                    )
+
+            connection.execute("INSERT OR REPLACE INTO cursor VALUES (0, ?)", (block_number - 1,))
+            connection.commit()
+
+    def set_metadata(self, token_id: int, metadata: Optional[str]) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE tokens SET metadata = ? WHERE token_id = ?", (metadata, token_id)
+            )
+            self._connection.commit()
+
+    def get_token(self, token_id: int) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM tokens WHERE token_id = ?", (token_id,))
+        return rows[0] if rows else None
+
+    def tokens_by_owner(self, owner: str) -> List[Dict[str, Any]]:
+        """
+        Tokens currently held by an address
+
+        :param owner: Owner address
+        :return: Token records ordered by token id
+        """
+        return self._query(
+            "SELECT * FROM tokens WHERE owner = ? AND burned = 0 ORDER BY token_id",
+            (Web3.to_checksum_address(owner),)
+        )
+
+    def tokens_minted_between(
+        self,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Tokens minted inside a time range
+
+        :param start_timestamp: Optional inclusive lower unix timestamp
+        :param end_timestamp: Optional exclusive upper unix timestamp
+        :return: Token records ordered by mint time
+        """
+        query = "SELECT * FROM tokens WHERE 1 = 1"
+        params: List[Any] = []
+        if start_timestamp is not None:
+            query += " AND minted_at >= ?"
+            params.append(start_timestamp)
+        if end_timestamp is not None:
+            query += " AND minted_at < ?"
+            params.append(end_timestamp)
+        return self._query(query + " ORDER BY minted_at, token_id", params)
+
+    def search_metadata(self, text: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Tokens whose metadata contains text
+
+        :param text: Substring to look for
+        :param limit: Maximum number of results
+        :return: Token records ordered by token id
+        """
+        return self._query(
+            "SELECT * FROM tokens WHERE metadata LIKE ? ORDER BY token_id LIMIT ?",
+            (f"%{text}%", limit)
+        )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, query: str, params) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._connection.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [
+            {**dict(zip(columns, row)), "burned": bool(row[columns.index("burned")])}
+            for row in rows
+        ]
+
+class TokenEventIndexer:
+    def __init__(
+        self,
+        web3: Web3,
+        contract_address: str,
+        index: Optional[TokenIndex] = None,
+        start_block: int = 0,
+        initial_chunk_size: int = 2000,
+        min_chunk_size: int = 1,
+        max_chunk_size: int = 10000,
+        confirmations: int = 12,
+        metadata_fetcher: Optional[Callable[[int], Optional[str]]] = None
+    ):
+        """
+        Initialize an indexer of TokenQube Transfer events
+
+        Logs are read in block-range chunks that halve when the provider
+        rejects a range and grow back after successful reads, staying below
+        the smallest range rejected so far. The hash of
+        the last indexed block is checked before every sync; on mismatch
+        the last `confirmations` blocks are rolled back and re-indexed.
+
+        :param web3: Connected Web3 instance
+        :param contract_address: TokenQube contract address
+        :param index: Local token index (in-memory by default)
+        :param start_block: First block to index, e.g. the contract deployment block
+        :param initial_chunk_size: Blocks requested per eth_getLogs call at first
+        :param min_chunk_size: Smallest chunk before a range error is raised
+        :param max_chunk_size: Largest chunk the size may grow to
+        :param confirmations: Blocks rolled back when a reorg is detected
+        :param metadata_fetcher: Optional callable returning the metadata of a newly minted token
+        """
+        self.web3 = web3
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        self.index = index or TokenIndex()
+        self.start_block = start_block
+        self.chunk_size = initial_chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.confirmations = confirmations
+        self.metadata_fetcher = metadata_fetcher
+        # Smallest range the provider rejected; chunks never grow back to it
+        self._rejected_size: Optional[int] = None
+
+        self.logger = logging.getLogger(__name__)
+
+    def sync(self, to_block: Optional[int] = None) -> int:
+        """
+        Index every Transfer log up to to_block (the chain head by default)
+
+        :param to_block: Optional last block to index
+        :return: Number of Transfer logs stored
+        """
+        self._check_reorg()
+
+        head = self.web3.eth.block_number if to_block is None else to_block
+        cursor = self.index.get_cursor()
+        from_block = self.start_block if cursor is None else cursor + 1
+        stored = 0
+
+        while from_block <= head:
+            chunk_end = min(head, from_block + self.chunk_size - 1)
+            try:
+                logs = self.web3.eth.get_logs({
+                    "address": self.contract_address,
+                    "fromBlock": from_block,
+                    "toBlock": chunk_end,
+                    "topics": [TRANSFER_TOPIC]
+                })
+            except Exception as e:
+                if self.chunk_size <= self.min_chunk_size:
+                    raise
+                self._rejected_size = min(self._rejected_size or self.chunk_size, self.chunk_size)
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+                self.logger.info(f"Log range rejected ({e}), retrying with {self.chunk_size} blocks")
+                continue
+
+            stored += self._store_chunk(logs, chunk_end)
+            from_block = chunk_end + 1
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size * 2)
+            if self._rejected_size is not None:
+                self.chunk_size = min(self.chunk_size, max(self.min_chunk_size, self._rejected_size - 1))
+
+        return stored
+
+    def follow(self, stop: threading.Event, poll_interval: float = 5.0) -> None:
+        """
+        Keep the index at the chain head until stop is set
+
+        :param stop: Event ending the loop
+        :param poll_interval: Seconds between syncs
+        """
+        while not stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                self.logger.error(f"Error indexing TokenQube events: {e}")
+            stop.wait(poll_interval)
+
+    def _store_chunk(self, logs: List[Dict], chunk_end: int) -> int:
+        timestamps: Dict[int, int] = {}
+        transfers = []
+        for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+            topics = log["topics"]
+            if len(topics) != 4:
+                continue
+            block_number = log["blockNumber"]
+            if block_number not in timestamps:
+                timestamps[block_number] = self.web3.eth.get_block(block_number)["timestamp"]
+            transfers.append((
+                block_number,
+                log["logIndex"],
+                _hex(log["transactionHash"]),
+                _topic_int(topics[3]),
+                _topic_address(topics[1]),
+                _topic_address(topics[2]),
+                timestamps[block_number]
+            ))
+
+        block_hash = _hex(self.web3.eth.get_block(chunk_end)["hash"])
+        minted = self.index.apply(transfers, chunk_end, block_hash, self.confirmations + 1)
+
+        if self.metadata_fetcher is not None:
+            for token_id in minted:
+                try:
+                    self.index.set_metadata(token_id, self.metadata_fetcher(token_id))
+                except Exception as e:
+                    self.logger.error(f"Error fetching metadata of token {token_id}: {e}")
+
+        return len(transfers)
+
+    def _check_reorg(self) -> None:
+        """
+        Roll back the last confirmations blocks if the indexed head was replaced
+        """
+        cursor = self.index.get_cursor()
+        if cursor is None:
+            return
+
+        stored_hash = self.index.get_block_hash(cursor)
+        if stored_hash is None:
+            return
+
+        current_hash = _hex(self.web3.eth.get_block(cursor)["hash"])
+        if current_hash != stored_hash:
+            rollback_to = max(self.start_block, cursor - self.confirmations + 1)
+            self.logger.warning(f"Reorg detected at block {cursor}, re-indexing from {rollback_to}")
+            self.index.rollback(rollback_to)
@@ -0,0 +1,264 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .wallet_analytics import _as_int
+
+def _field(transaction: Dict, *names: str, default: Any = None) -> Any:
+    for name in names:
+        if transaction.get(name) is not None:
+            return transaction[name]
+    return default
+
+def exact_value(value: Any) -> str:
+    """
+    Decimal text of a transfer amount, exact for integer (wei) amounts
+
+    :param value: Amount as an int, decimal or 0x-hex string, or float
+    :return: Integer amounts as decimal digits, anything else as float text
+    """
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.lower().startswith("0x"):
+            return str(int(text, 16))
+        if text.lstrip("-").isdigit():
+            return str(int(text))
+    return repr(float(value or 0))
+
+def transaction_key(transaction: Dict) -> Optional[str]:
+    """
+    Identity of a transaction within one wallet/token pair
+
+    :param transaction: Raw transaction from the Metis API
+    :return: Its hash, else "block:transactionIndex:logIndex", or None
+        when the transaction cannot be identified
+    """
+    tx_hash = _field(transaction, "hash", "transactionHash", "txHash")
+    if tx_hash:
+        return str(tx_hash)
+    position = [
+        _field(transaction, "blockNumber", "block_number"),
+        _field(transaction, "transactionIndex", "transaction_index"),
+        _field(transaction, "logIndex", "log_index")
+    ]
+    if any(value is None for value in position):
+        return None
+    return ":".join(str(_as_int(value)) for value in position)
+
+class TransactionStore:
+    def __init__(self, path: str = ":memory:"):
+        """
+        Initialize an append-only local transaction store backed by SQLite
+
+        Transactions are deduplicated by (wallet, token, hash), falling back
+        to the transaction's block, index and log index when it has no hash.
+        A cursor per (wallet, token) records the highest block already ingested.
+        Values are kept as exact decimal text, since wei amounts overflow
+        the 53-bit precision of a REAL.
+
+        :param path: SQLite database file, in-memory by default
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                wallet TEXT NOT NULL,
+                token TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                block_number INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                from_address TEXT,
+                to_address TEXT,
+                raw TEXT NOT NULL,
+                PRIMARY KEY (wallet, token, hash)
+            );
+            CREATE INDEX IF NOT EXISTS transactions_wallet_token_block
+                ON transactions (wallet, token, block_number);
+            CREATE INDEX IF NOT EXISTS transactions_wallet_timestamp
+                ON transactions (wallet, timestamp);
+            CREATE TABLE IF NOT EXISTS cursors (
+                wallet TEXT NOT NULL,
+                token TEXT NOT NULL,
+                block_number INTEGER NOT NULL,
+                PRIMARY KEY (wallet, token)
+            );
+            """
+        )
+        self._connection.commit()
+
+        self.logger = logging.getLogger(__name__)
+
+    def add_transactions(
+        self,
+        wallet: str,
+        token: str,
+        transactions: Iterable[Dict]
+    ) -> int:
+        """
+        Append transactions, ignoring ones already stored
+
+        Transactions that cannot be identified (see transaction_key) are
+        skipped rather than collapsed into one row.
+
+        :param wallet: Wallet address the transactions belong to
+        :param token: Token contract address
+        :param transactions: Raw transactions from the Metis API
+        :return: Number of newly stored transactions
+        """
+        rows = []
+        skipped = 0
+        for transaction in transactions:
+            key = transaction_key(transaction)
+            if key is None:
+                skipped += 1
+                continue
+            rows.append((
+                wallet.lower(),
+                token.lower(),
+                key,
+                _as_int(_field(transaction, "blockNumber", "block_number", default=0)),
+                _as_int(_field(transaction, "timeStamp", "timestamp", default=0)),
+                exact_value(_field(transaction, "value", default=0)),
+                _field(transaction, "from"),
+                _field(transaction, "to"),
+                json.dumps(transaction)
+            ))
+        if skipped:
+            self.logger.warning(f"Skipped {skipped} transactions without a hash or log position")
+
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._connection.commit()
+            return self._connection.total_changes - before
+
+    def get_cursor(self, wallet: str, token: str) -> Optional[int]:
+        """
+        Highest block already ingested for a wallet/token pair
+
+        :return: Block number, or None if the pair was never synced
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT block_number FROM cursors WHERE wallet = ? AND token = ?",
+                (wallet.lower(), token.lower())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, wallet: str, token: str, block_number: int) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cursors VALUES (?, ?, ?)",
+                (wallet.lower(), token.lower(), block_number)
+            )
+            self._connection.commit()
+
+    def get_transactions(
+        self,
+        wallet: str,
+        tokens: Optional[List[str]] = None,
+        since_block: Optional[int] = None,
+        since_timestamp: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Read stored transactions in block order
+
+        :param wallet: Wallet address
+        :param tokens: Optional token contract addresses to restrict to
+        :param since_block: Optional inclusive lower block bound
+        :param since_timestamp: Optional inclusive lower timestamp bound
+        :return: Raw transactions as originally ingested
+        """
+        query = "SELECT raw FROM transactions WHERE wallet = ?"
+        params: List[Any] = [wallet.lower()]
+
+        if tokens is not None:
+            if not tokens:
+                return []
+            query += f" AND token IN ({', '.join('?' for _ in tokens)})"
+            params.extend(token.lower() for token in tokens)
+        if since_block is not None:
+            query += " AND block_number >= ?"
+            params.append(since_block)
+        if since_timestamp is not None:
+            query += " AND timestamp >= ?"
+            params.append(since_timestamp)
+
+        query += " ORDER BY block_number, hash"
+
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [json.loads(raw) for (raw,) in rows]
+
+    def get_rows(
+        self,
+        wallet: str,
+        tokens: Optional[List[str]] = None
+    ) -> List[Tuple[str, int, str, Optional[str], Optional[str]]]:
+        """
+        Read the analytics columns of stored transactions without decoding JSON
+
+        :param wallet: Wallet address
+        :param tokens: Optional token contract addresses to restrict to
+        :return: (token, timestamp, value, from, to) tuples
+        """
+        return self.get_rows_after(wallet, tokens)[0]
+
+    def get_rows_after(
+        self,
+        wallet: str,
+        tokens: Optional[List[str]] = None,
+        after_rowid: int = 0
+    ) -> Tuple[List[Tuple[str, int, str, Optional[str], Optional[str]]], int]:
+        """
+        Read the analytics columns of transactions stored after a given row
+
+        Rows are append-only, so passing back the returned row id reads
+        exactly the transactions stored since the previous call.
+
+        :param wallet: Wallet address
+        :param tokens: Optional token contract addresses to restrict to
+        :param after_rowid: Row id of the last transaction already read
+        :return: ((token, timestamp, value, from, to) tuples, last row id read)
+        """
+        query = (
+            "SELECT rowid, token, timestamp, value, from_address, to_address "
+            "FROM transactions WHERE wallet = ? AND rowid > ?"
+        )
+        params: List[Any] = [wallet.lower(), after_rowid]
+        if tokens is not None:
+            if not tokens:
+                return [], after_rowid
+            query += f" AND token IN ({', '.join('?' for _ in tokens)})"
+            params.extend(token.lower() for token in tokens)
+        query += " ORDER BY rowid"
+
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        last_rowid = rows[-1][0] if rows else after_rowid
+        return [row[1:] for row in rows], last_rowid
+
+    def count(self, wallet: str) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM transactions WHERE wallet = ?", (wallet.lower(),)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def block_number(transaction: Dict) -> int:
+        return _as_int(_field(transaction, "blockNumber", "block_number", default=0))
@@ -0,0 +1,250 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Default rolling activity windows, in seconds
+DEFAULT_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 604800}
+
+def _as_int(value: Any) -> int:
+    if isinstance(value, str):
+        return int(value, 16) if value.startswith("0x") else int(float(value))
+    return int(value or 0)
+
+def _as_float(value: Any) -> float:
+    # Integer text converts straight to the nearest float, hex via an exact int
+    if isinstance(value, str) and value.startswith("0x"):
+        return float(int(value, 16))
+    return float(value or 0)
+
+class TransactionColumns:
+    """
+    Compact columnar batch of transactions (one NumPy array per field)
+
+    direction is +1 for transfers into the wallet, -1 for transfers out of
+    it and 0 when neither side matches. token_id indexes into tokens.
+    """
+    __slots__ = ("value", "timestamp", "token_id", "direction", "tokens")
+
+    def __init__(
+        self,
+        value: np.ndarray,
+        timestamp: np.ndarray,
+        token_id: np.ndarray,
+        direction: np.ndarray,
+        tokens: List[str]
+    ):
+        self.value = value
+        self.timestamp = timestamp
+        self.token_id = token_id
+        self.direction = direction
+        self.tokens = tokens
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    @classmethod
+    def from_transactions(
+        cls,
+        token: str,
+        transactions: Sequence[Dict],
+        wallet_address: str
+    ) -> "TransactionColumns":
+        """
+        Convert raw Metis API transactions of one token to columns
+
+        :param token: Token contract address the transactions belong to
+        :param transactions: Raw transaction dictionaries
+        :param wallet_address: Wallet whose point of view sets direction
+        :return: Columnar batch
+        """
+        return cls.from_rows(
+            (
+                (
+                    token,
+                    transaction.get("timeStamp", transaction.get("timestamp")),
+                    transaction.get("value"),
+                    transaction.get("from"),
+                    transaction.get("to")
+                )
+                for transaction in transactions
+            ),
+            wallet_address,
+            count=len(transactions)
+        )
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Tuple[str, Any, Any, Optional[str], Optional[str]]],
+        wallet_address: str,
+        count: int = -1
+    ) -> "TransactionColumns":
+        """
+        Build columns from (token, timestamp, value, from, to) tuples
+
+        :param rows: Row tuples, e.g. straight from the transaction store
+        :param wallet_address: Wallet whose point of view sets direction
+        :param count: Number of rows if known, to preallocate the arrays
+        :return: Columnar batch
+        """
+        wallet = wallet_address.lower()
+        token_index: Dict[str, int] = {}
+        values, timestamps, token_ids, directions = [], [], [], []
+
+        for token, timestamp, value, sender, receiver in rows:
+            token = token.lower()
+            token_ids.append(token_index.setdefault(token, len(token_index)))
+            timestamps.append(_as_int(timestamp))
+            values.append(_as_float(value))
+            if receiver and receiver.lower() == wallet:
+                directions.append(1)
+            elif sender and sender.lower() == wallet:
+                directions.append(-1)
+            else:
+                directions.append(0)
+
+        return cls(
+            value=np.fromiter(values, dtype=np.float64, count=count),
+            timestamp=np.fromiter(timestamps, dtype=np.int64, count=count),
+            token_id=np.fromiter(token_ids, dtype=np.int32, count=count),
+            direction=np.fromiter(directions, dtype=np.int8, count=count),
+            tokens=list(token_index)
+        )
+
+class WalletMetricsEngine:
+    def __init__(self, windows: Optional[Dict[str, int]] = None):
+        """
+        Initialize a streaming, vectorized wallet metrics engine
+
+        Totals and per-token breakdowns are updated incrementally per batch;
+        time-windowed activity uses a sorted timestamp index with prefix sums
+        that is rebuilt lazily after new batches arrive.
+
+        :param windows: Rolling windows as {label: seconds}
+        """
+        self.windows = windows or DEFAULT_WINDOWS
+        self.tokens: List[str] = []
+        self._token_ids: Dict[str, int] = {}
+
+        self.transaction_count = 0
+        self.total_volume = 0.0
+        self.inflow_volume = 0.0
+        self.outflow_volume = 0.0
+        self._token_counts = np.zeros(0, dtype=np.int64)
+        self._token_volumes = np.zeros(0, dtype=np.float64)
+
+        self._timestamp_chunks: List[np.ndarray] = []
+        self._value_chunks: List[np.ndarray] = []
+        self._sorted_timestamps = np.zeros(0, dtype=np.int64)
+        self._volume_prefix = np.zeros(1, dtype=np.float64)
+
+    def add(self, columns: TransactionColumns) -> None:
+        """
+        Fold a batch of transactions into the running metrics
+
+        :param columns: Columnar batch of new transactions
+        """
+        if not len(columns):
+            return
+
+        # Map batch-local token ids onto engine-wide ids
+        remap = np.array([self._token_id(token) for token in columns.tokens], dtype=np.int32)
+        token_ids = remap[columns.token_id]
+        size = len(self.tokens)
+
+        self._token_counts = np.pad(self._token_counts, (0, size - len(self._token_counts)))
+        self._token_volumes = np.pad(self._token_volumes, (0, size - len(self._token_volumes)))
+        self._token_counts += np.bincount(token_ids, minlength=size)
+        self._token_volumes += np.bincount(token_ids, weights=columns.value, minlength=size)
+
+        self.transaction_count += len(columns)
+        self.total_volume += float(columns.value.sum())
+        self.inflow_volume += float(columns.value[columns.direction > 0].sum())
+        self.outflow_volume += float(columns.value[columns.direction < 0].sum())
+
+        self._timestamp_chunks.append(columns.timestamp)
+        self._value_chunks.append(columns.value)
+
+    def add_transactions(
+        self,
+        token: str,
+        transactions: Sequence[Dict],
+        wallet_address: str
+    ) -> None:
+        self.add(TransactionColumns.from_transactions(token, transactions, wallet_address))
+
+    @property
+    def activity_score(self) -> float:
+        # Same scoring rule as before, without summing the volume twice
+        return min((self.transaction_count * self.total_volume) / 10000, 100)
+
+    def window_activity(self, now: int) -> Dict[str, Dict[str, float]]:
+        """
+        Count and volume of transactions inside each rolling window
+
+        :param now: Reference unix timestamp
+        :return: {label: {"count", "volume"}} per configured window
+        """
+        self._merge_pending()
+        timestamps = self._sorted_timestamps
+        end = int(np.searchsorted(timestamps, now, side="right"))
+
+        activity = {}
+        for label, seconds in self.windows.items():
+            start = int(np.searchsorted(timestamps, now - seconds, side="left"))
+            activity[label] = {
+                "count": end - start,
+                "volume": float(self._volume_prefix[end] - self._volume_prefix[start])
+            }
+        return activity
+
+    def metrics(self, now: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Snapshot of every metric computed so far
+
+        :param now: Reference unix timestamp for windows (current time by default)
+        :return: Dictionary of volume, counts, score, windows and per-token breakdown
+        """
+        if now is None:
+            now = int(time.time())
+
+        return {
+            "total_transaction_volume": self.total_volume,
+            "activity_score": self.activity_score,
+            "transaction_count": self.transaction_count,
+            "inflow_volume": self.inflow_volume,
+            "outflow_volume": self.outflow_volume,
+            "activity_windows": self.window_activity(now),
+            "token_activity": {
+                token: {
+                    "count": int(self._token_counts[token_id]),
+                    "volume": float(self._token_volumes[token_id])
+                }
+                for token, token_id in self._token_ids.items()
+            }
+        }
+
+    def _token_id(self, token: str) -> int:
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            token_id = self._token_ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def _merge_pending(self) -> None:
+        """
+        Merge pending batches into the sorted timestamp and volume prefix index
+        """
+        if not self._timestamp_chunks:
+            return
+
+        prefix_values = np.diff(self._volume_prefix)
+        timestamps = np.concatenate([self._sorted_timestamps, *self._timestamp_chunks])
+        values = np.concatenate([prefix_values, *self._value_chunks])
+        self._timestamp_chunks.clear()
+        self._value_chunks.clear()
+
+        order = np.argsort(timestamps, kind="stable")
+        self._sorted_timestamps = timestamps[order]
+        self._volume_prefix = np.concatenate([[0.0], np.cumsum(values[order])])
@@ -0,0 +1,20 @@
+import pytest
+
+from tests.backend.stubs import StubServer
+
+@pytest.fixture
+def stub_server():
+    """
+    Factory fixture starting StubServer instances that stop after the test
+    """
+    servers = []
+
+    def start(handler):
+        server = StubServer(handler)
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.close()
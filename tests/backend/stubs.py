@@ -0,0 +1,4 @@
+"""
+Stub services for the backend tests, shared with the benchmark suite
+"""
+from benchmarks.stub_server import StubServer, chat_completion, chat_completion_stream
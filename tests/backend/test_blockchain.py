@@ -0,0 +1,236 @@
+import base64
+import json
+import time
+import zlib
+
+import pytest
+import rlp
+from eth_abi import encode
+from web3 import Web3
+
+from src.backend.blockchain import BlockchainInteraction
+from src.backend.metadata_codec import FileMetadataStore, MetadataCodec
+from src.backend.rpc_pool import PooledHTTPProvider, RPCPool
+
+PRIVATE_KEY = '0x' + '11' * 32
+CONTRACT = '0x00000000000000000000000000000000000000AA'
+TOKEN_QUBE_ABI = [{
+    'type': 'function',
+    'name': 'createToken',
+    'stateMutability': 'nonpayable',
+    'inputs': [{'name': 'owner', 'type': 'address'}, {'name': 'metadata', 'type': 'string'}],
+    'outputs': [{'name': '', 'type': 'uint256'}]
+}, {
+    'type': 'function',
+    'name': 'getTokenDetails',
+    'stateMutability': 'view',
+    'inputs': [{'name': 'tokenId', 'type': 'uint256'}],
+    'outputs': [
+        {'name': 'owner', 'type': 'address'},
+        {'name': 'metadata', 'type': 'string'},
+        {'name': 'createdAt', 'type': 'uint256'}
+    ]
+}]
+
+@pytest.fixture
+def blockchain(stub_server, tmp_path, monkeypatch):
+    """
+    BlockchainInteraction connected to a stub node that records sent nonces
+    """
+    node = {'sent': [], 'calls': [], 'reject_nonce': None, 'stall_nonce': None, 'metadata': ''}
+
+    def handler(method, path, body):
+        node['calls'].append(body['method'])
+        result = {
+            'web3_clientVersion': 'stub/1.0',
+            'eth_chainId': '0x440',
+            'eth_gasPrice': hex(10 ** 9),
+            'eth_blockNumber': '0x64',
+            'eth_getBlockByNumber': {'number': '0x64', 'hash': '0x' + '64' * 32, 'extraData': '0x'},
+            'eth_getTransactionCount': hex(7 + len(node['sent']))
+        }.get(body['method'])
+
+        if body['method'] == 'eth_sendRawTransaction':
+            nonce = int.from_bytes(rlp.decode(bytes.fromhex(body['params'][0][2:]))[0], 'big')
+            if nonce == node['reject_nonce']:
+                node['reject_nonce'] = None
+                return 200, {'jsonrpc': '2.0', 'id': body['id'],
+                             'error': {'code': -32000, 'message': 'insufficient funds'}}
+            node['sent'].append(nonce)
+            if nonce == node['stall_nonce']:
+                # Accepted, but the reply arrives after the client gave up
+                time.sleep(0.5)
+            result = '0x' + hex(nonce)[2:].rjust(64, '0')
+        elif body['method'] == 'eth_call':
+            result = '0x' + encode(
+                ['address', 'string', 'uint256'], [CONTRACT, node['metadata'], 1700000000]
+            ).hex()
+        elif body['method'] == 'eth_getTransactionReceipt':
+            result = {
+                'transactionHash': body['params'][0], 'transactionIndex': '0x0',
+                'blockHash': '0x' + '22' * 32, 'blockNumber': '0x65', 'from': CONTRACT, 'to': CONTRACT,
+                'cumulativeGasUsed': '0x1', 'gasUsed': '0x1', 'effectiveGasPrice': '0x1',
+                'contractAddress': None, 'logs': [], 'logsBloom': '0x' + '00' * 256,
+                'status': '0x1', 'type': '0x0'
+            }
+        return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': result}
+
+    server = stub_server(handler)
+    abi_path = tmp_path / 'TokenQube.json'
+    abi_path.write_text(json.dumps(TOKEN_QUBE_ABI))
+    monkeypatch.setenv('CONTRACT_ABI_PATH', str(abi_path))
+    monkeypatch.setenv('TOKEN_QUBE_CONTRACT_ADDRESS', CONTRACT)
+    monkeypatch.setenv('OWNER_PRIVATE_KEY', PRIVATE_KEY)
+
+    return BlockchainInteraction(network_url=server.url), node
+
+def test_create_iqube_tokens_pipelines_nonces_and_recovers_gaps(blockchain):
+    """
+    Test batch minting syncs the nonce once, reads gas price once per block
+    and resyncs the nonce of a transaction the node rejected
+    """
+    interaction, node = blockchain
+    node['reject_nonce'] = 9
+    owners = [f'0x{index:040x}' for index in range(1, 21)]
+
+    results = interaction.create_iqube_tokens([(owner, {'index': i}) for i, owner in enumerate(owners)])
+
+    assert [result['status'] for result in results].count('error') == 1
+    assert results[2]['error'] and 'insufficient funds' in results[2]['error']
+    assert all(result['status'] == 'confirmed' for result in results if result['transaction_hash'])
+    assert node['sent'] == list(range(7, 26))
+    assert node['calls'].count('eth_getTransactionCount') == 2
+    assert node['calls'].count('eth_gasPrice') == 1
+    assert node['calls'].count('eth_chainId') == 1
+
+    signer = interaction.w3.eth.account.from_key(PRIVATE_KEY).address
+    assert interaction.create_iqube_token(signer, {'single': True}) == '0x' + hex(26)[2:].rjust(64, '0')
+
+def test_send_timing_out_after_acceptance_does_not_reuse_its_nonce(blockchain):
+    """
+    Test a send that times out after the node accepted it resyncs the nonce
+    instead of handing the taken nonce to the next transaction
+    """
+    interaction, node = blockchain
+    interaction.rpc_pool.request_timeout = 0.2
+    node['stall_nonce'] = 8
+    owners = [f'0x{index:040x}' for index in range(1, 5)]
+
+    results = interaction.create_iqube_tokens(
+        [(owner, {'index': i}) for i, owner in enumerate(owners)], wait_for_receipts=False
+    )
+
+    assert [result['status'] for result in results] == ['sent', 'error', 'sent', 'sent']
+    assert node['sent'] == [7, 8, 9, 10]
+
+def test_token_details_cache_decoded_metadata(blockchain, monkeypatch):
+    """
+    Test repeated token detail reads within a block neither call the node
+    nor decode the metadata again
+    """
+    interaction, node = blockchain
+    metadata = {'name': 'qube', 'tags': ['finance'] * 40}
+    node['metadata'] = interaction.metadata_codec.encode(metadata)
+    decoded = []
+    decode = interaction.metadata_codec.decode
+    monkeypatch.setattr(
+        interaction.metadata_codec, 'decode', lambda text: decoded.append(text) or decode(text)
+    )
+
+    first = interaction.get_iqube_token_details(1)
+    first['owner'] = None
+    second = interaction.get_iqube_token_details(1)
+
+    assert second['metadata'] == metadata
+    assert second['owner'] == CONTRACT
+    assert second['creation_timestamp'] == 1700000000
+    assert node['calls'].count('eth_call') == 1
+    assert len(decoded) == 1
+
+def test_metadata_codec_is_canonical_and_compact(tmp_path):
+    """
+    Test encoding is deterministic, compresses large payloads, moves
+    oversized ones off chain and still reads legacy str(metadata) values
+    """
+    metadata = {'name': 'qube', 'tags': ['finance'] * 40, 'score': 0.5}
+    codec = MetadataCodec()
+
+    encoded = codec.encode(metadata)
+    assert encoded == codec.encode(dict(reversed(list(metadata.items()))))
+    assert encoded.startswith('iq1:json+z:')
+    assert len(encoded) < len(str(metadata)) / 2
+    assert codec.encode({'a': 1}) == 'iq1:json:{"a":1}'
+    assert codec.decode(encoded) == metadata
+    assert codec.decode(str(metadata)) == metadata
+
+    offchain = MetadataCodec(store=FileMetadataStore(str(tmp_path)), offchain_threshold=32)
+    reference = offchain.encode(metadata)
+    assert reference.startswith('iq1:ref:')
+    assert offchain.decode(reference) == metadata
+    assert offchain.decode(offchain.encode(['a', 1] * 40)) == ['a', 1] * 40
+    assert codec.decode('iq1:json:7') == 7
+
+def test_metadata_codec_rejects_hostile_input(tmp_path):
+    """
+    Test off-chain references must be digests, overly nested or expanding
+    payloads are refused and malformed legacy values are returned as text
+    """
+    (tmp_path / 'store').mkdir()
+    (tmp_path / 'secret').write_text('iq1:json:{}')
+    codec = MetadataCodec(store=FileMetadataStore(str(tmp_path / 'store')))
+
+    for reference in ('iq1:ref:../secret', 'iq1:ref:' + 'A' * 64, 'iq1:ref:' + 'a' * 63):
+        with pytest.raises(ValueError):
+            codec.decode(reference)
+
+    deep = '[' * 100000 + ']' * 100000
+    with pytest.raises(ValueError):
+        codec.decode('iq1:json:' + deep)
+    assert codec.decode(deep) == deep
+    assert codec.decode('{[1]: 2}') == '{[1]: 2}'
+
+    # Brackets inside strings are text, not nesting
+    chatty = {'description': ':-( ' * 100 + '[' * 100, 'quote': 'say \\"(("'}
+    assert codec.decode(codec.encode(chatty)) == chatty
+    assert codec.decode(str(chatty)) == chatty
+
+    bomb = base64.b64encode(zlib.compress(b'[' + b'0,' * (1 << 20) + b'0]')).decode()
+    with pytest.raises(ValueError):
+        codec.decode('iq1:json+z:' + bomb)
+    truncated = base64.b64encode(zlib.compress(b'[1]')[:-2]).decode()
+    with pytest.raises(ValueError):
+        codec.decode('iq1:json+z:' + truncated)
+
+def rpc_node(delay=0.0, status=200):
+    """
+    Stub JSON-RPC node answering eth_blockNumber with injected delay or failure
+    """
+    def handler(method, path, body):
+        time.sleep(delay)
+        return status, {'jsonrpc': '2.0', 'id': body['id'], 'result': '0x10'}
+    return handler
+
+def test_rpc_pool_fails_over_ejects_and_hedges(stub_server):
+    """
+    Test failed nodes are retried elsewhere and ejected, and slow reads are
+    hedged to another node
+    """
+    broken, healthy = stub_server(rpc_node(status=500)), stub_server(rpc_node())
+    pool = RPCPool([broken.url, healthy.url], failure_threshold=2)
+    w3 = Web3(PooledHTTPProvider(pool))
+
+    assert [w3.eth.block_number for _ in range(6)] == [16] * 6
+    assert pool.healthy_endpoints() == [healthy.url]
+    assert len(broken.requests) == 2
+    assert pool.stats()['endpoints'][broken.url]['ejections'] == 1
+
+    slow, fast = stub_server(rpc_node(delay=0.5)), stub_server(rpc_node(delay=0.01))
+    pool = RPCPool([slow.url, fast.url], hedge=True, hedge_delay=0.05)
+    w3 = Web3(PooledHTTPProvider(pool))
+
+    started = time.perf_counter()
+    for _ in range(4):
+        assert w3.eth.block_number == 16
+    assert time.perf_counter() - started < 0.5
+    assert pool.stats()['hedge_wins'] >= 1
+    pool.close()
@@ -1,49 +1,636 @@
 import pytest
 import asyncio
+import time
+from web3 import Web3
+from src.backend.async_blockchain_monitor import AsyncMetisBlockchainMonitor
+from src.backend.block_cache import BlockReadCache
 from src.backend.blockchain_monitor import MetisBlockchainMonitor
+from src.backend.fleet_monitor import FleetMonitor
+from src.backend.token_indexer import TRANSFER_TOPIC, ZERO_ADDRESS, TokenEventIndexer
+from src.backend.transaction_store import TransactionStore
+from src.backend.wallet_analytics import WalletMetricsEngine
 
-@pytest.mark.asyncio
-async def test_blockchain_monitor_initialization():
+WALLET = '0x1234567890123456789012345678901234567890'
+TOKENS = [f'0x{index:040x}' for index in range(1, 51)]
+
+def erc20_rpc_handler(method, path, body):
+    """
+    Stub JSON-RPC node answering batched balanceOf/decimals calls at block 0x64
+    """
+    if isinstance(body, dict):
+        head = {'number': '0x64', 'hash': '0x' + '64' * 32}
+        return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': head}
+    replies = []
+    for request in body:
+        data = request['params'][0]['data']
+        token_index = int(request['params'][0]['to'], 16)
+        value = 18 if data == '0x313ce567' else token_index * 10 ** 18
+        replies.append({'jsonrpc': '2.0', 'id': request['id'], 'result': hex(value)})
+    return 200, replies
+
+def test_get_wallet_balances_batches_and_caches_decimals(stub_server):
+    """
+    Test bulk balances use one batch request, decimals are fetched once
+    and balances are cached per block
+    """
+    server = stub_server(erc20_rpc_handler)
+    monitor = MetisBlockchainMonitor(
+        metis_api_key='test_key',
+        wallet_address=WALLET,
+        rpc_url=server.url
+    )
+
+    def batches():
+        return [body for _, _, body in server.requests if isinstance(body, list)]
+
+    balances = monitor.get_wallet_balances(TOKENS)
+    assert balances == {token: float(index) for index, token in enumerate(TOKENS, 1)}
+    assert len(batches()) == 1
+    assert len(batches()[0]) == 100
+    assert {call['params'][1] for call in batches()[0]} == {'0x64'}
+
+    # Same block: served from the read cache, shared with single reads
+    assert monitor.get_wallet_balances(TOKENS) == balances
+    assert monitor.get_wallet_balance(TOKENS[2]) == 3.0
+    assert len(batches()) == 1
+    assert [body['method'] for _, _, body in server.requests if isinstance(body, dict)] == ['eth_getBlockByNumber']
+
+    monitor.read_cache.notify_new_block(101)
+    monitor.get_wallet_balances(TOKENS)
+    assert len(batches()) == 2
+    assert len(batches()[1]) == 50
+
+def metis_handler(method, path, body):
+    """
+    Stub Metis REST API and JSON-RPC node with 200 ms transaction latency
+    """
+    if method == 'GET':
+        time.sleep(0.2)
+        return 200, {'transactions': [{'hash': path, 'value': 10}]}
+    if isinstance(body, list) or body['method'] == 'eth_getBlockByNumber':
+        return erc20_rpc_handler(method, path, body)
+    return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': hex(2 * 10 ** 18)}
+
+def test_blockchain_monitor_initialization(stub_server):
     """
     Test MetisBlockchainMonitor initialization
     """
+    server = stub_server(metis_handler)
     monitor = MetisBlockchainMonitor(
-        api_key='test_key', 
-        wallet_address='0x1234567890123456789012345678901234567890'
+        metis_api_key='test_key', 
+        wallet_address=WALLET,
+        rpc_url=server.url
     )
     
     assert monitor is not None
     assert monitor.api_key == 'test_key'
-    assert monitor.wallet_address == '0x1234567890123456789012345678901234567890'
+    assert monitor.wallet_address == WALLET
+    assert monitor.rpc_url == server.url
 
-@pytest.mark.asyncio
-async def test_get_wallet_balance():
+def test_get_wallet_balance(stub_server):
     """
     Test wallet balance retrieval
     """
+    server = stub_server(metis_handler)
     monitor = MetisBlockchainMonitor(
-        api_key='test_key', 
-        wallet_address='0x1234567890123456789012345678901234567890'
+        metis_api_key='test_key', 
+        wallet_address=WALLET,
+        rpc_url=server.url
     )
     
-    balance = await monitor.get_wallet_balance()
+    balance = monitor.get_wallet_balance()
     
     assert isinstance(balance, float)
-    assert balance >= 0
+    assert balance == 2.0
 
-@pytest.mark.asyncio
-async def test_analyze_wallet_activity():
+def test_analyze_wallet_activity(stub_server):
     """
     Test wallet activity analysis
     """
+    server = stub_server(metis_handler)
     monitor = MetisBlockchainMonitor(
-        api_key='test_key', 
-        wallet_address='0x1234567890123456789012345678901234567890'
+        metis_api_key='test_key', 
+        wallet_address=WALLET,
+        rpc_url=server.url,
+        metis_base_url=server.url
     )
     
-    activity_metrics = monitor.analyze_wallet_activity()
+    activity_metrics = monitor.analyze_wallet_activity(TOKENS[:2])
     
     assert isinstance(activity_metrics, dict)
     assert 'activity_score' in activity_metrics
     assert 'total_transaction_volume' in activity_metrics
     assert 0 <= activity_metrics['activity_score'] <= 100
+    assert activity_metrics['total_transaction_volume'] == 20
+
+@pytest.mark.asyncio
+async def test_async_monitor_fetches_tokens_concurrently(stub_server):
+    """
+    Test async wallet analysis time follows the slowest token, not the sum
+    """
+    server = stub_server(metis_handler)
+    tokens = TOKENS[:8]
+
+    async with AsyncMetisBlockchainMonitor(
+        metis_api_key='test_key',
+        wallet_address=WALLET,
+        rpc_url=server.url,
+        metis_base_url=server.url,
+        requests_per_second=100
+    ) as monitor:
+        started = time.perf_counter()
+        metrics = await monitor.analyze_wallet_activity(tokens)
+        elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.2 * len(tokens) / 2
+    assert metrics['native_balance'] == 2.0
+    assert metrics['token_balances'][tokens[2]] == 3.0
+    assert metrics['total_transaction_volume'] == 10 * len(tokens)
+
+@pytest.mark.asyncio
+async def test_async_monitor_survives_malformed_transaction_replies(stub_server):
+    """
+    Test a non-JSON or oddly shaped transactions reply only loses its token
+    """
+    tokens = TOKENS[:3]
+
+    def handler(method, path, body):
+        if method == 'POST':
+            return metis_handler(method, path, body)
+        if tokens[0].lower() in path.lower():
+            return 200, b'<html>bad gateway</html>'
+        if tokens[1].lower() in path.lower():
+            return 200, ['not', 'an', 'object']
+        return 200, {'transactions': [{'hash': '0x1', 'value': 10}]}
+
+    server = stub_server(handler)
+    async with AsyncMetisBlockchainMonitor(
+        metis_api_key='test_key',
+        wallet_address=WALLET,
+        rpc_url=server.url,
+        metis_base_url=server.url
+    ) as monitor:
+        assert await monitor.get_token_transactions(tokens[0]) == []
+        metrics = await monitor.analyze_wallet_activity(tokens)
+
+    assert metrics['native_balance'] == 2.0
+    assert metrics['transaction_count'] == 1
+    assert metrics['total_transaction_volume'] == 10
+
+def test_incremental_sync_fetches_only_new_transactions(stub_server):
+    """
+    Test store-backed analysis pages forward from a cursor and dedups
+    """
+    history = [
+        {'hash': f'0x{index:064x}', 'blockNumber': str(100 + index // 2), 'value': 1}
+        for index in range(120)
+    ]
+
+    def handler(method, path, body):
+        query = dict(part.split('=') for part in path.split('?')[1].split('&'))
+        start_block, limit = int(query.get('startblock', 0)), int(query['limit'])
+        page = [tx for tx in history if int(tx['blockNumber']) >= start_block]
+        return 200, {'transactions': page[:limit]}
+
+    server = stub_server(handler)
+    monitor = MetisBlockchainMonitor(
+        metis_api_key='test_key',
+        wallet_address=WALLET,
+        metis_base_url=server.url,
+        store=TransactionStore(),
+        page_size=50
+    )
+
+    assert monitor.sync_token_transactions(TOKENS[0]) == 120
+    first_sync_requests = len(server.requests)
+    assert first_sync_requests == 3
+
+    history.extend(
+        {'hash': f'0x{index:064x}', 'blockNumber': '200', 'value': 1}
+        for index in range(120, 125)
+    )
+    assert monitor.sync_token_transactions(TOKENS[0]) == 5
+    assert len(server.requests) - first_sync_requests == 1
+    assert monitor.store.count(WALLET) == 125
+    assert monitor.store.get_cursor(WALLET, TOKENS[0]) == 200
+
+def test_store_backed_analysis_folds_in_only_new_rows(stub_server):
+    """
+    Test repeated analysis only adds rows stored since the previous call
+    and keeps wei amounts above 2**53 exact in the store
+    """
+    wei = 2 ** 60 + 1
+    history = [
+        {'hash': f'0x{index:064x}', 'blockNumber': str(100 + index), 'value': str(wei)}
+        for index in range(3)
+    ]
+
+    def handler(method, path, body):
+        if method == 'POST':
+            return metis_handler(method, path, body)
+        return 200, {'transactions': history[-50:]}
+
+    server = stub_server(handler)
+    monitor = MetisBlockchainMonitor(
+        metis_api_key='test_key',
+        wallet_address=WALLET,
+        rpc_url=server.url,
+        metis_base_url=server.url,
+        store=TransactionStore()
+    )
+    read = []
+    get_rows_after = monitor.store.get_rows_after
+
+    def counting_get_rows_after(*args):
+        rows, rowid = get_rows_after(*args)
+        read.append(len(rows))
+        return rows, rowid
+
+    monitor.store.get_rows_after = counting_get_rows_after
+
+    assert monitor.analyze_wallet_activity(TOKENS[:1])['transaction_count'] == 3
+    history.extend(
+        {'hash': f'0x{index:064x}', 'blockNumber': str(100 + index), 'value': str(wei)}
+        for index in range(3, 5)
+    )
+    metrics = monitor.analyze_wallet_activity(TOKENS[:1])
+    assert metrics['transaction_count'] == 5
+    assert metrics['total_transaction_volume'] == 5 * float(wei)
+    assert monitor.analyze_wallet_activity(TOKENS[:1])['transaction_count'] == 5
+    assert read == [3, 2, 0]
+
+    # A changed token set rebuilds the metrics from the stored history
+    assert monitor.analyze_wallet_activity(TOKENS[:2])['transaction_count'] == 10
+    assert read[-1] == 10
+    assert {row[2] for row in monitor.store.get_rows(WALLET)} == {str(wei)}
+
+def test_incremental_sync_pages_through_crowded_blocks(stub_server):
+    """
+    Test a block holding more than page_size transfers is read completely
+    and hashless transfers are kept apart by their log position
+    """
+    history = [
+        {'hash': f'0x{index:064x}', 'blockNumber': '100', 'value': 1}
+        for index in range(120)
+    ] + [
+        {'blockNumber': '101', 'transactionIndex': '0', 'logIndex': str(index), 'value': 1}
+        for index in range(10)
+    ]
+
+    def handler(method, path, body):
+        query = dict(part.split('=') for part in path.split('?')[1].split('&'))
+        start_block, limit = int(query.get('startblock', 0)), int(query['limit'])
+        offset = (int(query.get('page', 1)) - 1) * limit
+        page = [tx for tx in history if int(tx['blockNumber']) >= start_block]
+        return 200, {'transactions': page[offset:offset + limit]}
+
+    server = stub_server(handler)
+    monitor = MetisBlockchainMonitor(
+        metis_api_key='test_key',
+        wallet_address=WALLET,
+        metis_base_url=server.url,
+        store=TransactionStore(),
+        page_size=50
+    )
+
+    assert monitor.sync_token_transactions(TOKENS[0]) == 130
+    assert monitor.store.get_cursor(WALLET, TOKENS[0]) == 101
+    assert monitor.sync_token_transactions(TOKENS[0]) == 0
+    assert monitor.store.add_transactions(WALLET, TOKENS[0], [{'blockNumber': '102'}]) == 0
+    assert monitor.store.count(WALLET) == 130
+
+def test_wallet_metrics_engine_streaming_matches_batch():
+    """
+    Test vectorized metrics, windows and per-token breakdowns across batches
+    """
+    other = '0x9999999999999999999999999999999999999999'
+    transactions = [
+        {
+            'value': index % 7,
+            'timeStamp': 1_700_000_000 + index * 60,
+            'from': other if index % 2 else WALLET,
+            'to': WALLET if index % 2 else other
+        }
+        for index in range(2000)
+    ]
+
+    batch = WalletMetricsEngine()
+    batch.add_transactions(TOKENS[0], transactions, WALLET)
+
+    streaming = WalletMetricsEngine()
+    for start in range(0, 2000, 300):
+        streaming.add_transactions(
+            TOKENS[start // 300 % 2], transactions[start:start + 300], WALLET
+        )
+
+    expected_volume = sum(tx['value'] for tx in transactions)
+    now = transactions[-1]['timeStamp']
+    metrics = streaming.metrics(now)
+
+    assert metrics['total_transaction_volume'] == expected_volume
+    assert batch.metrics()['activity_score'] == min(2000 * expected_volume / 10000, 100)
+    assert metrics['inflow_volume'] + metrics['outflow_volume'] == expected_volume
+    assert metrics['activity_windows']['1h'] == {
+        'count': 61,
+        'volume': float(sum(tx['value'] for tx in transactions[-61:]))
+    }
+    assert metrics['activity_windows'] == batch.metrics(now)['activity_windows']
+    assert sum(token['count'] for token in metrics['token_activity'].values()) == 2000
+
+def test_wallet_metrics_windows_of_dormant_wallet_are_empty():
+    """
+    Test rolling windows are measured from the current time, so a wallet
+    idle for weeks does not report its last active day as current
+    """
+    last_active = int(time.time()) - 30 * 86400
+    engine = WalletMetricsEngine()
+    engine.add_transactions(TOKENS[0], [
+        {'value': 5, 'timeStamp': last_active - index * 60, 'from': WALLET, 'to': TOKENS[1]}
+        for index in range(10)
+    ], WALLET)
+
+    metrics = engine.metrics()
+
+    assert metrics['transaction_count'] == 10
+    assert metrics['activity_windows']['24h'] == {'count': 0, 'volume': 0.0}
+    assert metrics['activity_windows']['7d'] == {'count': 0, 'volume': 0.0}
+    assert engine.metrics(last_active)['activity_windows']['1h']['count'] == 10
+
+@pytest.mark.asyncio
+async def test_fleet_monitor_shares_batches_and_adapts_intervals(stub_server):
+    """
+    Test due wallets share one balance batch, decimals are read once per
+    token for the fleet and active wallets are polled more often
+    """
+    activity = {}
+
+    def handler(method, path, body):
+        if method == 'GET':
+            wallet = path.split('/wallets/')[1].split('/')[0].lower()
+            count = activity.get(wallet, 1)
+            # Like the Metis API, only the newest 50 transactions are returned
+            return 200, {'transactions': [
+                {'hash': str(i), 'blockNumber': str(i), 'value': 1}
+                for i in range(max(0, count - 50), count)
+            ]}
+        replies = []
+        for request in body:
+            if request['method'] == 'eth_getBalance':
+                replies.append({'jsonrpc': '2.0', 'id': request['id'], 'result': hex(10 ** 18)})
+            else:
+                replies.extend(erc20_rpc_handler(method, path, [request])[1])
+        return 200, replies
+
+    server = stub_server(handler)
+    now = [0.0]
+    wallets = [f'0x{index:040x}' for index in range(101, 104)]
+    fleet = FleetMonitor(
+        metis_api_key='test_key',
+        rpc_url=server.url,
+        metis_base_url=server.url,
+        base_interval=60,
+        hot_interval=10,
+        clock=lambda: now[0]
+    )
+    for wallet in wallets:
+        fleet.add_wallet(wallet, TOKENS[:3])
+
+    assert len(await fleet.poll_due()) == 3
+    batches = [body for method, _, body in server.requests if method == 'POST']
+    assert len(batches) == 1
+    assert sum(call['params'][0].get('data') == '0x313ce567'
+               for call in batches[0] if call['method'] == 'eth_call') == 3
+
+    metrics = fleet.get_wallet_metrics(wallets[0])
+    assert metrics['native_balance'] == 1.0
+    assert metrics['token_balances'][TOKENS[1]] == 2.0
+    assert metrics['transaction_count'] == 3
+    assert fleet.next_due_in() == 60
+
+    activity[wallets[0]] = 5
+    now[0] = 60.0
+    assert len(await fleet.poll_due()) == 3
+    now[0] = 90.0
+    assert await fleet.poll_due() == [Web3.to_checksum_address(wallets[0])]
+
+    # New activity beyond the 50-transaction cap still makes a wallet hot
+    activity[wallets[1]] = 60
+    now[0] = 180.0
+    assert Web3.to_checksum_address(wallets[1]) in await fleet.poll_due()
+    activity[wallets[1]] = 61
+    now[0] = 240.0
+    assert Web3.to_checksum_address(wallets[1]) in await fleet.poll_due()
+    assert fleet._wallets[Web3.to_checksum_address(wallets[1])].interval == 30
+
+    # A removed and re-added wallet keeps a single queue entry
+    fleet.remove_wallet(wallets[2])
+    fleet.add_wallet(wallets[2], TOKENS[:3], interval=1000)
+    assert Web3.to_checksum_address(wallets[2]) in await fleet.poll_due()
+    now[0] = 900.0
+    assert Web3.to_checksum_address(wallets[2]) not in await fleet.poll_due()
+    await fleet.aclose()
+
+@pytest.mark.asyncio
+async def test_fleet_monitor_keeps_polling_wallets_after_failures(stub_server):
+    """
+    Test a wallet whose poll fails is retried with a backoff and does not
+    stop the other wallets of its round from being polled again
+    """
+    wallets = [f'0x{index:040x}' for index in range(201, 204)]
+    broken = {'rpc': True}
+
+    def handler(method, path, body):
+        if method == 'GET':
+            return 200, {'transactions': [{'hash': '0x1', 'blockNumber': '1', 'value': 1}]}
+        replies = []
+        for request in body:
+            if request['method'] == 'eth_getBalance':
+                failing = broken['rpc'] and request['params'][0].lower() == wallets[2]
+                result = 'not hex' if failing else hex(10 ** 18)
+                replies.append({'jsonrpc': '2.0', 'id': request['id'], 'result': result})
+            else:
+                replies.extend(erc20_rpc_handler(method, path, [request])[1])
+        return 200, replies
+
+    server = stub_server(handler)
+    now = [0.0]
+    fleet = FleetMonitor(
+        metis_api_key='test_key',
+        rpc_url=server.url,
+        metis_base_url=server.url,
+        base_interval=60,
+        hot_interval=10,
+        clock=lambda: now[0]
+    )
+    fleet.add_wallet(wallets[0], TOKENS[:1])
+    fleet.add_wallet(wallets[1], ['0xnot-a-token'])
+    fleet.add_wallet(wallets[2], TOKENS[:1])
+
+    assert len(await fleet.poll_due()) == 3
+    failed = fleet._wallets[Web3.to_checksum_address(wallets[1])]
+    assert failed.failures == 1 and failed.last_error
+    assert fleet.get_wallet_metrics(wallets[0])['native_balance'] == 1.0
+    assert fleet.get_wallet_metrics(wallets[2])['native_balance'] == 0.0
+    assert fleet.next_due_in() == 10
+
+    broken['rpc'] = False
+    failed.tracked_tokens = TOKENS[:1]
+    now[0] = 10.0
+    assert await fleet.poll_due() == [Web3.to_checksum_address(wallets[1])]
+    assert failed.failures == 0 and failed.last_error is None
+    now[0] = 60.0
+    assert len(await fleet.poll_due()) == 2
+    assert fleet.get_wallet_metrics(wallets[2])['native_balance'] == 1.0
+    assert len(fleet._queue) == 3
+    await fleet.aclose()
+
+def test_block_read_cache_reads_once_per_block(stub_server, tmp_path):
+    """
+    Test repeated balance reads hit the node once per block and deep
+    results survive in the disk tier
+    """
+    head = [100]
+    now = [0.0]
+
+    def handler(method, path, body):
+        if body['method'] == 'eth_blockNumber':
+            return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': hex(head[0])}
+        assert body['params'][1] != 'latest'
+        return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': hex(3 * 10 ** 18)}
+
+    server = stub_server(handler)
+    monitor = MetisBlockchainMonitor(metis_api_key='test_key', wallet_address=WALLET, rpc_url=server.url)
+    cache = BlockReadCache(
+        lambda: monitor.web3.eth.block_number,
+        disk_path=str(tmp_path / 'reads.db'),
+        confirmations=2,
+        clock=lambda: now[0]
+    )
+    monitor.read_cache = cache
+
+    def calls(rpc_method):
+        return sum(body['method'] == rpc_method for _, _, body in server.requests)
+
+    for _ in range(5):
+        assert monitor.get_wallet_balance() == 3
+    assert calls('eth_getBalance') == 1
+    assert calls('eth_blockNumber') == 1
+
+    cache.notify_new_block(101)
+    head[0] = 101
+    for _ in range(5):
+        monitor.get_wallet_balance()
+    assert calls('eth_getBalance') == 2
+    assert calls('eth_blockNumber') == 1
+
+    now[0] = 10.0
+    head[0] = 104
+    monitor.get_wallet_balance()
+    assert calls('eth_getBalance') == 3
+    assert cache.get_balance(monitor.web3, WALLET, block=102) == 3 * 10 ** 18
+    cache.memory.clear()
+    assert cache.get_or_load(WALLET, 'eth_getBalance', (), None, block=102) == 3 * 10 ** 18
+    assert cache.stats()['disk']['hits'] == 1
+
+def test_block_read_cache_keys_recent_reads_by_block_hash(tmp_path):
+    """
+    Test a reorg at the same height invalidates "latest" reads and reads
+    pinned to a block hash are persisted at once
+    """
+    head = [(100, '0x' + 'aa' * 32)]
+    now = [0.0]
+    loads = []
+
+    def loader(block_number):
+        loads.append(block_number)
+        return len(loads)
+
+    disk_path = str(tmp_path / 'reads.db')
+    cache = BlockReadCache(head_fn=lambda: head[0], disk_path=disk_path, clock=lambda: now[0])
+
+    assert cache.get_or_load(WALLET, 'eth_getBalance', (), loader) == 1
+    assert cache.get_or_load(WALLET, 'eth_getBalance', (), loader) == 1
+    assert loads == [100]
+
+    # Block 100 is replaced by a sibling with another hash
+    now[0], head[0] = 10.0, (100, '0x' + 'bb' * 32)
+    assert cache.get_or_load(WALLET, 'eth_getBalance', (), loader) == 2
+    assert loads == [100, 100]
+    assert cache.get_or_load(WALLET, 'eth_getBalance', (), loader, block=100) == 2
+
+    restarted = BlockReadCache(head_fn=lambda: head[0], disk_path=disk_path)
+    assert restarted.get_or_load(WALLET, 'eth_getBalance', (), loader) == 2
+    assert loads == [100, 100]
+
+def test_token_indexer_chunks_follows_head_and_rolls_back_reorgs(stub_server):
+    """
+    Test the indexer shrinks rejected log ranges, serves owner/metadata/time
+    queries locally and re-indexes blocks replaced by a reorg
+    """
+    contract = '0x00000000000000000000000000000000000000aa'
+    alice, bob = f'0x{0xa1:040x}', f'0x{0xb0:040x}'
+    chain = {'head': 40, 'fork': 0, 'getLogs': 0}
+    transfers = {
+        5: [(ZERO_ADDRESS, alice, 1)],
+        12: [(ZERO_ADDRESS, alice, 2), (alice, bob, 1)],
+        38: [(ZERO_ADDRESS, bob, 3)]
+    }
+
+    def topic(value):
+        return '0x' + hex(value)[2:].rjust(64, '0')
+
+    def block_hash(number):
+        return topic(number * 1000 + (chain['fork'] if number >= 36 else 0))
+
+    def handler(method, path, body):
+        def reply(result):
+            return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': result}
+
+        if body['method'] == 'eth_blockNumber':
+            return reply(hex(chain['head']))
+        if body['method'] == 'eth_getBlockByNumber':
+            number = int(body['params'][0], 16)
+            return reply({'number': hex(number), 'hash': block_hash(number), 'timestamp': hex(1000 + number)})
+        chain['getLogs'] += 1
+        query = body['params'][0]
+        start, end = int(query['fromBlock'], 16), int(query['toBlock'], 16)
+        if end - start >= 16:
+            return 200, {'jsonrpc': '2.0', 'id': body['id'],
+                         'error': {'code': -32005, 'message': 'block range too large'}}
+        logs = [
+            {
+                'address': contract, 'blockNumber': hex(number), 'blockHash': block_hash(number),
+                'transactionHash': topic(number), 'transactionIndex': '0x0', 'logIndex': hex(index),
+                'data': '0x', 'removed': False,
+                'topics': [TRANSFER_TOPIC, topic(int(sender, 16)), topic(int(receiver, 16)), topic(token_id)]
+            }
+            for number, events in transfers.items() if start <= number <= end
+            for index, (sender, receiver, token_id) in enumerate(events)
+        ]
+        return reply(logs)
+
+    server = stub_server(handler)
+    indexer = TokenEventIndexer(
+        Web3(Web3.HTTPProvider(server.url)),
+        contract,
+        initial_chunk_size=64,
+        max_chunk_size=64,
+        confirmations=5,
+        metadata_fetcher=lambda token_id: f'{{"name": "qube-{token_id}"}}'
+    )
+
+    assert indexer.sync() == 4
+    assert indexer.chunk_size < 64
+    index = indexer.index
+    assert [token['token_id'] for token in index.tokens_by_owner(bob)] == [1, 3]
+    assert [token['token_id'] for token in index.tokens_by_owner(alice)] == [2]
+    assert [token['token_id'] for token in index.search_metadata('qube-3')] == [3]
+    assert [token['token_id'] for token in index.tokens_minted_between(1010, 1040)] == [2, 3]
+
+    # Block 38 is replaced by a fork in which token 3 goes to alice instead
+    chain['fork'], chain['head'] = 1, 42
+    transfers[38] = [(ZERO_ADDRESS, alice, 3)]
+    indexer.sync()
+    assert [token['token_id'] for token in index.tokens_by_owner(alice)] == [2, 3]
+    assert [token['token_id'] for token in index.tokens_by_owner(bob)] == [1]
+    assert index.get_cursor() == 42
@@ -0,0 +1,231 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from src.backend.context_transformer import AgentContextTransformer, HASH_FEATURES
+from src.backend.domain_classifier import OnlineDomainClassifier
+
+@pytest.fixture
+def transformer():
+    return AgentContextTransformer()
+
+def test_domain_matrix_has_one_row_per_domain(transformer):
+    """
+    Test that every domain shares one hashed feature space
+    """
+    matrix = transformer.domain_matrix
+
+    assert matrix.shape == (len(transformer.domains), HASH_FEATURES)
+    assert matrix[transformer.domain_names.index('technical')].nnz > 0
+    assert matrix[transformer.domain_names.index('general')].nnz == 0
+
+def test_detect_domains_batch_matches_single(transformer):
+    """
+    Test batch detection preserves order and agrees with detect_domain
+    """
+    texts = [
+        'How do I fix this software algorithm?',
+        'Write a poetry and music storytelling piece',
+        'What is our marketing strategy for the startup?',
+        'Design an experiment to test the hypothesis in physics',
+        'Hello there'
+    ]
+
+    results = transformer.detect_domains(texts)
+
+    assert [result['domain'] for result in results] == [
+        'technical', 'creative', 'business', 'scientific', 'general'
+    ]
+    assert [transformer.detect_domain(text) for text in texts] == [
+        result['domain'] for result in results
+    ]
+    assert set(results[0]['scores']) == set(transformer.domains)
+
+def test_detect_domains_empty_batch(transformer):
+    """
+    Test that an empty batch returns no results
+    """
+    assert transformer.detect_domains([]) == []
+
+def test_domain_cache_hits_on_normalized_text():
+    """
+    Test that repeated prompts are served from the memoization layer
+    """
+    transformer = AgentContextTransformer(cache_size=2)
+
+    first = transformer.detect_domain('Explain this  software ALGORITHM')
+    second = transformer.detect_domain('explain this software algorithm ')
+    stats = transformer.cache_stats()['detect_domain']
+
+    assert first == second == 'technical'
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+    transformer.detect_domain('marketing strategy')
+    transformer.detect_domain('poetry and music')
+    assert transformer.cache_stats()['detect_domain']['evictions'] == 1
+
+def test_domain_cache_invalidated_on_domain_change():
+    """
+    Test that changing the domain set discards memoized results
+    """
+    transformer = AgentContextTransformer(cache_size=16)
+    assert transformer.detect_domain('blockchain wallet') == 'general'
+
+    transformer.set_domains({
+        'web3': ['blockchain', 'wallet', 'token'],
+        'general': []
+    })
+
+    assert transformer.detect_domain('blockchain wallet') == 'web3'
+    assert transformer.adjust_capabilities('web3')['domain'] == 'web3'
+    assert transformer.adjust_capabilities('web3')['domain'] == 'web3'
+    assert transformer.cache_stats()['adjust_capabilities']['hits'] == 1
+
+def test_capability_cache_keeps_domain_case():
+    """
+    Test domains differing only in case are cached apart, as they resolve apart
+    """
+    transformer = AgentContextTransformer(cache_size=16)
+
+    assert transformer.adjust_capabilities('technical')['capabilities'] == \
+        transformer.get_domain_capabilities('technical')
+    assert transformer.adjust_capabilities('Technical') == {
+        'domain': 'Technical',
+        'capabilities': transformer.get_domain_capabilities('Technical')
+    }
+    assert transformer.cache_stats()['adjust_capabilities']['hits'] == 0
+
+def test_incremental_domain_registry(transformer):
+    """
+    Test registering, updating and removing domains publishes new snapshots
+    """
+    before = transformer.snapshot
+
+    transformer.register_domain('web3', ['blockchain', 'wallet', 'token'])
+    assert transformer.detect_domain('my blockchain wallet') == 'web3'
+
+    transformer.update_keywords('web3', ['nft', 'minting'])
+    assert transformer.detect_domain('my blockchain wallet') == 'general'
+    assert transformer.detect_domain('nft minting') == 'web3'
+
+    transformer.remove_domain('web3')
+    assert 'web3' not in transformer.domains
+    assert transformer.domain_matrix.shape[0] == len(before.names)
+
+    # Readers holding the old snapshot are unaffected by later writes
+    assert before.version == 0
+    assert transformer.domain_version == 3
+    assert 'web3' not in before.keywords
+
+    with pytest.raises(ValueError):
+        transformer.register_domain('technical', ['code'])
+    with pytest.raises(KeyError):
+        transformer.remove_domain('unknown')
+
+def test_domains_built_on_first_use_and_index_patched_incrementally(monkeypatch):
+    """
+    Test construction defers vectorizing and writers only analyze the
+    keywords of the domains they change
+    """
+    build_snapshot = AgentContextTransformer._build_snapshot
+    monkeypatch.setattr(
+        AgentContextTransformer, '_build_snapshot',
+        lambda *args, **kwargs: pytest.fail('snapshot built at construction')
+    )
+    transformer = AgentContextTransformer()
+    monkeypatch.setattr(AgentContextTransformer, '_build_snapshot', build_snapshot)
+    transformer.warmup()
+
+    analyzed = []
+    analyzer = transformer.analyzer
+    transformer._analyzer = lambda text: analyzed.append(text) or analyzer(text)
+
+    transformer.register_domain('web3', ['blockchain', 'smart contract', 'data'])
+    assert analyzed == ['blockchain', 'smart contract', 'data']
+
+    analyzed.clear()
+    transformer.update_keywords('web3', ['nft'])
+    assert analyzed == ['blockchain', 'smart contract', 'data', 'nft']
+
+    analyzed.clear()
+    scientific = transformer.domains['scientific']
+    transformer.remove_domain('scientific')
+    assert analyzed == scientific
+
+    rebuilt = AgentContextTransformer(domains=transformer.domains).snapshot
+    assert transformer.snapshot.keyword_index == rebuilt.keyword_index
+    assert transformer.snapshot.max_phrase_length == rebuilt.max_phrase_length
+
+def test_trainable_mode_learns_from_feedback(tmp_path):
+    """
+    Test keyword fast path, feedback training and memory-mapped reload
+    """
+    transformer = AgentContextTransformer(classifier=OnlineDomainClassifier())
+
+    keyword_hit = transformer.detect_domains(['Tell me about marketing'])[0]
+    assert keyword_hit['domain'] == 'business'
+    assert keyword_hit['source'] == 'keyword'
+
+    for _ in range(5):
+        transformer.record_feedback('my portfolio lost value today', 'business')
+        transformer.record_feedback('the sonnet needs a better rhyme', 'creative')
+
+    learned = transformer.detect_domains(['my portfolio value'])[0]
+    assert learned['domain'] == 'business'
+    assert learned['source'] == 'model'
+
+    transformer.classifier.save(str(tmp_path))
+    reloaded = OnlineDomainClassifier.load(str(tmp_path))
+
+    assert reloaded.classes == transformer.classifier.classes
+    assert isinstance(reloaded.weights, np.memmap)
+    assert reloaded.predict(['a better rhyme'])[0][0] == 'creative'
+
+def test_classifier_predicts_while_learning_new_domains():
+    """
+    Test a prediction racing partial_fit with a new label sees weights,
+    bias and classes of the same model version
+    """
+    classifier = OnlineDomainClassifier(n_features=2 ** 10)
+    classifier.partial_fit(['seed text', 'other text'], ['seed', 'other'])
+    widened = threading.Event()
+
+    def slow_add_class(label):
+        # Stall between replacing the weights and the bias
+        classifier.classes.append(label)
+        classifier.weights = np.vstack([classifier.weights, np.zeros((1, 2 ** 10), np.float32)])
+        widened.set()
+        time.sleep(0.1)
+        classifier.bias = np.append(classifier.bias, np.float32(0.0))
+
+    classifier._add_class = slow_add_class
+    learner = threading.Thread(target=classifier.partial_fit, args=(['new text'], ['new']))
+    learner.start()
+    assert widened.wait(5)
+    (domain, probabilities), = classifier.predict(['some text'])
+    learner.join()
+
+    assert abs(sum(probabilities.values()) - 1) < 1e-6
+    assert len(classifier.predict_proba(['some text'])[0]) == 3
+
+def test_domain_artifact_round_trip(tmp_path, monkeypatch):
+    """
+    Test the fitted domain snapshot is reused from disk without refitting
+    """
+    artifact_path = str(tmp_path / 'domains.npz')
+    built = AgentContextTransformer(artifact_path=artifact_path)
+    assert not (tmp_path / 'domains.npz').exists()
+    built.warmup()
+    assert (tmp_path / 'domains.npz').exists()
+
+    monkeypatch.setattr(
+        AgentContextTransformer, '_build_snapshot',
+        lambda *args, **kwargs: pytest.fail('snapshot rebuilt despite artifact')
+    )
+    loaded = AgentContextTransformer(artifact_path=artifact_path)
+
+    assert loaded.domain_names == built.domain_names
+    assert (loaded.domain_matrix != built.domain_matrix).nnz == 0
+    assert loaded.detect_domain('Fix this software algorithm') == 'technical'
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.backend.main import AigentQubeApp
+from src.backend.natural_language_interface import NaturalLanguageInterface
+from src.backend.status_hub import StatusHub
+from src.backend.status_registry import InMemoryStatusRegistry
+from tests.backend.stubs import chat_completion_stream
+
+def stream_handler(method, path, body):
+    """
+    Stream the user message back word by word
+    """
+    assert body['stream'] is True
+    return 200, chat_completion_stream(body['messages'][-1]['content'].split(' '))
+
+def test_query_websocket_streams_deltas(stub_server):
+    """
+    Test /ws/query forwards deltas and a final done event
+    """
+    server = stub_server(stream_handler)
+    aigentqube = AigentQubeApp(
+        natural_language_interface=NaturalLanguageInterface(
+            openai_api_key='test_key',
+            base_url=server.url
+        )
+    )
+
+    with TestClient(aigentqube.app) as client:
+        with client.websocket_connect('/ws/query') as websocket:
+            websocket.send_json({'query': 'compose some music'})
+            events = []
+            while not events or events[-1]['type'] != 'done':
+                events.append(websocket.receive_json())
+
+            websocket.send_json({})
+            assert websocket.receive_json()['type'] == 'error'
+
+    assert [event['content'] for event in events[:-1]] == ['compose', 'some', 'music']
+    assert events[-1]['response'] == 'composesomemusic'
+    assert events[-1]['domain'] == 'creative'
+    assert events[-1]['tokens_used'] == 10
+
+def test_health_ready_before_warmup():
+    """
+    Test workers report ready without importing the heavy dependencies
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', (
+            'import sys, src.backend.main as main; '
+            'assert "sklearn" not in sys.modules and "openai" not in sys.modules; '
+            'assert main.aigentqube_app._natural_language_interface is None'
+        )],
+        capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+    aigentqube = AigentQubeApp(warmup=False)
+    with TestClient(aigentqube.app) as client:
+        health = client.get('/health').json()
+
+    assert health['status'] == 'ok'
+    assert health['warm'] is True
+    assert 0 < health['startup_seconds']
+
+class CountingApp(AigentQubeApp):
+    def __init__(self, **kwargs):
+        self.fetches = 0
+        super().__init__(warmup=False, **kwargs)
+
+    async def get_agent_status(self, agent_id):
+        self.fetches += 1
+        return {'agent_id': agent_id, 'tick': self.fetches}
+
+def test_agent_status_fanned_out_once_per_tick():
+    """
+    Test viewers of one agent share a single status computation per tick
+    """
+    aigentqube = CountingApp(status_interval=0.05)
+
+    with TestClient(aigentqube.app) as client:
+        with client.websocket_connect('/ws/agent/alpha') as first, \
+                client.websocket_connect('/ws/agent/alpha') as second:
+            received = [first.receive_json() for _ in range(3)]
+            received += [second.receive_json() for _ in range(3)]
+            assert aigentqube.status_hub.subscriber_count('alpha') == 2
+
+    first_ticks = {status['tick'] for status in received[:3]}
+    second_ticks = {status['tick'] for status in received[3:]}
+    assert {status['agent_id'] for status in received} == {'alpha'}
+    # Polling per connection would never hand two viewers the same tick
+    assert first_ticks & second_ticks
+    assert aigentqube.status_hub.stats()['agents'] == 0
+
+def test_status_hub_drops_oldest_for_slow_subscribers():
+    """
+    Test a slow subscriber keeps only the newest updates
+    """
+    async def scenario():
+        async def fetch_status(agent_id):
+            return {'tick': 'fetched'}
+
+        hub = StatusHub(fetch_status, interval=60, queue_size=2)
+        subscription = hub.subscribe('alpha')
+        for tick in range(5):
+            hub.publish('alpha', {'tick': tick})
+        updates = [(await subscription.get()).status for _ in range(2)]
+        await hub.close()
+        return updates, subscription.dropped
+
+    updates, dropped = asyncio.run(scenario())
+    assert updates == [{'tick': 3}, {'tick': 4}]
+    assert dropped == 3
+
+class SlowlyChangingApp(CountingApp):
+    async def get_agent_status(self, agent_id):
+        self.fetches += 1
+        return {'agent_id': agent_id, 'load': self.fetches // 2}
+
+def test_agent_status_delta_protocol():
+    """
+    Test the delta protocol sends a snapshot, then deltas and heartbeats
+    """
+    aigentqube = SlowlyChangingApp(status_interval=0.02)
+
+    with TestClient(aigentqube.app) as client:
+        with client.websocket_connect('/ws/agent/alpha?protocol=delta') as websocket:
+            frames = [json.loads(websocket.receive_text()) for _ in range(4)]
+            websocket.send_json({'type': 'resync'})
+            after_resync = [json.loads(websocket.receive_text()) for _ in range(3)]
+
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect('/ws/agent/alpha?protocol=delta&encoding=xml') as websocket:
+                websocket.receive_text()
+
+    assert frames[0] == {'type': 'snapshot', 'seq': 1, 'data': {'agent_id': 'alpha', 'load': 0}}
+    assert [frame['seq'] for frame in frames] == [1, 2, 3, 4]
+    assert [frame['type'] for frame in frames[1:]] == ['delta', 'heartbeat', 'delta']
+    assert frames[1]['changed'] == {'load': 1}
+    assert 'snapshot' in [frame['type'] for frame in after_resync]
+
+def test_bulk_agent_status_conditional_and_paginated():
+    """
+    Test bulk status reads with ETag revalidation, since and pagination
+    """
+    registry = InMemoryStatusRegistry()
+    for agent_id in ['alpha', 'beta', 'gamma']:
+        registry.put(agent_id, {'status': 'active'})
+    aigentqube = AigentQubeApp(warmup=False, status_registry=registry, max_status_ids=3)
+
+    with TestClient(aigentqube.app) as client:
+        response = client.get('/agents/status', params={'ids': 'alpha,beta,omega'})
+        body = response.json()
+        assert set(body['statuses']) == {'alpha', 'beta'}
+        assert body['missing'] == ['omega']
+
+        etag = response.headers['etag']
+        assert client.get(
+            '/agents/status', params={'ids': 'alpha,beta,omega'}, headers={'If-None-Match': etag}
+        ).status_code == 304
+        # A validator of one query never matches another
+        assert client.get(
+            '/agents/status', params={'ids': 'alpha,beta'}, headers={'If-None-Match': etag}
+        ).status_code == 200
+
+        # Writes to agents outside a page leave its validator intact
+        page_etag = client.get('/agents', params={'limit': 2}).headers['etag']
+        registry.put('gamma', {'status': 'busy'})
+        assert client.get(
+            '/agents', params={'limit': 2}, headers={'If-None-Match': page_etag}
+        ).status_code == 304
+        assert client.get(
+            '/agents', params={'limit': 3}, headers={'If-None-Match': page_etag}
+        ).status_code == 200
+
+        registry.put('beta', {'status': 'busy'})
+        changed = client.get(
+            '/agents/status',
+            params={'ids': 'alpha,beta', 'since': body['version']},
+            headers={'If-None-Match': etag}
+        )
+        assert changed.status_code == 200
+        assert list(changed.json()['statuses']) == ['beta']
+
+        first_page = client.get('/agents', params={'limit': 2}).json()
+        second_page = client.get('/agents', params={'limit': 2, 'after': first_page['next_after']}).json()
+        assert [status['agent_id'] for status in first_page['statuses']] == ['alpha', 'beta']
+        assert [status['agent_id'] for status in second_page['statuses']] == ['gamma']
+        assert second_page['next_after'] is None
+
+        feed = client.get('/agents', params={'since': body['version']}).json()
+        assert [status['agent_id'] for status in feed['statuses']] == ['gamma', 'beta']
+
+        assert client.get('/agents/status', params={'ids': 'a,b,c,d'}).status_code == 400
+        assert client.get('/agents', params={'limit': 501}).status_code == 422
@@ -0,0 +1,138 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.cache import TTLCache
+from src.backend.context_transformer import AgentContextTransformer
+from src.backend.main import AigentQubeApp
+from src.backend.metrics import REGISTRY, MetricsRegistry
+from src.backend.natural_language_interface import NaturalLanguageInterface
+from src.backend.rpc_pool import RPCPool
+from tests.backend.stubs import chat_completion
+
+def test_metrics_disabled_record_nothing():
+    """
+    Test disabled metrics hand out shared no-ops and render no samples
+    """
+    registry = MetricsRegistry(enabled=False)
+    latency = registry.histogram('latency_seconds', 'Latency', ['route'])
+    requests = registry.counter('requests_total', 'Requests')
+
+    with latency.labels('a').time():
+        requests.inc()
+
+    assert latency.time() is latency.labels('b').time()
+    assert registry.render() == (
+        '# HELP latency_seconds Latency\n# TYPE latency_seconds histogram\n'
+        '# HELP requests_total Requests\n# TYPE requests_total counter\n'
+    )
+
+def test_metrics_render_prometheus_text():
+    """
+    Test counters, histograms and gauges in the exposition format
+    """
+    registry = MetricsRegistry(enabled=True)
+    latency = registry.histogram('latency_seconds', 'Latency', ['route'], buckets=[0.1, 1])
+    registry.counter('requests_total', 'Requests').inc(2)
+    registry.gauge('queued', 'Queued items', lambda: 7)
+
+    latency.labels('a"b').observe(0.05)
+    latency.labels('a"b').observe(0.5)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="a\\"b",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="a\\"b",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{route="a\\"b"} 2' in lines
+    assert 'requests_total 2' in lines
+    assert 'queued 7' in lines
+
+def test_metrics_route_reports_hot_paths(monkeypatch):
+    """
+    Test /metrics exposes domain detection timings and WebSocket frame counts
+    """
+    monkeypatch.setattr(REGISTRY, 'enabled', True)
+    REGISTRY.reset()
+    AgentContextTransformer().detect_domain('Fix this software algorithm')
+    aigentqube = AigentQubeApp(warmup=False, status_interval=0.01)
+
+    with TestClient(aigentqube.app) as client:
+        with client.websocket_connect('/ws/agent/alpha') as websocket:
+            websocket.receive_json()
+            websocket.receive_json()
+        text = client.get('/metrics').text
+
+        monkeypatch.setattr(REGISTRY, 'enabled', False)
+        assert client.get('/metrics').status_code == 404
+
+    assert 'aigentqube_detect_domain_seconds_count 1' in text.splitlines()
+    assert 'aigentqube_ws_frames_sent_total{channel="status"}' in text
+    assert '# TYPE aigentqube_ws_status_subscribers gauge' in text
+
+def test_metrics_route_redacts_rpc_endpoint_credentials(monkeypatch, stub_server):
+    """
+    Test RPC series are labelled by position and host, never by the URL's
+    path or query, which hold provider API keys
+    """
+    monkeypatch.setattr(REGISTRY, 'enabled', True)
+    REGISTRY.reset()
+    node = stub_server(lambda method, path, body: (
+        200, {'jsonrpc': '2.0', 'id': body['id'], 'result': '0x10'}
+    ))
+    pool = RPCPool([f'{node.url}/v3/pathsecret?apikey=querysecret'])
+    pool.request({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []})
+    pool.close()
+
+    with TestClient(AigentQubeApp(warmup=False).app) as client:
+        text = client.get('/metrics').text
+
+    assert 'aigentqube_rpc_request_seconds_count{endpoint="0-127.0.0.1"} 1' in text.splitlines()
+    assert 'pathsecret' not in text and 'querysecret' not in text and '?' not in text
+
+def test_metrics_cover_batches_and_live_apps_only(monkeypatch):
+    """
+    Test batched domain detection is timed and creating apps neither
+    re-registers the status gauges nor changes whether metrics are enabled
+    """
+    monkeypatch.setattr(REGISTRY, 'enabled', True)
+    REGISTRY.reset()
+    AgentContextTransformer().detect_domains(['Fix this software algorithm', 'Write a poem'])
+
+    gauge = REGISTRY.get('aigentqube_ws_status_subscribers')
+    AigentQubeApp(warmup=False)
+    AigentQubeApp(warmup=False)
+
+    lines = REGISTRY.render().splitlines()
+    assert REGISTRY.get('aigentqube_ws_status_subscribers') is gauge
+    assert REGISTRY.enabled
+    assert 'aigentqube_detect_domain_seconds_count 1' in lines
+    assert 'aigentqube_detect_domain_texts_total 2' in lines
+    assert 'aigentqube_ws_status_subscribers 0' in lines
+
+@pytest.mark.asyncio
+async def test_batch_queries_are_timed_and_counted_per_query(monkeypatch, stub_server):
+    """
+    Test process_user_queries records the same query metrics per item as
+    aprocess_user_query
+    """
+    monkeypatch.setattr(REGISTRY, 'enabled', True)
+    REGISTRY.reset()
+
+    def handler(method, path, body):
+        if 'fail' in body['messages'][-1]['content']:
+            return 400, {'error': {'message': 'rejected'}}
+        return 200, chat_completion('ok')
+
+    server = stub_server(handler)
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        response_cache=TTLCache(16)
+    )
+    await interface.process_user_queries(['write a poem', 'fix my code', 'fail please'])
+    await interface.process_user_queries(['write a poem'])
+    await interface.aclose()
+
+    lines = REGISTRY.render().splitlines()
+    assert 'aigentqube_query_seconds_count{mode="async"} 4' in lines
+    assert 'aigentqube_queries_total{result="upstream"} 2' in lines
+    assert 'aigentqube_queries_total{result="cached"} 1' in lines
+    assert 'aigentqube_queries_total{result="error"} 1' in lines
@@ -0,0 +1,226 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from src.backend.cache import AsyncSingleFlight, SQLiteTTLCache
+from src.backend.conversation_context import (
+    ConversationContextManager,
+    estimate_tokens,
+    extractive_summary
+)
+from src.backend.natural_language_interface import NaturalLanguageInterface
+from tests.backend.stubs import chat_completion
+
+def echo_handler(method, path, body):
+    """
+    Echo the user message back after a short delay
+    """
+    time.sleep(0.2)
+    return 200, chat_completion(f"echo: {body['messages'][-1]['content']}")
+
+@pytest.mark.asyncio
+async def test_process_user_queries_runs_concurrently_in_order(stub_server):
+    """
+    Test batch queries overlap upstream and keep their input order
+    """
+    server = stub_server(echo_handler)
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        max_concurrency=4
+    )
+
+    # Keep deferred imports out of the timed section
+    interface.warmup()
+    queries = [f'software question {index}' for index in range(4)]
+    started = time.perf_counter()
+    results = await interface.process_user_queries(queries)
+    elapsed = time.perf_counter() - started
+    await interface.aclose()
+
+    assert [result['response'] for result in results] == [
+        f'echo: {query}' for query in queries
+    ]
+    assert all(result['domain'] == 'technical' for result in results)
+    assert elapsed < 0.6
+
+@pytest.mark.asyncio
+async def test_async_query_timeout_returns_error_response(stub_server):
+    """
+    Test that a slow upstream is cut off by the per-call timeout
+    """
+    server = stub_server(echo_handler)
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        request_timeout=0.05
+    )
+
+    result = await interface.aprocess_user_query('hello')
+    await interface.aclose()
+
+    assert result['domain'] == 'error'
+    assert result['tokens_used'] == 0
+    assert result['cached'] is False
+
+@pytest.mark.asyncio
+async def test_stalled_stream_times_out_and_frees_its_slot(stub_server):
+    """
+    Test a streamed query waiting on a stalled upstream is cut off by the
+    per-call timeout and releases its concurrency slot
+    """
+    server = stub_server(echo_handler)
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        request_timeout=0.05,
+        max_concurrency=1
+    )
+
+    started = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        async for _ in interface.astream_user_query('hello'):
+            pass
+    await interface.aclose()
+
+    assert time.perf_counter() - started < 0.2
+    assert not interface._semaphore.locked()
+
+@pytest.mark.asyncio
+async def test_response_cache_and_request_coalescing(stub_server, tmp_path):
+    """
+    Test duplicate queries share one upstream call and repeats hit the cache
+    """
+    server = stub_server(echo_handler)
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        response_cache=SQLiteTTLCache(str(tmp_path / 'responses.db'), ttl=60)
+    )
+
+    concurrent = await interface.process_user_queries(['design a poem'] * 3)
+    repeated = interface.process_user_query('design a poem')
+    await interface.aclose()
+
+    assert len(server.requests) == 1
+    assert [result['tokens_used'] for result in concurrent].count(10) == 1
+    assert repeated['tokens_used'] == 0
+    assert repeated['cached'] is True
+    assert repeated['response'] == 'echo: design a poem'
+
+    stats = interface.cache_stats()
+    assert stats['coalesced_requests'] == 2
+    assert stats['response_cache']['hits'] == 1
+
+def test_session_history_stays_within_token_budget(stub_server):
+    """
+    Test multi-turn sessions send history and summarize beyond the budget
+    """
+    server = stub_server(lambda method, path, body: (200, chat_completion('ok ' * 100)))
+    context_manager = ConversationContextManager(token_budget=250, summary_budget=60)
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        context_manager=context_manager
+    )
+
+    for turn in range(4):
+        interface.process_user_query(
+            f'software question number {turn}', agent_context={'session_id': 'abc'}
+        )
+
+    sent = server.requests[-1][2]['messages']
+    assert sent[-1] == {'role': 'user', 'content': 'software question number 3'}
+    assert sent[1]['content'].startswith('Summary of the earlier conversation')
+    assert 'software question number 0' not in [message['content'] for message in sent]
+    assert sum(estimate_tokens(message['content']) + 4 for message in sent) <= 250
+    assert context_manager.stats()['sessions'] == 1
+
+    interface.process_user_query('software question', agent_context=None)
+    assert len(server.requests[-1][2]['messages']) == 2
+
+def test_slow_summarizer_does_not_block_other_sessions():
+    """
+    Test summarizing one session leaves every other session readable and writable
+    """
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_summary(previous, dropped):
+        entered.set()
+        release.wait(5)
+        return extractive_summary(previous, dropped)
+
+    context_manager = ConversationContextManager(token_budget=100, summarizer=slow_summary)
+    context_manager.append('slow', 'user', 'first question ' * 20)
+    summarizing = threading.Thread(
+        target=context_manager.append, args=('slow', 'user', 'second question ' * 20)
+    )
+    summarizing.start()
+    assert entered.wait(5)
+
+    started = time.perf_counter()
+    context_manager.append('other', 'user', 'hello')
+    assert context_manager.get_history('other') == [{'role': 'user', 'content': 'hello'}]
+    assert context_manager.build_messages('slow', 'system', 'query')[-1]['content'] == 'query'
+    assert time.perf_counter() - started < 1
+
+    release.set()
+    summarizing.join(5)
+    assert 'user: first question' in context_manager.build_messages('slow', 'system', 'q')[1]['content']
+
+@pytest.mark.asyncio
+async def test_async_queries_summarize_off_the_event_loop(stub_server):
+    """
+    Test a slow summarizer on the async path leaves the event loop free
+    """
+    server = stub_server(lambda method, path, body: (200, chat_completion('ok ' * 200)))
+
+    def slow_summary(previous, dropped):
+        time.sleep(0.3)
+        return extractive_summary(previous, dropped)
+
+    interface = NaturalLanguageInterface(
+        openai_api_key='test_key',
+        base_url=server.url,
+        context_manager=ConversationContextManager(token_budget=100, summarizer=slow_summary)
+    )
+    # Keep deferred imports out of the timed section
+    interface.warmup()
+    query = interface.aprocess_user_query('software question', agent_context={'session_id': 'abc'})
+    querying = asyncio.create_task(query)
+
+    ticks = 0
+    while not querying.done():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        assert time.perf_counter() - started < 0.2
+        ticks += 1
+    await interface.aclose()
+
+    assert querying.result()['response'].startswith('ok')
+    assert ticks > 10
+
+@pytest.mark.asyncio
+async def test_async_single_flight_survives_leader_cancellation():
+    """
+    Test followers of a cancelled leader take over instead of being cancelled
+    """
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    leader = asyncio.create_task(flight.do('key', fetch))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(flight.do('key', fetch)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    results = await asyncio.gather(*followers)
+    assert leader.cancelled()
+    assert [result for result, _ in results] == [2, 2, 2]
+    assert flight.coalesced == 3
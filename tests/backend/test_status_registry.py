@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from src.backend.main import AigentQubeApp
+from src.backend.status_registry import InMemoryStatusRegistry, SQLiteStatusRegistry
+
+def test_sqlite_registry_shared_between_workers(tmp_path):
+    """
+    Test writes of one worker wake waiters of another without fixed sleeps
+    """
+    path = str(tmp_path / 'status.db')
+    producer = SQLiteStatusRegistry(path)
+    worker = SQLiteStatusRegistry(path, poll_interval=0.01)
+
+    first = producer.put('alpha', {'status': 'active'})
+    assert producer.put('alpha', {'status': 'active'}).version == first.version
+    producer.put('beta', {'status': 'idle'})
+
+    async def wait_for_write():
+        writer = threading.Timer(0.1, producer.put, ('alpha', {'status': 'busy'}))
+        started = time.perf_counter()
+        writer.start()
+        changed = await worker.wait_for_change('alpha', first.version, timeout=5)
+        return changed, time.perf_counter() - started
+
+    changed, waited = asyncio.run(wait_for_write())
+
+    assert changed and waited < 1
+    assert worker.get('alpha').status == {'status': 'busy'}
+    assert set(worker.get_many(['alpha', 'beta', 'gamma'])) == {'alpha', 'beta'}
+    assert [record.agent_id for record in worker.changed_since(first.version)] == ['beta', 'alpha']
+    assert [record.agent_id for record in worker.list_records(after='alpha')] == ['beta']
+    assert worker.version == 3
+
+    producer.close()
+    worker.close()
+
+def test_sqlite_registry_poller_restarts_for_waiter_racing_its_exit(tmp_path):
+    """
+    Test a waiter arriving while the poller decides to stop still gets a
+    poller, so writes of other workers wake it
+    """
+    path = str(tmp_path / 'status.db')
+    producer = SQLiteStatusRegistry(path)
+    worker = SQLiteStatusRegistry(path, poll_interval=0.01)
+    deciding, resume = threading.Event(), threading.Event()
+    has_waiters = worker.notifier.has_waiters
+
+    def paused_has_waiters():
+        waiting = has_waiters()
+        if not waiting and threading.current_thread() is worker._poller and not deciding.is_set():
+            # Hold the poller between finding nobody waiting and exiting
+            deciding.set()
+            resume.wait(5)
+        return waiting
+
+    worker.notifier.has_waiters = paused_has_waiters
+
+    async def wait_across_poller_exit():
+        assert not await worker.wait_for_change('alpha', 0, timeout=0.02)
+        assert await asyncio.to_thread(deciding.wait, 5)
+        threading.Timer(0.05, resume.set).start()
+        waiting = asyncio.create_task(worker.wait_for_change('alpha', 0, timeout=2))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        producer.put('alpha', {'status': 'active'})
+        return await waiting, time.perf_counter() - started
+
+    changed, waited = asyncio.run(wait_across_poller_exit())
+
+    assert changed and waited < 1
+
+    producer.close()
+    worker.close()
+
+def test_status_websocket_wakes_on_registry_write():
+    """
+    Test agent status streams push registry writes without waiting a tick
+    """
+    registry = InMemoryStatusRegistry()
+    registry.put('alpha', {'status': 'active'})
+    aigentqube = AigentQubeApp(warmup=False, status_interval=30, status_registry=registry)
+
+    with TestClient(aigentqube.app) as client:
+        with client.websocket_connect('/ws/agent/alpha') as websocket:
+            assert websocket.receive_json()['status'] == 'active'
+            started = time.perf_counter()
+            registry.put('alpha', {'status': 'busy'})
+            update = websocket.receive_json()
+
+    assert time.perf_counter() - started < 5
+    assert update['status'] == 'busy'
+    assert update['version'] == 2
+    assert update['agent_id'] == 'alpha'